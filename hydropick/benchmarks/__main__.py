@@ -0,0 +1,13 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+import sys
+
+from hydropick.benchmarks.runner import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,361 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+"""Times the main operations of hydropick on a synthetic survey.
+
+Run with
+
+    python -m hydropick.benchmarks --output results.json
+
+The results record the git commit, the survey parameters and the times of
+each benchmark (and, for the picking algorithms, of each of their stages),
+so runs on different commits can be compared:
+
+    python -m hydropick.benchmarks --compare baseline.json
+
+exits with status 1 if a benchmark got slower than the tolerance allows.
+"""
+
+from __future__ import absolute_import
+
+import argparse
+from collections import OrderedDict
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from timeit import default_timer
+
+import numpy as np
+import pandas as pd
+from shapely.geometry import Point
+
+from . import synthetic
+
+logger = logging.getLogger(__name__)
+
+# bump when the results layout changes
+BENCHMARK_FORMAT_VERSION = 1
+
+# times each benchmark is run; the best time is compared
+BENCHMARK_REPEAT = 3
+
+# a benchmark regresses when its best time is this much slower
+BENCHMARK_TOLERANCE = 1.25
+
+# number of map queries in each query benchmark
+QUERY_COUNT = 20
+
+
+def run_benchmarks(n_lines=synthetic.SYNTHETIC_LINES,
+                   n_traces=synthetic.SYNTHETIC_TRACES,
+                   n_pixels=synthetic.SYNTHETIC_PIXELS,
+                   n_cores=synthetic.SYNTHETIC_CORES, seed=0,
+                   repeat=BENCHMARK_REPEAT, work_dir=None):
+    """Run every benchmark and return the results dict (see main)"""
+    parameters = OrderedDict([
+        ('n_lines', n_lines), ('n_traces', n_traces),
+        ('n_pixels', n_pixels), ('n_cores', n_cores), ('seed', seed),
+        ('repeat', repeat),
+    ])
+    temp_dir = tempfile.mkdtemp(dir=work_dir)
+    try:
+        timings = _run(temp_dir, **parameters)
+    finally:
+        shutil.rmtree(temp_dir)
+
+    commit, dirty = _git_commit()
+    return OrderedDict([
+        ('version', BENCHMARK_FORMAT_VERSION),
+        ('commit', commit),
+        ('dirty', dirty),
+        ('date', datetime.datetime.now().isoformat()),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('numpy', np.__version__),
+        ('parameters', parameters),
+        ('benchmarks', timings),
+    ])
+
+
+def compare_results(baseline, results, tolerance=BENCHMARK_TOLERANCE):
+    """Return (name, baseline best, best) for the benchmarks whose best
+    time is more than tolerance times the baseline's.
+    """
+    if baseline['parameters'] != results['parameters']:
+        logger.warning('benchmark parameters differ from the baseline: {}'
+                       ' != {}'.format(dict(results['parameters']),
+                                       dict(baseline['parameters'])))
+    regressions = []
+    for name, timing in results['benchmarks'].items():
+        base = baseline['benchmarks'].get(name)
+        if base is not None and timing['best'] > base['best'] * tolerance:
+            regressions.append((name, base['best'], timing['best']))
+    return regressions
+
+
+def _run(temp_dir, n_lines, n_traces, n_pixels, n_cores, seed, repeat):
+    from ..io import export_survey, hdf5
+    from ..io.points_query import SurveyPointsIndex
+    from ..io.tide import StaticTideProvider
+    from ..model import algorithms
+    from ..model.depth_line import DepthLine
+    from ..util.profiling import StageProfiler
+
+    timings = OrderedDict()
+
+    def record(name, times, profiler=None):
+        timings[name] = OrderedDict([
+            ('best', min(times)),
+            ('median', float(np.median(times))),
+            ('times', times),
+        ])
+        logger.info('{:<32} {:9.4f} s'.format(name, min(times)))
+        if profiler is not None:
+            # mean seconds per run spent in each stage
+            timings[name]['stages'] = OrderedDict(
+                (stage, seconds / repeat)
+                for stage, (calls, seconds) in profiler.totals().items())
+            for stage, seconds in timings[name]['stages'].items():
+                logger.info('    {:<28} {:9.4f} s'.format(stage, seconds))
+
+    # import: each run into a new project, keeping the last
+    line_data = [synthetic.survey_line_data(i, n_lines, n_traces, n_pixels,
+                                            seed)
+                 for i in range(n_lines)]
+    projects = []
+
+    def new_project():
+        project_dir = os.path.join(temp_dir, 'project{}'.format(len(projects)))
+        projects.append(project_dir)
+        backend = hdf5.HDF5Backend(project_dir)
+        backend.write_shoreline(synthetic.SYNTHETIC_LAKE_NAME,
+                                synthetic.shoreline(), {}, {})
+        backend.write_core_samples(
+            synthetic.core_sample_dicts(n_cores, n_lines, seed))
+        # import consumes the dicts
+        return backend, [(_copy_sdi_data(data), dict(data_raw))
+                         for data, data_raw in line_data]
+
+    def import_lines(backend, line_datas):
+        for data, data_raw in line_datas:
+            backend.import_sdi_data(data, data_raw)
+
+    record('import', _time(import_lines, repeat, new_project))
+    del line_data[:]
+    project_dir = projects[-1]
+    line_names = [synthetic.survey_line_name(i) for i in range(n_lines)]
+    survey = synthetic.read_survey(project_dir, line_names)
+    survey_lines = survey.survey_lines
+
+    def unload():
+        for survey_line in survey_lines:
+            survey_line.unload_data()
+        return ()
+
+    def load():
+        for survey_line in survey_lines:
+            survey_line.load_data(project_dir)
+
+    record('load_data', _time(load, repeat, unload))
+
+    results = {}
+    line_types = {}
+    for class_name in algorithms.ALGORITHM_LIST:
+        algorithm = getattr(algorithms, class_name)(
+            profiler=StageProfiler(enabled=True))
+        line_types[class_name] = algorithm.line_types
+
+        def process():
+            for survey_line in survey_lines:
+                results[survey_line.name, class_name] = \
+                    algorithm.process_line(survey_line)
+
+        record('process_line.' + class_name, _time(process, repeat),
+               algorithm.profiler)
+
+    # keep the algorithm lines as final picks
+    for survey_line in survey_lines:
+        for class_name in algorithms.ALGORITHM_LIST:
+            result = results[survey_line.name, class_name]
+            trace_array = result[0]
+            for line_type, depth_array in zip(line_types[class_name],
+                                              result[1:]):
+                if line_type == 'pre-impoundment surface':
+                    depth_dict = survey_line.preimpoundment_depths
+                else:
+                    depth_dict = survey_line.lake_depths
+                name = 'benchmark_' + class_name
+                depth_dict[name] = DepthLine(
+                    name=name, survey_line_name=survey_line.name,
+                    line_type=line_type, source='algorithm',
+                    source_name=class_name, index_array=trace_array - 1,
+                    depth_array=depth_array)
+                if line_type == 'pre-impoundment surface':
+                    survey_line.final_preimpoundment_depth = name
+                else:
+                    survey_line.final_lake_depth = name
+
+    def save():
+        for survey_line in survey_lines:
+            survey_line.save_to_disk(changed_only=False)
+
+    record('save_to_disk', _time(save, repeat))
+
+    dates = pd.date_range(synthetic.SURVEY_DATE,
+                          periods=n_lines // 100 + 3, freq='D')
+    water_surface = pd.DataFrame(
+        {'water_surface_elevation': np.linspace(100.0, 100.5, len(dates))},
+        index=dates)
+    tide_provider = StaticTideProvider(water_surface)
+    csv_path = os.path.join(temp_dir, 'points.csv')
+    hdf_path = os.path.join(temp_dir, 'points.h5')
+
+    def export_csv():
+        export_survey.export_survey_points(survey, csv_path, use_cache=False,
+                                           tide_provider=tide_provider)
+
+    def export_hdf():
+        export_survey.export_survey_points_hdf(survey, hdf_path,
+                                               tide_provider=tide_provider)
+
+    record('export_survey_points', _time(export_csv, repeat))
+    record('export_survey_points_hdf', _time(export_hdf, repeat))
+
+    index = [None]
+
+    def remove_index():
+        cache_path = os.path.join(project_dir, 'points_index.npz')
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        return ()
+
+    def build_index():
+        index[0] = SurveyPointsIndex(survey_lines, project_dir)
+        index[0].lines_in_bbox(0, 0, 0, 0)
+
+    record('points_index', _time(build_index, repeat, remove_index))
+
+    random = np.random.RandomState(seed)
+    a, b = synthetic.LAKE_RADII
+    x0, y0 = synthetic.LAKE_CENTER
+    centers = zip(random.uniform(x0 - a / 2, x0 + a / 2, QUERY_COUNT),
+                  random.uniform(y0 - b / 2, y0 + b / 2, QUERY_COUNT))
+    half_size = b / 4
+
+    def query_bboxes():
+        for x, y in centers:
+            index[0].query_bbox(x - half_size, y - half_size,
+                                x + half_size, y + half_size)
+
+    record('points_query_bbox', _time(query_bboxes, repeat))
+
+    polygons = [Point(x, y).buffer(half_size) for x, y in centers]
+
+    def query_polygons():
+        for polygon in polygons:
+            index[0].query_polygon(polygon)
+
+    record('points_query_polygon', _time(query_polygons, repeat))
+    return timings
+
+
+def _time(func, repeat, setup=None):
+    """Return the times of repeat calls of func(*setup())"""
+    times = []
+    for i in range(repeat):
+        args = setup() if setup is not None else ()
+        start = default_timer()
+        func(*args)
+        times.append(default_timer() - start)
+    return times
+
+
+def _copy_sdi_data(data):
+    data = dict(data)
+    data['frequencies'] = [dict(freq) for freq in data['frequencies']]
+    return data
+
+
+def _git_commit():
+    """Return the commit hydropick is run from and whether the tree has
+    changes, or (None, None) outside a git checkout.
+    """
+    source_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=source_dir,
+            stderr=subprocess.STDOUT).strip()
+        status = subprocess.check_output(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=source_dir, stderr=subprocess.STDOUT)
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Time hydropick operations on a synthetic survey')
+    parser.add_argument('--lines', type=int, dest='n_lines',
+                        default=synthetic.SYNTHETIC_LINES,
+                        help='number of survey lines')
+    parser.add_argument('--traces', type=int, dest='n_traces',
+                        default=synthetic.SYNTHETIC_TRACES,
+                        help='traces per survey line')
+    parser.add_argument('--pixels', type=int, dest='n_pixels',
+                        default=synthetic.SYNTHETIC_PIXELS,
+                        help='pixels per trace')
+    parser.add_argument('--cores', type=int, dest='n_cores',
+                        default=synthetic.SYNTHETIC_CORES,
+                        help='number of core samples')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the synthetic survey')
+    parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT,
+                        help='times to run each benchmark')
+    parser.add_argument('--work-dir', help='directory for temporary files')
+    parser.add_argument('--output', metavar='RESULTS_JSON',
+                        help='write the results to this file')
+    parser.add_argument('--compare', metavar='BASELINE_JSON',
+                        help='compare the results to an earlier run')
+    parser.add_argument('--tolerance', type=float,
+                        default=BENCHMARK_TOLERANCE,
+                        help='slowdown over the baseline that counts as a '
+                             'regression (default {})'
+                             .format(BENCHMARK_TOLERANCE))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    results = run_benchmarks(n_lines=args.n_lines, n_traces=args.n_traces,
+                             n_pixels=args.n_pixels, n_cores=args.n_cores,
+                             seed=args.seed, repeat=args.repeat,
+                             work_dir=args.work_dir)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print output
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f, object_pairs_hook=OrderedDict)
+        regressions = compare_results(baseline, results, args.tolerance)
+        for name, base, best in regressions:
+            logger.error('{} regressed: {:.4f} s -> {:.4f} s ({:+.0%})'
+                         .format(name, base, best, best / base - 1))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
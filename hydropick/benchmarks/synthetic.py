@@ -0,0 +1,255 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+"""Deterministic synthetic SDI surveys for benchmarks.
+
+A synthetic survey is an elliptical lake crossed by parallel survey lines.
+Each line has a smooth bowl shaped lake bottom with a layer of sediment
+over the preimpoundment surface, sampled by interleaved 200, 50 and 24 kHz
+traces whose intensity images show the two surfaces.  The data is shaped
+like the output of sdi.binary.read and sdi.corestick.read so it goes
+through the same import code as real surveys.  The same parameters and
+seed always give the same survey.
+"""
+
+from __future__ import absolute_import
+
+import datetime
+
+import numpy as np
+from shapely.geometry import LineString
+
+from ..io import hdf5
+
+# default size of a synthetic survey
+SYNTHETIC_LINES = 10
+SYNTHETIC_TRACES = 3000
+SYNTHETIC_PIXELS = 600
+SYNTHETIC_CORES = 20
+
+# frequencies (kHz) of the traces of a line, in trace order
+SYNTHETIC_FREQUENCIES = [200.0, 50.0, 24.0]
+
+SYNTHETIC_LAKE_NAME = 'Synthetic Lake'
+
+# lake center (UTM zone 14N meters) and semi-axes (meters)
+LAKE_CENTER = (620000.0, 3300000.0)
+LAKE_RADII = (4000.0, 2000.0)
+
+# deepest lake depth and thickest sediment layer (meters)
+MAX_LAKE_DEPTH = 15.0
+MAX_SEDIMENT_THICKNESS = 2.0
+
+# transducer draft (meters) and seconds between traces
+DRAFT = 0.5
+TRACE_INTERVAL = 0.1
+
+# survey date of the first line; each day has up to 100 lines
+SURVEY_DATE = datetime.datetime(2014, 1, 1)
+
+
+def survey_line_name(index):
+    """Return the name of the index'th line, '<yymmdd><nn>' like real
+    survey lines, which the export parses the survey date from.
+    """
+    date = SURVEY_DATE + datetime.timedelta(days=index // 100)
+    return '{:%y%m%d}{:02d}'.format(date, index % 100)
+
+
+def survey_line_coordinates(index, n_lines, n_traces):
+    """Return the easting and northing of the traces of a line: lines run
+    west to east across the lake, evenly spaced from south to north.
+    """
+    a, b = LAKE_RADII
+    y = b * (-0.9 + 1.8 * (index + 0.5) / n_lines)
+    half_width = a * np.sqrt(1 - (y / b) ** 2) * 0.98
+    x = np.linspace(-half_width, half_width, n_traces)
+    return x + LAKE_CENTER[0], np.repeat(y + LAKE_CENTER[1], n_traces)
+
+
+def survey_line_data(index, n_lines=SYNTHETIC_LINES,
+                     n_traces=SYNTHETIC_TRACES, n_pixels=SYNTHETIC_PIXELS,
+                     seed=0):
+    """Return (data, data_raw) for a synthetic line, shaped like the
+    separated and unseparated dicts returned by sdi.binary.read.
+    """
+    random = np.random.RandomState([seed, index])
+    name = survey_line_name(index)
+    easting, northing = survey_line_coordinates(index, n_lines, n_traces)
+    lake_depth, sediment = _surfaces(easting, northing, random)
+    heave = random.normal(0, 0.02, n_traces)
+    pixel_resolution = (MAX_LAKE_DEPTH + MAX_SEDIMENT_THICKNESS) * 1.5 \
+        / n_pixels
+
+    seconds = 8 * 3600 + (index % 100) * 900 + \
+        np.arange(n_traces) * TRACE_INTERVAL
+    microsecond = np.round((seconds % 1) * 1e6).astype(np.int64)
+    seconds = seconds.astype(np.int64)
+    khz = np.resize(SYNTHETIC_FREQUENCIES, n_traces)
+    latitude, longitude = _lat_long(easting, northing)
+
+    data_raw = {
+        'trace_num': np.arange(1, n_traces + 1),
+        'kHz': khz,
+        'interpolated_easting': easting,
+        'interpolated_northing': northing,
+        'interpolated_latitude': latitude,
+        'interpolated_longitude': longitude,
+        'latitude': latitude,
+        'longitude': longitude,
+        'draft': np.repeat(DRAFT, n_traces),
+        'heave': heave,
+        'pixel_resolution': np.repeat(pixel_resolution, n_traces),
+        'power': np.repeat(3, n_traces),
+        'gain': np.repeat(5, n_traces),
+        'depth_r1': lake_depth,
+        'date': name,
+        'hour': seconds // 3600,
+        'minute': seconds // 60 % 60,
+        'second': seconds % 60,
+        'microsecond': microsecond,
+        'filepath': '{}.bin'.format(name),
+    }
+
+    # surfaces as pixel rows: depth = row * pixel_resolution + draft - heave
+    surface_rows = (lake_depth - DRAFT + heave) / pixel_resolution
+    pre_rows = surface_rows + sediment / pixel_resolution
+    frequencies = []
+    per_trace = ['trace_num', 'interpolated_easting', 'interpolated_northing',
+                 'interpolated_latitude', 'interpolated_longitude',
+                 'latitude', 'longitude', 'draft', 'heave',
+                 'pixel_resolution', 'power', 'gain', 'depth_r1']
+    for frequency in SYNTHETIC_FREQUENCIES:
+        traces = khz == frequency
+        freq_dict = dict((key, data_raw[key][traces]) for key in per_trace)
+        freq_dict['kHz'] = frequency
+        freq_dict['intensity'] = _intensity(surface_rows[traces],
+                                            pre_rows[traces], n_pixels,
+                                            frequency, random)
+        frequencies.append(freq_dict)
+
+    data = {
+        'survey_line_number': name,
+        'frequencies': frequencies,
+    }
+    return data, data_raw
+
+
+def shoreline():
+    """Return the lake shoreline, a closed LineString"""
+    a, b = LAKE_RADII
+    theta = np.linspace(0, 2 * np.pi, 721)
+    x = LAKE_CENTER[0] + a * np.cos(theta)
+    y = LAKE_CENTER[1] + b * np.sin(theta)
+    return LineString(zip(x, y))
+
+
+def core_sample_dicts(n_cores=SYNTHETIC_CORES, n_lines=SYNTHETIC_LINES,
+                      seed=0):
+    """Return core samples, keyed by core id as read by sdi.corestick.read,
+    taken near random points of the survey lines.
+    """
+    random = np.random.RandomState([seed, n_lines, n_cores])
+    cores = {}
+    for i in range(n_cores):
+        index = random.randint(n_lines)
+        x, y = survey_line_coordinates(index, n_lines, 101)
+        trace = random.randint(101)
+        layers = np.sort(random.uniform(0, MAX_SEDIMENT_THICKNESS,
+                                        random.randint(1, 4)))
+        cores['core_{:03d}'.format(i)] = {
+            'easting': float(x[trace] + random.normal(0, 5)),
+            'northing': float(y[trace] + random.normal(0, 5)),
+            'layer_interface_depths': [round(d, 2) for d in layers],
+        }
+    return cores
+
+
+def write_survey(project_dir, n_lines=SYNTHETIC_LINES,
+                 n_traces=SYNTHETIC_TRACES, n_pixels=SYNTHETIC_PIXELS,
+                 n_cores=SYNTHETIC_CORES, seed=0):
+    """Write a synthetic survey to a project directory, importing its lines
+    as real binary files are.  Returns the names of the lines.
+    """
+    backend = hdf5.HDF5Backend(project_dir)
+    backend.write_shoreline(SYNTHETIC_LAKE_NAME, shoreline(),
+                            {'init': 'epsg:32614'}, {})
+    backend.write_core_samples(core_sample_dicts(n_cores, n_lines, seed))
+    names = []
+    for index in range(n_lines):
+        data, data_raw = survey_line_data(index, n_lines, n_traces, n_pixels,
+                                          seed)
+        names.append(backend.import_sdi_data(data, data_raw))
+    return names
+
+
+def read_survey(project_dir, line_names):
+    """Return a Survey of the synthetic survey in a project directory"""
+    from ..io import survey_io
+    from ..io.import_survey import import_cores
+    from ..model.survey import Survey
+
+    survey_lines = []
+    for name in line_names:
+        survey_line = survey_io.read_survey_line_from_hdf(project_dir, name)
+        survey_line.project_dir = project_dir
+        survey_lines.append(survey_line)
+    return Survey(
+        name=SYNTHETIC_LAKE_NAME,
+        lake=survey_io.read_shoreline_from_hdf(project_dir),
+        survey_lines=survey_lines,
+        core_samples=import_cores(project_dir=project_dir),
+        project_dir=project_dir,
+    )
+
+
+def _surfaces(easting, northing, random):
+    """Return the lake depth and sediment thickness along a line"""
+    a, b = LAKE_RADII
+    r2 = (((easting - LAKE_CENTER[0]) / a) ** 2 +
+          ((northing - LAKE_CENTER[1]) / b) ** 2)
+    bowl = np.clip(1 - r2, 0, 1)
+    n = len(easting)
+    roughness = _smooth(random.normal(0, 1, n), max(n // 50, 1))
+    lake_depth = DRAFT + 0.5 + (MAX_LAKE_DEPTH - 1.0) * bowl + 0.3 * roughness
+    layer = _smooth(random.normal(0, 1, n), max(n // 20, 1))
+    sediment = MAX_SEDIMENT_THICKNESS * (0.2 + 0.6 * bowl) + 0.1 * layer
+    return (np.clip(lake_depth, DRAFT + 0.2, None),
+            np.clip(sediment, 0.05, MAX_SEDIMENT_THICKNESS))
+
+
+def _smooth(values, width):
+    """Return values smoothed by a moving average, scaled to unit spread"""
+    kernel = np.ones(width) / width
+    smooth = np.convolve(values, kernel, mode='same')
+    spread = smooth.std()
+    return smooth / spread if spread > 0 else smooth
+
+
+def _intensity(surface_rows, pre_rows, n_pixels, frequency, random):
+    """Return the (traces, pixels) intensity image of one frequency: dark
+    water, a bright sediment layer from the lake bottom to the
+    preimpoundment surface, then returns fading faster at higher
+    frequencies.
+    """
+    rows = np.arange(n_pixels, dtype=np.float32)[:, np.newaxis]
+    penetration = n_pixels * 0.02 * np.sqrt(200.0 / frequency)
+    below_pre = np.clip(rows - pre_rows, 0, None)
+    image = np.where(
+        rows < surface_rows, 0.05,
+        np.where(rows < pre_rows, 0.85,
+                 0.1 + 0.5 * np.exp(-below_pre / penetration)))
+    image += random.normal(0, 0.03, image.shape)
+    return np.ascontiguousarray(np.clip(image, 0, 1).astype(np.float32).T)
+
+
+def _lat_long(easting, northing):
+    """Return approximate latitude and longitude of UTM zone 14N points
+    near the lake; good enough for synthetic data.
+    """
+    latitude = 29.82 + (northing - LAKE_CENTER[1]) / 110900.0
+    longitude = -97.76 + (easting - LAKE_CENTER[0]) / 96600.0
+    return latitude, longitude
@@ -0,0 +1,78 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from hydropick.benchmarks import runner, synthetic
+
+
+class TestSyntheticSurvey(unittest.TestCase):
+    """ Tests for the synthetic survey generator """
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.project_dir = os.path.join(self.tempdir, 'test-project')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_line_data_is_deterministic(self):
+        data_a, raw_a = synthetic.survey_line_data(1, 3, 300, 100, seed=4)
+        data_b, raw_b = synthetic.survey_line_data(1, 3, 300, 100, seed=4)
+        np.testing.assert_array_equal(raw_a['depth_r1'], raw_b['depth_r1'])
+        for freq_a, freq_b in zip(data_a['frequencies'],
+                                  data_b['frequencies']):
+            np.testing.assert_array_equal(freq_a['intensity'],
+                                          freq_b['intensity'])
+        data_c, raw_c = synthetic.survey_line_data(1, 3, 300, 100, seed=5)
+        self.assertFalse(np.array_equal(raw_a['depth_r1'], raw_c['depth_r1']))
+
+    def test_write_and_load_survey(self):
+        names = synthetic.write_survey(self.project_dir, n_lines=2,
+                                       n_traces=300, n_pixels=100, n_cores=3)
+        self.assertEqual(names, ['14010100', '14010101'])
+        survey = synthetic.read_survey(self.project_dir, names)
+        self.assertEqual(len(survey.core_samples), 3)
+        survey_line = survey.survey_lines[0]
+        survey_line.load_data(self.project_dir)
+        self.assertEqual(len(survey_line.trace_num), 300)
+        self.assertEqual(sorted(survey_line.frequencies),
+                         ['200.0', '24.0', '50.0'])
+        self.assertEqual(survey_line.frequencies['200.0'].shape, (100, 100))
+
+
+class TestBenchmarkRunner(unittest.TestCase):
+    """ Tests for running and comparing benchmarks """
+    def test_run_benchmarks(self):
+        results = runner.run_benchmarks(n_lines=2, n_traces=300, n_pixels=100,
+                                        n_cores=2, repeat=1)
+        self.assertEqual(results['version'], runner.BENCHMARK_FORMAT_VERSION)
+        self.assertEqual(results['parameters']['n_lines'], 2)
+        names = list(results['benchmarks'])
+        for name in ['import', 'load_data', 'save_to_disk',
+                     'export_survey_points', 'points_query_polygon']:
+            self.assertIn(name, names)
+        self.assertEqual(len(results['benchmarks']['import']['times']), 1)
+        stages = results['benchmarks'][
+            'process_line.ThresholdCurrentSurface']['stages']
+        self.assertIn('find_edge', stages)
+
+        self.assertEqual(runner.compare_results(results, results), [])
+        slower = dict(results, benchmarks={
+            'import': {'best': results['benchmarks']['import']['best'] * 2},
+        })
+        regressions = runner.compare_results(results, slower)
+        self.assertEqual([name for name, base, best in regressions],
+                         ['import'])
+
+
+if __name__ == '__main__':
+    unittest.main()
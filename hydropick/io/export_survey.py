@@ -1,17 +1,73 @@
+from collections import namedtuple
 import datetime
+import functools
+import hashlib
+from itertools import izip
+import json
+import multiprocessing
 import os.path
 
+import numpy as np
 import pandas as pd
-import ulmo
+import tables
 
 from . import survey_io
-
-
-def export_survey_points(survey, path, with_pre=True):
-    """Write out survey points to a csv for use in interpolation pipeline."""
-    tide_file_path = _get_tide_file_path(survey)
-    tide_data = pd.read_csv(tide_file_path, index_col='datetime')
-    tide_data.index = pd.DatetimeIndex(tide_data.index)
+from .tide import CachedTideProvider, NWISTideProvider, TideFileProvider
+from ..model.survey_line import CURRENT_SURFACE_FROM_BIN_NAME
+from ..util.metrics import METRICS
+
+# number of rows formatted and written at a time when exporting points
+EXPORT_CHUNK_SIZE = 10000
+
+# the only unseparated sdi arrays an export reads
+EXPORT_SDI_ARRAYS = [
+    'interpolated_easting', 'interpolated_northing',
+    'interpolated_latitude', 'interpolated_longitude',
+    'date', 'hour', 'minute', 'second', 'microsecond',
+]
+
+# the survey line attributes an export needs; unlike a SurveyLine this is
+# cheap to send to worker processes
+LineExportInfo = namedtuple('LineExportInfo', [
+    'name', 'project_dir', 'status', 'final_lake_depth',
+    'final_preimpoundment_depth',
+])
+
+# bump when the export output changes, to invalidate cached line blocks
+EXPORT_CACHE_VERSION = 1
+
+# float columns of the binary (hdf5) point export, in order
+HDF_EXPORT_COLUMNS = [
+    'x', 'y', 'latitude', 'longitude', 'z', 'lake_elevation',
+    'current_surface_elevation',
+]
+HDF_EXPORT_PRE_COLUMNS = ['pre_impoundment_elevation', 'sediment_thickness']
+
+# format version of the binary point export
+HDF_EXPORT_VERSION = 1
+
+
+@METRICS.timed('export.survey_points')
+def export_survey_points(survey, path, with_pre=True, processes=1,
+                         use_cache=True, tide_provider=None):
+    """Write out survey points to a csv for use in interpolation pipeline.
+
+    Lines are extracted and formatted by a pool of `processes` worker
+    processes (in this process if 1) and written in survey line order.
+
+    If use_cache is True each line's formatted block is kept in the
+    project's export cache, keyed on its final picks, mask, status and the
+    tide file, and only lines whose key changed are regenerated.
+
+    Water surface elevations come from tide_provider, by default the
+    project's tide file.
+    """
+    if tide_provider is None:
+        tide_provider = _tide_file_provider(survey)
+    tide_hash = None
+    if use_cache:
+        tide_hash = tide_provider.fingerprint()
+    interpolate_water_surface = _read_tide_interpolator(tide_provider)
 
     start_columns = [
         # (name, decimals, string_fmt)
@@ -40,32 +96,109 @@ def export_survey_points(survey, path, with_pre=True):
 
     column_info = start_columns + preimpoundment_columns + end_columns
 
+    tasks = [
+        (_line_export_info(survey_line), interpolate_water_surface,
+         column_info, with_pre, tide_hash)
+        for survey_line in survey.survey_lines
+        if survey_line.status != 'bad'
+    ]
+
     with open(path, 'wb') as f:
         first = True
 
-        for survey_line in survey.survey_lines:
-            if survey_line.status == 'bad':
-                continue
-            df = _extract_survey_points(survey_line, tide_data, with_pre=with_pre)
-            for name, decimals, fmt in column_info:
-                if decimals is not None:
-                    df[name] = df[name].round(decimals=decimals)
-                if fmt is not None:
-                    df[name] = df[name].apply(lambda f: fmt % f)
-
-            cols = [name for name, decimals, pad in column_info]
-            df.to_csv(f, cols=cols, header=first, index=False)
+        for block in _imap(_export_line_block, tasks, processes):
+            if first:
+                f.write(_format_header(column_info))
+            f.write(block)
             first = False
 
 
-def generate_tide_file(gauge_code, survey):
-    """Generate tide file to use as a source when exporting survey points."""
-    tide_file_path = _get_tide_file_path(survey)
-    instantaneous_code = '00062:00011'
-    midnight_code = '00062:32400'
-    daily_mean_code = '00062:00003'
+@METRICS.timed('export.survey_points_hdf')
+def export_survey_points_hdf(survey, path, with_pre=True, processes=1,
+                             tide_provider=None):
+    """Write out survey points as compressed typed arrays in an hdf5 file,
+    one group per survey line, for fast loading downstream (see
+    read_survey_points_hdf).
+
+    Each line group holds the float columns, unrounded, plus the point
+    times as int64 nanoseconds ('datetime'); its sdi_filename is a group
+    attribute. Lines are extracted by `processes` worker processes as for
+    export_survey_points.
+    """
+    if tide_provider is None:
+        tide_provider = _tide_file_provider(survey)
+    interpolate_water_surface = _read_tide_interpolator(tide_provider)
 
-    parameter_codes = [instantaneous_code, midnight_code, daily_mean_code]
+    columns = list(HDF_EXPORT_COLUMNS)
+    if with_pre:
+        columns += HDF_EXPORT_PRE_COLUMNS
+    columns.append('datetime')
+
+    line_infos = [
+        _line_export_info(survey_line)
+        for survey_line in survey.survey_lines
+        if survey_line.status != 'bad'
+    ]
+    tasks = [
+        (line_info, interpolate_water_surface, with_pre)
+        for line_info in line_infos
+    ]
+
+    points_by_line = _imap(_export_line_points, tasks, processes)
+    line_names = [line_info.name for line_info in line_infos]
+    _write_points_file(path, izip(line_names, points_by_line), columns)
+
+
+def read_survey_points_hdf(path, columns=None, lines=None):
+    """Read points written by export_survey_points_hdf.
+
+    Only the named columns (default all, including 'sdi_filename')
+    of the named survey lines (default all, in export order) are read.
+    Returns a dict of column arrays with the lines' points concatenated.
+    """
+    with tables.openFile(path, 'r') as f:
+        all_columns = json.loads(f.root._v_attrs.columns)
+        if columns is None:
+            columns = all_columns + ['sdi_filename']
+        if lines is None:
+            lines = json.loads(f.root._v_attrs.survey_lines)
+
+        unknown = set(columns) - set(all_columns + ['sdi_filename'])
+        if unknown:
+            raise KeyError('no such columns: {}'.format(sorted(unknown)))
+
+        pieces = dict((column, []) for column in columns)
+        for line_name in lines:
+            group = f.getNode(f.root.survey_lines, 'line_' + line_name)
+            n_points = group._v_attrs.n_points
+            for column in columns:
+                if column == 'sdi_filename':
+                    array = np.repeat(group._v_attrs.sdi_filename, n_points)
+                else:
+                    array = f.getNode(group, column).read()
+                pieces[column].append(array)
+
+    points = {}
+    for column, arrays in pieces.items():
+        if arrays:
+            points[column] = np.concatenate(arrays)
+        else:
+            points[column] = np.array([])
+    if 'datetime' in points:
+        points['datetime'] = points['datetime'].astype(np.int64).view('M8[ns]')
+    return points
+
+
+def generate_tide_file(gauge_code, survey, provider=None):
+    """Generate tide file to use as a source when exporting survey points.
+
+    Data comes from provider, by default NWIS for gauge_code with the
+    parsed series cached in the project's tide_cache directory.
+    """
+    tide_file_path = _get_tide_file_path(survey)
+    if provider is None:
+        provider = CachedTideProvider(NWISTideProvider(gauge_code),
+                                      _get_tide_cache_dir(survey), gauge_code)
 
     line_names = sorted([survey_line.name for survey_line in survey.survey_lines])
     start = str(_date_from_line_name(line_names[0]))
@@ -73,128 +206,391 @@ def generate_tide_file(gauge_code, survey):
     # go forward two days so we have something to interpolate to
     end = str(_date_from_line_name(line_names[-1]) + datetime.timedelta(days=2))
 
-    data = ulmo.usgs.nwis.get_site_data(gauge_code, start=start, end=end)
-
-    df = pd.DataFrame()
-
-    for code in parameter_codes:
-        daily_mean = code == daily_mean_code
-        df = df.combine_first(_df_for_code(data, code, start, end, daily_mean))
-
-    df = df.rename(columns={'value': 'water_surface_elevation'})[['water_surface_elevation']]
+    df = provider.get_series(start, end)
     df.to_csv(tide_file_path, index_label='datetime')
 
 
-def _date_from_line_name(line_name):
-    return datetime.datetime.strptime(line_name[:6], '%y%m%d').date()
-
-
-def _df_for_code(data, code, start, end, daily_mean=False):
-    if code not in data:
-        return pd.DataFrame()
-
-    df = pd.DataFrame(data[code]['values'])
-
-    if df.empty:
-        return pd.DataFrame()
-
-    df = df.set_index('datetime')
-    df.index = pd.DatetimeIndex(df.index)
-
-    if daily_mean:
-        df.index = df.index + datetime.timedelta(hours=12)
+def parse_datetimes(sdi_dict_raw):
+    """Return the times of a line's traces as a DatetimeIndex, from the
+    date, hour, minute, second and microsecond arrays of its raw sdi data.
+    """
+    date = datetime.datetime.strptime(sdi_dict_raw['date'][:6], '%y%m%d')
+    start = pd.Timestamp(date).value
 
-    df.value = df.value.astype(float)
+    # note: be wary of using timedelta64; it's more efficient but inconsisent
+    # and weirdly broken in some versions of numpy. Offsets are summed as
+    # int64 nanoseconds instead.
+    seconds = (np.asarray(sdi_dict_raw['hour'], dtype=np.int64) * 3600 +
+               np.asarray(sdi_dict_raw['minute'], dtype=np.int64) * 60 +
+               np.asarray(sdi_dict_raw['second'], dtype=np.int64))
+    microseconds = (seconds * 1000000 +
+                    np.asarray(sdi_dict_raw['microsecond'], dtype=np.int64))
+    nanoseconds = start + microseconds * 1000
 
-    return df[start:end]
+    return pd.DatetimeIndex(nanoseconds.view('M8[ns]'))
 
 
-def _extract_survey_points(survey_line, tide_data, with_pre):
-    survey_line.load_data(survey_line.project_dir)
+def _date_from_line_name(line_name):
+    return datetime.datetime.strptime(line_name[:6], '%y%m%d').date()
 
-    lake_depth = survey_line.lake_depths.get(survey_line.final_lake_depth)
-    preimpoundment_depth = survey_line.preimpoundment_depths.get(
-        survey_line.final_preimpoundment_depth)
 
-    if lake_depth is None:
+def _export_line_block(task):
+    """Return the formatted csv rows (no header) for one survey line. Runs
+    in worker processes, so takes a single picklable argument:
+    (LineExportInfo, interpolator, column_info, with_pre, tide_hash).
+    The export cache is used unless tide_hash is None.
+    """
+    line_info, interpolate_water_surface, column_info, with_pre, tide_hash = task
+    picks = _read_final_picks(line_info, with_pre)
+
+    key = None
+    if tide_hash is not None:
+        key = _export_cache_key(line_info, picks, column_info, with_pre,
+                                tide_hash)
+        block = _read_cached_block(line_info, with_pre, key)
+        if block is not None:
+            return block
+
+    points = _extract_survey_points(line_info, picks,
+                                    interpolate_water_surface,
+                                    with_pre=with_pre)
+    block = ''.join(_format_survey_points(points, column_info))
+    if key is not None:
+        _write_cached_block(line_info, with_pre, key, block)
+    return block
+
+
+def _export_line_points(task):
+    """Return the point columns for one survey line, for the binary export.
+    Runs in worker processes: task is (LineExportInfo, interpolator,
+    with_pre).
+    """
+    line_info, interpolate_water_surface, with_pre = task
+    picks = _read_final_picks(line_info, with_pre)
+    return _extract_survey_points(line_info, picks, interpolate_water_surface,
+                                  with_pre=with_pre)
+
+
+def _write_points_file(path, line_points, columns):
+    """Write the binary point export: line_points is an iterable of
+    (line_name, points) in export order.
+    """
+    filters = tables.Filters(complevel=5, complib='zlib', shuffle=True)
+    line_names = []
+    with tables.openFile(path, 'w') as f:
+        f.root._v_attrs.version = HDF_EXPORT_VERSION
+        f.root._v_attrs.columns = json.dumps(columns)
+        survey_lines_group = f.createGroup(f.root, 'survey_lines')
+        for line_name, points in line_points:
+            _write_points_group(f, survey_lines_group, line_name, points,
+                                columns, filters)
+            line_names.append(line_name)
+        f.root._v_attrs.survey_lines = json.dumps(line_names)
+
+
+def _write_points_group(f, parent, line_name, points, columns, filters):
+    """Write the named point columns of one survey line to a new group"""
+    group = f.createGroup(parent, 'line_' + line_name)
+    n_points = len(points[columns[0]])
+    group._v_attrs.n_points = n_points
+    group._v_attrs.sdi_filename = line_name
+    for column in columns:
+        array = np.asarray(points[column])
+        if array.dtype.kind == 'M':
+            array = array.view(np.int64)
+        if n_points == 0:
+            # compressed (chunked) arrays can not be empty
+            f.createArray(group, column, array)
+        else:
+            carray = f.createCArray(group, column,
+                                    tables.Atom.from_dtype(array.dtype),
+                                    array.shape, filters=filters)
+            carray[:] = array
+
+
+def _read_final_picks(survey_line, with_pre):
+    """Read the final picks and mask of a survey line. The lake depth is
+    None if the line was never opened, in which case the surface from the
+    bin file has not been written as a pick yet and depth_r1 is used.
+    """
+    project_dir = survey_line.project_dir
+    lake_depth = survey_io.read_pick_from_hdf(
+        project_dir, survey_line.name, 'current',
+        survey_line.final_lake_depth)
+    preimpoundment_depth = None
+    if with_pre and survey_line.final_preimpoundment_depth:
+        preimpoundment_depth = survey_io.read_pick_from_hdf(
+            project_dir, survey_line.name, 'preimpoundment',
+            survey_line.final_preimpoundment_depth)
+
+    use_bin_surface = (lake_depth is None and
+                       survey_line.final_lake_depth == CURRENT_SURFACE_FROM_BIN_NAME)
+    if lake_depth is None and not use_bin_surface:
         raise LookupError(
             "Survey line %s does not have a final lake depth set" % survey_line.name)
     if with_pre and preimpoundment_depth is None:
         raise LookupError(
             "Survey line %s does not have a final preimpoundment depth set" % survey_line.name)
 
-    sdi_dict_raw = survey_io.read_sdi_data_unseparated_from_hdf(
-        survey_line.project_dir,
-        survey_line.name)
+    mask = survey_io.read_survey_line_mask_from_hdf(project_dir,
+                                                    survey_line.name)
+    return dict(
+        lake_depth=lake_depth,
+        preimpoundment_depth=preimpoundment_depth,
+        mask=mask,
+    )
+
+
+def _extract_survey_points(survey_line, picks, interpolate_water_surface,
+                           with_pre):
+    lake_depth = picks['lake_depth']
+    preimpoundment_depth = picks['preimpoundment_depth']
+    mask = picks['mask']
+
+    array_names = list(EXPORT_SDI_ARRAYS)
+    if lake_depth is None:
+        array_names.append('depth_r1')
+
+    sdi_dict_raw = survey_io.read_sdi_data_arrays_from_hdf(
+        survey_line.project_dir, survey_line.name, array_names)
+    if lake_depth is None:
+        lake_depth = {'depth_array': sdi_dict_raw['depth_r1']}
 
     x = sdi_dict_raw['interpolated_easting']
     y = sdi_dict_raw['interpolated_northing']
     latitude = sdi_dict_raw['interpolated_latitude']
     longitude = sdi_dict_raw['interpolated_longitude']
 
-    datetime = _parse_datetimes(sdi_dict_raw)
+    datetime = parse_datetimes(sdi_dict_raw)
 
-    lake_elevation = _interpolate_water_surface(tide_data, datetime)
+    lake_elevation = interpolate_water_surface(datetime)
 
-    current_surface_z = _meters_to_feet(lake_depth.depth_array)
+    current_surface_z = _meters_to_feet(lake_depth['depth_array'])
 
-    data_dict = dict(
+    current_surface_elevation = lake_elevation - current_surface_z
+
+    points = dict(
         x=x,
         y=y,
         latitude=latitude,
         longitude=longitude,
+        z=current_surface_z,
         lake_elevation=lake_elevation,
-        current_surface_z=current_surface_z,
-        sdi_filename=survey_line.name,
-        date=datetime.date,
-        time=datetime.time,
+        current_surface_elevation=current_surface_elevation,
+        sdi_filename=np.repeat(survey_line.name, len(datetime)),
+        datetime=np.asarray(datetime, dtype='M8[ns]'),
+        date=_format_dates(datetime),
+        time=_format_times(datetime),
     )
 
     if with_pre:
-        data_dict['pre_impoundment_z'] = _meters_to_feet(preimpoundment_depth.depth_array)
-
-    df = pd.DataFrame(data_dict, index=datetime)
-
-    df['current_surface_elevation'] = df['lake_elevation'] - df['current_surface_z']
-
-    if with_pre:
-        df['pre_impoundment_elevation'] = df['lake_elevation'] - df['pre_impoundment_z']
-        df['sediment_thickness'] = df['current_surface_elevation'] - df['pre_impoundment_elevation']
-
-    df = df.rename(columns={
-        'current_surface_z': 'z',
-    })
+        pre_impoundment_z = _meters_to_feet(
+            preimpoundment_depth['depth_array'])
+        pre_impoundment_elevation = lake_elevation - pre_impoundment_z
+        points['pre_impoundment_elevation'] = pre_impoundment_elevation
+        points['sediment_thickness'] = (current_surface_elevation -
+                                        pre_impoundment_elevation)
 
     # apply mask
-    if len(survey_line.mask):
-        df = df[~survey_line.mask.astype(bool)]
+    if len(mask):
+        keep = ~mask.astype(bool)
+        points = dict((name, column[keep]) for name, column in points.items())
+
+    return points
+
+
+def _format_dates(datetimes):
+    """Return 'YYYY-MM-DD' strings for datetimes, as str(datetime.date)."""
+    return np.asarray(datetimes, dtype='M8[ns]').astype('M8[D]').astype(str)
+
+
+def _format_times(datetimes):
+    """Return 'HH:MM:SS[.ffffff]' strings for datetimes, as
+    str(datetime.time).
+    """
+    nanoseconds = np.asarray(datetimes, dtype='M8[ns]').view(np.int64)
+    microseconds = nanoseconds % (86400 * 10 ** 9) // 1000
+    seconds = microseconds // 1000000
+    microseconds = microseconds % 1000000
+
+    times = np.char.mod('%02d', seconds // 3600)
+    for part in [seconds // 60 % 60, seconds % 60]:
+        times = np.char.add(np.char.add(times, ':'), np.char.mod('%02d', part))
+    fraction = np.where(microseconds != 0,
+                        np.char.mod('.%06d', microseconds), '')
+    return np.char.add(times, fraction)
+
+
+def _format_header(column_info):
+    return ','.join(name for name, decimals, fmt in column_info) + '\n'
+
+
+def _format_survey_points(points, column_info):
+    """Generate csv text for points (a dict of equal length column arrays)
+    in the order given by column_info, a chunk of rows at a time. Numeric
+    columns are rounded to their decimals and formatted with their
+    string_fmt.
+    """
+    row_fmt = ','.join(fmt or '%s' for name, decimals, fmt in column_info)
+    row_fmt += '\n'
+
+    columns = []
+    for name, decimals, fmt in column_info:
+        column = points[name]
+        if decimals is not None:
+            column = np.round(column, decimals=decimals)
+        columns.append(column)
+
+    n_rows = len(columns[0]) if columns else 0
+    for start in range(0, n_rows, EXPORT_CHUNK_SIZE):
+        rows = zip(*[column[start:start + EXPORT_CHUNK_SIZE]
+                     for column in columns])
+        yield ''.join(row_fmt % row for row in rows)
+
+
+def _write_survey_points(f, points, column_info, header=False):
+    """Write points to open csv file f, see _format_survey_points."""
+    if header:
+        f.write(_format_header(column_info))
+    for chunk in _format_survey_points(points, column_info):
+        f.write(chunk)
+
+
+def _imap(func, iterable, processes=1):
+    """Like itertools.imap, but in a pool of processes if processes is more
+    than 1. Results are yielded in order either way.
+    """
+    if processes == 1:
+        for item in iterable:
+            yield func(item)
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap(func, iterable):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _line_export_info(survey_line):
+    return LineExportInfo(
+        name=survey_line.name,
+        project_dir=survey_line.project_dir,
+        status=survey_line.status,
+        final_lake_depth=survey_line.final_lake_depth,
+        final_preimpoundment_depth=survey_line.final_preimpoundment_depth,
+    )
+
 
-    survey_line.unload_data()
-    return df
+def _export_cache_key(survey_line, picks, column_info, with_pre, tide_hash):
+    """Return a hash of everything a line's exported block depends on. The
+    line's sdi data stamp stands in for its (normally unchanging) sdi data;
+    unlike the raw data file's mtime it does not change when other lines
+    are imported or repaired.
+    """
+    sdi_stamp = survey_io.read_sdi_data_stamp_from_hdf(survey_line.project_dir,
+                                                       survey_line.name)
+    key = hashlib.sha1()
+    key.update(repr((EXPORT_CACHE_VERSION, column_info, with_pre, tide_hash,
+                     sdi_stamp, survey_line.name,
+                     survey_line.status, survey_line.final_lake_depth,
+                     survey_line.final_preimpoundment_depth)))
+    for pick in [picks['lake_depth'], picks['preimpoundment_depth']]:
+        if pick is not None:
+            if pick.get('index_range') is not None:
+                key.update(repr(('index_range', pick['index_range'])))
+            for name in ['index_array', 'depth_array']:
+                if name not in pick:
+                    continue
+                array = np.ascontiguousarray(pick[name])
+                key.update(repr((name, array.dtype.str, array.shape)))
+                key.update(array.data)
+    mask = np.ascontiguousarray(picks['mask'])
+    key.update(repr(('mask', mask.dtype.str, mask.shape)))
+    key.update(mask.data)
+    return key.hexdigest()
 
 
 def _get_tide_file_path(survey):
     return os.path.join(survey.project_dir, 'tide_file.txt')
 
 
-def _interpolate_water_surface(water_surface, datetime):
-    wse = water_surface['water_surface_elevation']
-    nans = pd.Series(index=datetime.unique())
-    return wse.combine_first(nans).interpolate(method='time')[datetime]
+def _get_tide_cache_dir(survey):
+    return os.path.join(survey.project_dir, 'tide_cache')
+
+
+def _get_export_cache_path(survey_line, with_pre):
+    suffix = '.csv' if with_pre else '-no-pre.csv'
+    return os.path.join(survey_line.project_dir, 'export_cache',
+                        survey_line.name + suffix)
+
+
+def _read_cached_block(survey_line, with_pre, key):
+    """Return the cached block for survey line if its key matches, else None.
+    The key is stored on the first line of the cache file.
+    """
+    path = _get_export_cache_path(survey_line, with_pre)
+    try:
+        with open(path, 'rb') as f:
+            if f.readline().rstrip('\n') != key:
+                return None
+            return f.read()
+    except IOError:
+        return None
+
+
+def _write_cached_block(survey_line, with_pre, key, block):
+    path = _get_export_cache_path(survey_line, with_pre)
+    dirname = os.path.dirname(path)
+    if not os.path.exists(dirname):
+        try:
+            os.makedirs(dirname)
+        except OSError:
+            # created by another worker
+            pass
+    # write then rename so readers never see a partial block
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(key + '\n')
+        f.write(block)
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+
+def _tide_file_provider(survey):
+    """Return the provider of the project's tide file"""
+    return TideFileProvider(_get_tide_file_path(survey))
+
+
+def _read_tide_interpolator(tide_provider):
+    """Return a water surface interpolator over all of tide_provider's
+    series, see _tide_interpolator.
+    """
+    return _tide_interpolator(tide_provider.get_series())
+
+
+def _tide_interpolator(water_surface):
+    """Return a function that linearly interpolates water surface elevations
+    at an array of datetimes. Build it once per export; each call is a single
+    np.interp over int64 nanoseconds. Like pandas time interpolation, times
+    before the first reading are NaN and times after the last reading take
+    the last value. The function can be pickled for worker processes.
+    """
+    wse = water_surface['water_surface_elevation'].dropna().sort_index()
+    xp = wse.index.asi8
+    fp = wse.values.astype(np.float64)
+    return functools.partial(_interpolate_tide, xp, fp)
+
+
+def _interpolate_tide(xp, fp, datetimes):
+    x = np.asarray(datetimes, dtype='M8[ns]').view(np.int64)
+    if not len(xp):
+        return np.empty(len(x)) * np.nan
+    return np.interp(x, xp, fp, left=np.nan)
 
 
 def _meters_to_feet(arr):
     return arr * 3.28083989501312
-
-
-def _parse_datetimes(sdi_dict_raw):
-    date = datetime.datetime.strptime(sdi_dict_raw['date'][:6], '%y%m%d')
-
-    # note: be wary of using timedelta64; it's more efficient but inconsisent
-    # and weirdly broken in some versions of numpy
-    datetimes = [
-        date + datetime.timedelta(hours=int(t[0]), minutes=int(t[1]), seconds=int(t[2]), microseconds=int(t[3]))
-        for t in zip(sdi_dict_raw['hour'], sdi_dict_raw['minute'], sdi_dict_raw['second'], sdi_dict_raw['microsecond'])
-    ]
-
-    return pd.DatetimeIndex(datetimes)
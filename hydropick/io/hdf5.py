@@ -1,6 +1,9 @@
 import contextlib
 import json
 import os
+import threading
+from timeit import default_timer
+import uuid
 import warnings
 
 import fiona
@@ -10,6 +13,14 @@ import sdi
 from shapely.geometry import MultiLineString, shape, mapping
 import tables
 
+from ..model.depth_line import index_range_from_array
+from ..util.memory import array_nbytes
+from ..util.metrics import METRICS
+
+# PyTables is not thread safe: all file access, from the UI thread or the
+# background line loader, is serialized through this lock.
+HDF5_LOCK = threading.RLock()
+
 
 class HDF5Backend(object):
     """Read/write access for HDF5 data store."""
@@ -22,6 +33,13 @@ class HDF5Backend(object):
     def import_binary_file(self, bin_file):
         data = sdi.binary.read(bin_file)
         data_raw = sdi.binary.read(bin_file, separate=False)
+        return self.import_sdi_data(data, data_raw)
+
+    def import_sdi_data(self, data, data_raw):
+        """imports a survey line from the separated (by frequency) and
+        unseparated dicts read from a binary file by sdi.binary.read.
+        Returns the line name.
+        """
         x = data['frequencies'][-1]['interpolated_easting']
         y = data['frequencies'][-1]['interpolated_northing']
         coords = np.vstack((x, y)).T
@@ -31,8 +49,11 @@ class HDF5Backend(object):
             self._write_array(f, line_group, 'navigation_line', coords)
             f.flush()
 
+        self._repair_trace_nums(line_name, data_raw, data['frequencies'])
         self._write_freq_dicts(line_name, data['frequencies'])
         self._write_raw_sdi_dict(line_name, data_raw)
+        self.write_trace_num_validated(line_name)
+        return line_name
 
         # THIS IS MOVED BACK TO SURVEYLINE LOAD UNTIL TRACE_NUM
         # ERRORS FIXED IN SDI BINARY SO THAT BAD TRACE NUM
@@ -49,7 +70,7 @@ class HDF5Backend(object):
 
     def import_corestick_file(self, corestick_file):
         core_sample_dicts = sdi.corestick.read(corestick_file)
-        self._write_core_samples(core_sample_dicts)
+        self.write_core_samples(core_sample_dicts)
 
     def import_pick_file(self, pick_file):
         line_name = os.path.basename(pick_file).split('.')[0]
@@ -98,6 +119,11 @@ class HDF5Backend(object):
                 geom = MultiLineString([
                     shape(geometry) for geometry in geometries])
 
+        self.write_shoreline(lake_name, geom, crs, properties, shoreline_file)
+
+    def write_shoreline(self, lake_name, geom, crs, properties,
+                        shoreline_file=''):
+        """writes the shoreline geometry (a shapely geometry) of a lake"""
         with self._open_file(self.raw_data_path, 'a') as f:
             shoreline_group = self._get_shoreline_group(f)
             shoreline_group._v_attrs.crs = self._safe_serialize(crs)
@@ -156,6 +182,7 @@ class HDF5Backend(object):
             'properties': properties,
         }
 
+    @METRICS.timed('hdf5.read_sdi_data_unseparated')
     def read_sdi_data_unseparated(self, line_name):
         try:
             with self._open_file(self.raw_data_path, 'r') as f:
@@ -164,8 +191,78 @@ class HDF5Backend(object):
                 sdi_data = dict(data)
         except tables.FileModeError:
             raise tables.NoSuchNodeError
+        METRICS.increment('hdf5.read_bytes', array_nbytes(sdi_data.values()))
         return sdi_data
 
+    def read_sdi_data_stamp(self, line_name):
+        """returns a string that changes whenever a line's sdi data is
+        (re)imported: its import stamp, or the shapes of its arrays for
+        lines imported before stamps were written
+        """
+        try:
+            with self._open_file(self.raw_data_path, 'r') as f:
+                unsep_grp = self._get_sdi_data_unseparated_group(f, line_name)
+                stamp = getattr(unsep_grp._v_attrs, 'import_stamp', None)
+                if stamp is None:
+                    stamp = repr(sorted((node._v_name, node.shape)
+                                        for node in unsep_grp))
+        except tables.FileModeError:
+            raise tables.NoSuchNodeError
+        return stamp
+
+    @METRICS.timed('hdf5.read_sdi_data_arrays')
+    def read_sdi_data_arrays(self, line_name, names, start=None, stop=None):
+        """reads only the named arrays of a line's unseparated sdi data,
+        optionally only the traces from start to stop (scalars, like date,
+        are read whole). Names that are not stored are left out of the
+        returned dict.
+        """
+        try:
+            with self._open_file(self.raw_data_path, 'r') as f:
+                unsep_grp = self._get_sdi_data_unseparated_group(f, line_name)
+                sdi_data = dict([
+                    (name, self._read_slice(f.getNode(unsep_grp, name),
+                                            start, stop))
+                    for name in names if name in unsep_grp
+                ])
+        except tables.FileModeError:
+            raise tables.NoSuchNodeError
+        METRICS.increment('hdf5.read_bytes', array_nbytes(sdi_data.values()))
+        return sdi_data
+
+    @METRICS.timed('hdf5.read_pick')
+    def read_pick(self, line_name, line_type, pick_name, start=None,
+                  stop=None):
+        """returns a single named pick for a given line and type, or None.
+        If start or stop are given only that slice of its arrays is read.
+        """
+        try:
+            path = self._get_pick_path(line_name, line_type)
+            if not os.path.exists(path):
+                return None
+
+            with self._open_file(path, 'r') as f:
+                pick_type_group = self._get_pick_type_group(f, line_name, line_type)
+                if pick_name not in pick_type_group:
+                    return None
+                return self._read_pick(f.getNode(pick_type_group, pick_name),
+                                       start, stop)
+        except tables.FileModeError:
+            return None
+
+    def read_trace_num_validated(self, line_name):
+        """returns True if the line's trace_num arrays have been checked
+        (and repaired if needed) since import
+        """
+        try:
+            with self._open_file(self.raw_data_path, 'r') as f:
+                unsep_grp = self._get_sdi_data_unseparated_group(f, line_name)
+                return bool(getattr(unsep_grp._v_attrs, 'trace_num_validated',
+                                    False))
+        except tables.FileModeError:
+            return False
+
+    @METRICS.timed('hdf5.read_frequency_data')
     def read_frequency_data(self, line_name):
         try:
             with self._open_file(self.raw_data_path, 'r') as f:
@@ -179,6 +276,7 @@ class HDF5Backend(object):
                 ]
         except tables.FileModeError:
             raise tables.NoSuchNodeError
+        METRICS.increment('hdf5.read_bytes', array_nbytes(freq_data))
         return freq_data
 
     def read_survey_line_attrs(self, line_name):
@@ -213,27 +311,90 @@ class HDF5Backend(object):
         except IOError:
             return np.array([], dtype=bool)
 
+    def read_survey_line_mtime(self, line_name):
+        """returns the latest modification time of the files holding the
+        user generated data (picks, attributes, mask) of a survey line, or 0
+        if there are none
+        """
+        mtime = 0
+        line_dir = self._get_survey_line_dir(line_name)
+        for dirpath, dirnames, filenames in os.walk(line_dir):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                mtime = max(mtime, os.path.getmtime(path))
+        return mtime
+
     def write_pick(self, line_data, line_name, line_type):
         """writes a pick line (current surface or preimpoundment) to hdf5 file
         """
+        self.write_picks([line_data], line_name, line_type)
+
+    def write_picks(self, line_datas, line_name, line_type):
+        """writes pick lines of one type to hdf5 file, opening it once
+        """
         path = self._get_pick_path(line_name, line_type)
         with self._open_file(path, 'a') as f:
-            pick_name = line_data['name']
-            pick_line_group = self._get_pick_line_group(f, line_name,
-                                                        line_type, pick_name)
-            for array_name in ['depth_array', 'index_array']:
-                array = line_data.pop(array_name)
-                self._write_array(f, pick_line_group, array_name, array)
-            for key, value in line_data.iteritems():
-                pick_line_group._v_attrs[key] = self._safe_serialize(value)
+            for line_data in line_datas:
+                self._write_pick(f, line_data, line_name, line_type)
+
+    def write_trace_num_arrays(self, line_name, trace_num, freq_trace_num):
+        """writes repaired trace_num arrays and marks them validated.
+        freq_trace_num is keyed by str(kHz) as SurveyLine.freq_trace_num
+        """
+        with self._open_file(self.raw_data_path, 'a') as f:
+            unsep_grp = self._get_sdi_data_unseparated_group(f, line_name)
+            self._write_array(f, unsep_grp, 'trace_num', trace_num)
+            for freq_group in self._get_frequencies_group(f, line_name):
+                key = str(np.float(freq_group._v_name[4:].replace('_', '.')))
+                if key in freq_trace_num:
+                    self._write_array(f, freq_group, 'trace_num',
+                                      freq_trace_num[key])
+            unsep_grp._v_attrs.trace_num_validated = True
+            f.flush()
+
+    def write_trace_num_validated(self, line_name):
+        """marks the line's trace_num arrays as checked"""
+        with self._open_file(self.raw_data_path, 'a') as f:
+            unsep_grp = self._get_sdi_data_unseparated_group(f, line_name)
+            unsep_grp._v_attrs.trace_num_validated = True
+            f.flush()
 
     def write_survey_line_attrs(self, attrs_dict, line_name):
         """writes survey line attributes
         """
         line_dir = self._get_survey_line_dir(line_name)
         path = os.path.join(line_dir, 'attributes.json')
-        with self._open_file(path, 'w', open) as f:
+        # write then rename so a crash never leaves a partial file
+        tmp_path = path + '.tmp'
+        with self._open_file(tmp_path, 'w', open) as f:
             json.dump(attrs_dict, f)
+            f.flush()
+            os.fsync(f.fileno())
+        with HDF5_LOCK:
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(tmp_path, path)
+
+    def sync_survey_line(self, line_name):
+        """flushes the files holding the user generated data of a survey
+        line to disk
+        """
+        line_dir = self._get_survey_line_dir(line_name)
+        with HDF5_LOCK:
+            for dirpath, dirnames, filenames in os.walk(line_dir):
+                for filename in filenames:
+                    if '-lock' in filename:
+                        continue
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        fd = os.open(path, os.O_RDWR)
+                        try:
+                            os.fsync(fd)
+                        finally:
+                            os.close(fd)
+                    except OSError as e:
+                        warnings.warn('could not sync {}: {}'.format(
+                            filename, e))
 
     def write_survey_line_mask(self, mask, line_name):
         """writes survey line mask"""
@@ -358,13 +519,30 @@ class HDF5Backend(object):
         if not os.path.exists(dirname):
             os.makedirs(dirname)
 
-        if 'a' in mode or 'w' in mode:
-            with lockfile.LockFile(filepath + '-lock'):
-                with opener(filepath, mode) as f:
+        METRICS.increment('hdf5.opens')
+        # time spent waiting for another thread's file access
+        with METRICS.timer('hdf5.lock_wait'):
+            HDF5_LOCK.acquire()
+        try:
+            if 'a' in mode or 'w' in mode:
+                with lockfile.LockFile(filepath + '-lock'):
+                    with self._timed_open(opener, filepath, mode) as f:
+                        yield f
+            else:
+                with self._timed_open(opener, filepath, mode) as f:
                     yield f
-        else:
-            with opener(filepath, mode) as f:
-                yield f
+        finally:
+            HDF5_LOCK.release()
+
+    @contextlib.contextmanager
+    def _timed_open(self, opener, filepath, mode):
+        """context manager for opener(filepath, mode) that records the time
+        taken to open the file, not to use it, as hdf5.open_file
+        """
+        start = default_timer()
+        with opener(filepath, mode) as f:
+            METRICS.record_time('hdf5.open_file', default_timer() - start)
+            yield f
 
     @contextlib.contextmanager
     def _open_file_helper(self, filepath, mode):
@@ -379,7 +557,29 @@ class HDF5Backend(object):
             else:
                 yield f
 
-    def _read_pick(self, pick_line_group):
+    def _write_pick(self, f, line_data, line_name, line_type):
+        """writes a dict representation of a pick line to its group"""
+        pick_name = line_data['name']
+        pick_line_group = self._get_pick_line_group(f, line_name,
+                                                    line_type, pick_name)
+        self._write_array(f, pick_line_group, 'depth_array',
+                          line_data.pop('depth_array'))
+        index_array = line_data.pop('index_array', None)
+        index_range = line_data.pop('index_range', None)
+        if index_range is None and index_array is not None:
+            index_range = index_range_from_array(index_array)
+        if index_range is None:
+            self._write_array(f, pick_line_group, 'index_array', index_array)
+            line_data['index_range'] = None
+        else:
+            # evenly spaced indices are stored as (start, stop, step)
+            if 'index_array' in pick_line_group:
+                pick_line_group.index_array.remove()
+            line_data['index_range'] = [int(i) for i in index_range]
+        for key, value in line_data.iteritems():
+            pick_line_group._v_attrs[key] = self._safe_serialize(value)
+
+    def _read_pick(self, pick_line_group, start=None, stop=None):
         """returns a dict representation of a pick line group"""
         ignore_keys = ['CLASS', 'VERSION', 'TITLE']
         d = dict([
@@ -387,10 +587,39 @@ class HDF5Backend(object):
             for key in pick_line_group._v_attrs._v_attrnames
             if key not in ignore_keys
         ])
-        d['depth_array'] = pick_line_group.depth_array.read()
-        d['index_array'] = pick_line_group.index_array.read()
+        d['depth_array'] = pick_line_group.depth_array.read(start, stop)
+        index_range = d.pop('index_range', None)
+        if index_range is None:
+            d['index_array'] = pick_line_group.index_array.read(start, stop)
+        else:
+            first, last, step = index_range
+            n = len(xrange(first, last, step))
+            i, j, _ = slice(start, stop).indices(n)
+            d['index_range'] = (first + i * step, first + j * step, step)
         return d
 
+    def _read_slice(self, array, start=None, stop=None):
+        """reads array[start:stop], or all of a scalar array"""
+        if array.shape == ():
+            return array.read()
+        return array.read(start, stop)
+
+    def _repair_trace_nums(self, line_name, data_raw, freq_dicts):
+        """repairs bad trace_num values in the arrays read from a binary
+        file, in place, before they are written
+        """
+        # note: deferred to avoid circular import
+        from . import survey_io
+        freq_trace_num = dict((i, freq_dict['trace_num'])
+                              for i, freq_dict in enumerate(freq_dicts))
+        trace_num, freq_trace_num, repaired = \
+            survey_io.repair_trace_num_arrays(data_raw['trace_num'],
+                                              freq_trace_num, line_name)
+        if repaired:
+            data_raw['trace_num'] = trace_num
+            for i, freq_dict in enumerate(freq_dicts):
+                freq_dict['trace_num'] = freq_trace_num[i]
+
     def _safe_serialize(self, obj):
         """
         Serialize to a native datatype that can be safely stored and
@@ -426,7 +655,10 @@ class HDF5Backend(object):
         else:
             f.createArray(group, name, array)
 
-    def _write_core_samples(self, core_sample_dicts):
+    def write_core_samples(self, core_sample_dicts):
+        """writes core samples, a dict of core dicts as read by
+        sdi.corestick.read keyed by core id
+        """
         with self._open_file(self.raw_data_path, 'a') as f:
             core_samples_group = self._get_core_samples_group(f)
             core_samples_group._v_attrs.core_samples = self._safe_serialize(core_sample_dicts)
@@ -451,4 +683,7 @@ class HDF5Backend(object):
                     if key is 'date':
                         value = line_name
                     self._write_array(f, sdi_unsep_grp, key, value)
+            # changes whenever the line is (re)imported, see
+            # read_sdi_data_stamp
+            sdi_unsep_grp._v_attrs.import_stamp = uuid.uuid4().hex
             f.flush()
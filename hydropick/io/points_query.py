@@ -0,0 +1,316 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+"""Spatial queries of the picked points of a survey.
+
+SurveyPointsIndex indexes the trace locations of every survey line, with a
+bounding box per line and a uniform grid over all traces, so that the
+points in a bbox or polygon are found without reading the survey.  Only the
+slices of the lines' picks and sdi arrays covering the matching traces are
+then read from the project store.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import os
+
+import numpy as np
+
+from . import survey_io
+from .export_survey import parse_datetimes
+from ..model.gridding import points_in_polygon
+from ..model.survey_line import CURRENT_SURFACE_FROM_BIN_NAME
+
+logger = logging.getLogger(__name__)
+
+# default side of the index grid cells, in survey (easting/northing) units
+POINTS_INDEX_CELL_SIZE = 100.0
+
+# bump when the layout of the index file changes
+POINTS_INDEX_VERSION = 1
+
+# sdi arrays read for the matching traces of each line
+QUERY_SDI_ARRAYS = ['date', 'hour', 'minute', 'second', 'microsecond']
+
+# columns of a query result
+QUERY_COLUMNS = ['line_name', 'trace', 'x', 'y', 'lake_depth',
+                 'preimpoundment_depth', 'mask', 'datetime']
+
+
+class SurveyPointsIndex(object):
+    """Index of the trace locations of a set of survey lines.
+
+    The index is built from the lines' interpolated eastings and northings
+    on first use and kept in the project directory (points_index.npz),
+    rebuilt only when the raw data, the set of lines or the cell size
+    change.
+    """
+
+    def __init__(self, survey_lines, project_dir,
+                 cell_size=POINTS_INDEX_CELL_SIZE):
+        self.survey_lines = dict((line.name, line) for line in survey_lines)
+        self.line_names = sorted(self.survey_lines)
+        self.project_dir = project_dir
+        self.cell_size = float(cell_size)
+        self.cache_path = os.path.join(project_dir, 'points_index.npz')
+        self._index = None
+
+    def lines_in_bbox(self, xmin, ymin, xmax, ymax):
+        """Return the names of lines whose bounding box meets the bbox"""
+        index = self._get_index()
+        bboxes = index['bboxes']
+        hit = ((bboxes[:, 0] <= xmax) & (bboxes[:, 2] >= xmin) &
+               (bboxes[:, 1] <= ymax) & (bboxes[:, 3] >= ymin))
+        return [self.line_names[i] for i in np.nonzero(hit)[0]]
+
+    def query_bbox(self, xmin, ymin, xmax, ymax):
+        """Return the points within a bbox, see query_polygon"""
+        points = self._find_points(xmin, ymin, xmax, ymax)
+        return self._read_points(points)
+
+    def query_polygon(self, polygon):
+        """Return the points within a (shapely) polygon as a dict of
+        arrays: line_name, trace (index into the line's traces), x, y, the
+        final lake_depth and preimpoundment_depth (NaN where there is none),
+        mask and datetime (M8[ns]).  Points are ordered by line, then trace.
+        """
+        points = self._find_points(*polygon.bounds)
+        index = self._get_index()
+        inside = points_in_polygon(index['x'][points], index['y'][points],
+                                   polygon)
+        return self._read_points(points[inside])
+
+    def _find_points(self, xmin, ymin, xmax, ymax):
+        """Return the sorted indices of the traces within the bbox"""
+        index = self._get_index()
+        if not len(index['x']) or not self.lines_in_bbox(xmin, ymin,
+                                                         xmax, ymax):
+            return np.array([], dtype=np.int64)
+
+        origin_x, origin_y, n_rows = index['grid']
+        col0, row0 = self._cell(xmin, ymin, origin_x, origin_y)
+        col1, row1 = self._cell(xmax, ymax, origin_x, origin_y)
+        row0 = max(row0, 0)
+        row1 = min(row1, n_rows - 1)
+        cell_keys = index['cell_keys']
+        pieces = []
+        if row0 <= row1:
+            # cells of a grid column are contiguous in the sorted keys
+            for col in range(max(col0, 0), col1 + 1):
+                lo, hi = np.searchsorted(cell_keys,
+                                         [col * n_rows + row0,
+                                          col * n_rows + row1 + 1])
+                pieces.append(index['order'][lo:hi])
+        if not pieces:
+            return np.array([], dtype=np.int64)
+        points = np.sort(np.concatenate(pieces))
+        x = index['x'][points]
+        y = index['y'][points]
+        within = (x >= xmin) & (x <= xmax) & (y >= ymin) & (y <= ymax)
+        return points[within]
+
+    def _cell(self, x, y, origin_x, origin_y):
+        col = int(np.floor((x - origin_x) / self.cell_size))
+        row = int(np.floor((y - origin_y) / self.cell_size))
+        return col, row
+
+    def _read_points(self, points):
+        """Read the picks, mask and times of the given (sorted) traces"""
+        index = self._get_index()
+        offsets = index['offsets']
+        line_ids = np.searchsorted(offsets, points, side='right') - 1
+        pieces = dict((column, []) for column in QUERY_COLUMNS)
+        for line_id in np.unique(line_ids):
+            line_points = points[line_ids == line_id]
+            traces = line_points - offsets[line_id]
+            name = self.line_names[line_id]
+            line_data = self._read_line_slice(self.survey_lines[name], traces)
+            line_data['line_name'] = np.repeat(name, len(traces))
+            line_data['trace'] = traces
+            line_data['x'] = index['x'][line_points]
+            line_data['y'] = index['y'][line_points]
+            for column in QUERY_COLUMNS:
+                pieces[column].append(line_data[column])
+
+        result = {}
+        for column, arrays in pieces.items():
+            if arrays:
+                result[column] = np.concatenate(arrays)
+            else:
+                result[column] = np.array([])
+        if not len(points):
+            result['trace'] = result['trace'].astype(np.int64)
+            result['mask'] = result['mask'].astype(bool)
+            result['datetime'] = result['datetime'].astype('M8[ns]')
+        return result
+
+    def _read_line_slice(self, survey_line, traces):
+        """Read the data of traces (sorted indices) of one survey line,
+        reading only the slice of each array that covers them.
+        """
+        start = int(traces[0])
+        stop = int(traces[-1]) + 1
+        offsets = traces - start
+        project_dir = self.project_dir
+        name = survey_line.name
+
+        array_names = list(QUERY_SDI_ARRAYS)
+        lake_depth = self._read_pick_depths(
+            name, 'current', survey_line.final_lake_depth, traces)
+        if (lake_depth is None and
+                survey_line.final_lake_depth == CURRENT_SURFACE_FROM_BIN_NAME):
+            # line never opened: the surface is still only in the bin data
+            array_names.append('depth_r1')
+        sdi_data = survey_io.read_sdi_data_arrays_from_hdf(
+            project_dir, name, array_names, start, stop)
+        if 'depth_r1' in sdi_data:
+            lake_depth = sdi_data['depth_r1'][offsets]
+
+        preimpoundment_depth = None
+        if survey_line.final_preimpoundment_depth:
+            preimpoundment_depth = self._read_pick_depths(
+                name, 'preimpoundment',
+                survey_line.final_preimpoundment_depth, traces)
+
+        mask = survey_io.read_survey_line_mask_from_hdf(project_dir, name)
+        if len(mask):
+            mask = mask[start:stop][offsets].astype(bool)
+        else:
+            mask = np.zeros(len(traces), dtype=bool)
+
+        missing = np.empty(len(traces))
+        missing.fill(np.nan)
+        datetimes = parse_datetimes(sdi_data)
+        return dict(
+            lake_depth=missing if lake_depth is None else lake_depth,
+            preimpoundment_depth=(missing if preimpoundment_depth is None
+                                  else preimpoundment_depth),
+            mask=mask,
+            datetime=np.asarray(datetimes, dtype='M8[ns]')[offsets],
+        )
+
+    def _read_pick_depths(self, line_name, line_type, pick_name, traces):
+        """Return the depths of a pick at traces (NaN where it has none),
+        or None if there is no such pick.  Picks normally hold one depth per
+        trace, so only the slice covering the traces is read.
+        """
+        start = int(traces[0])
+        stop = int(traces[-1]) + 1
+        pick = survey_io.read_pick_from_hdf(self.project_dir, line_name,
+                                            line_type, pick_name, start, stop)
+        if pick is None:
+            return None
+        if (pick.get('index_range') == (start, stop, 1) or
+                np.array_equal(pick.get('index_array'),
+                               np.arange(start, stop))):
+            return pick['depth_array'][traces - start]
+
+        pick = survey_io.read_pick_from_hdf(self.project_dir, line_name,
+                                            line_type, pick_name)
+        if pick.get('index_range') is not None:
+            index_array = np.arange(*pick['index_range'])
+        else:
+            index_array = pick['index_array']
+        depths = np.empty(len(traces))
+        depths.fill(np.nan)
+        if not len(index_array):
+            return depths
+        order = np.argsort(index_array)
+        sorted_index = index_array[order]
+        positions = np.clip(np.searchsorted(sorted_index, traces), 0,
+                            len(order) - 1)
+        found = sorted_index[positions] == traces
+        depths[found] = pick['depth_array'][order[positions[found]]]
+        return depths
+
+    def _get_index(self):
+        if self._index is None:
+            stamp = self._stamp()
+            self._index = self._read_index(stamp)
+            if self._index is None:
+                self._index = self._build_index()
+                self._write_index(stamp)
+        return self._index
+
+    def _build_index(self):
+        logger.info('Building points index for {} survey lines'
+                    .format(len(self.line_names)))
+        xs, ys, bboxes = [], [], []
+        for name in self.line_names:
+            coords = survey_io.read_sdi_data_arrays_from_hdf(
+                self.project_dir, name,
+                ['interpolated_easting', 'interpolated_northing'])
+            x = np.asarray(coords['interpolated_easting'], dtype=np.float64)
+            y = np.asarray(coords['interpolated_northing'], dtype=np.float64)
+            xs.append(x)
+            ys.append(y)
+            finite = np.isfinite(x) & np.isfinite(y)
+            if finite.any():
+                bboxes.append([x[finite].min(), y[finite].min(),
+                               x[finite].max(), y[finite].max()])
+            else:
+                bboxes.append([np.nan] * 4)
+
+        offsets = np.cumsum([0] + [len(x) for x in xs])
+        x = np.concatenate(xs) if xs else np.array([])
+        y = np.concatenate(ys) if ys else np.array([])
+
+        # per trace grid: traces sorted by cell key (column major)
+        finite = np.nonzero(np.isfinite(x) & np.isfinite(y))[0]
+        if len(finite):
+            origin_x = x[finite].min()
+            origin_y = y[finite].min()
+        else:
+            origin_x = origin_y = 0.0
+        cols = np.floor((x[finite] - origin_x) / self.cell_size)
+        rows = np.floor((y[finite] - origin_y) / self.cell_size)
+        n_rows = int(rows.max()) + 1 if len(rows) else 1
+        keys = cols.astype(np.int64) * n_rows + rows.astype(np.int64)
+        order = np.argsort(keys, kind='mergesort')
+
+        return dict(
+            x=x, y=y, offsets=offsets,
+            bboxes=np.array(bboxes, dtype=np.float64).reshape(-1, 4),
+            cell_keys=keys[order], order=finite[order],
+            grid=(origin_x, origin_y, n_rows),
+        )
+
+    def _stamp(self):
+        raw_data_path = os.path.join(self.project_dir, 'raw_data.h5')
+        stat = os.stat(raw_data_path)
+        return repr((POINTS_INDEX_VERSION, stat.st_mtime, stat.st_size,
+                     self.cell_size, self.line_names))
+
+    def _read_index(self, stamp):
+        if not os.path.exists(self.cache_path):
+            return None
+        npz = np.load(self.cache_path)
+        try:
+            if str(npz['stamp']) != stamp:
+                return None
+            origin_x, origin_y, n_rows = npz['grid']
+            index = dict((name, npz[name]) for name in
+                         ['x', 'y', 'offsets', 'bboxes', 'cell_keys',
+                          'order'])
+            index['grid'] = (origin_x, origin_y, int(n_rows))
+            return index
+        finally:
+            npz.close()
+
+    def _write_index(self, stamp):
+        index = self._index
+        # write then rename so a reader never sees a partial file
+        tmp_path = '{}.{}.tmp'.format(self.cache_path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, stamp=np.array(stamp), grid=np.array(index['grid']),
+                     **dict((name, index[name]) for name in
+                            ['x', 'y', 'offsets', 'bboxes', 'cell_keys',
+                             'order']))
+        if os.name == 'nt' and os.path.exists(self.cache_path):
+            os.remove(self.cache_path)
+        os.rename(tmp_path, self.cache_path)
+
@@ -15,6 +15,7 @@ from . import hdf5
 from ..model.depth_line import DepthLine
 from ..model.survey_line import SurveyLine
 from ..model.lake import Lake
+from ..util.metrics import METRICS
 
 logger = logging.getLogger(__name__)
 
@@ -57,6 +58,9 @@ def read_survey_line_from_hdf(project_dir, name):
     line = SurveyLine(name=name,
                       data_file_path=project_dir,
                       navigation_line=LineString(coords), **attrs_dict)
+    # same as on disk; the mask is read with the line data
+    line.attrs_dirty = False
+    line.mask_dirty = False
     return line
 
 
@@ -68,6 +72,26 @@ def read_survey_line_mask_from_hdf(project_dir, name):
     return hdf5.HDF5Backend(project_dir).read_survey_line_mask(name)
 
 
+def read_survey_line_mtime_from_hdf(project_dir, name):
+    return hdf5.HDF5Backend(project_dir).read_survey_line_mtime(name)
+
+
+def read_sdi_data_stamp_from_hdf(project_dir, name):
+    return hdf5.HDF5Backend(project_dir).read_sdi_data_stamp(name)
+
+
+def read_sdi_data_arrays_from_hdf(project_dir, name, array_names,
+                                  start=None, stop=None):
+    return hdf5.HDF5Backend(project_dir).read_sdi_data_arrays(
+        name, array_names, start, stop)
+
+
+def read_pick_from_hdf(project_dir, line_name, line_type, pick_name,
+                       start=None, stop=None):
+    return hdf5.HDF5Backend(project_dir).read_pick(line_name, line_type,
+                                                   pick_name, start, stop)
+
+
 def read_frequency_data_from_hdf(project_dir, name):
     return hdf5.HDF5Backend(project_dir).read_frequency_data(name)
 
@@ -80,7 +104,7 @@ def read_pick_lines_from_hdf(project_dir, line_name, line_type):
     pick_lines = hdf5.HDF5Backend(project_dir).read_picks(line_name, line_type)
 
     return dict([
-        (name, DepthLine(**pick_line))
+        (name, _depth_line_from_pick(pick_line))
         for name, pick_line in pick_lines.iteritems()
     ])
 
@@ -91,11 +115,117 @@ def read_one_pick_line_from_hdf(pic_name, pick_lines=None, project_dir=None,
         backend = hdf5.HDF5Backend(project_dir)
         pick_lines = backend.read_picks(line_name, line_type)
     pick_line = pick_lines[pic_name]
+    depth_line = _depth_line_from_pick(pick_line)
+    return depth_line
+
+
+def _depth_line_from_pick(pick_line):
     depth_line = DepthLine(**pick_line)
+    # same as on disk
+    depth_line.dirty = False
     return depth_line
 
 
 def write_depth_line_to_hdf(project_dir, depth_line, survey_line_name):
+    hdf5.HDF5Backend(project_dir).write_pick(_depth_line_data(depth_line),
+                                             survey_line_name,
+                                             _pick_line_type(depth_line))
+    depth_line.dirty = False
+
+
+def write_survey_line_to_hdf(project_dir, survey_line, changed_only=False):
+    ''' writes survey line's depth lines, attributes and mask.  If
+    changed_only, only the dirty depth lines and the attributes or mask if
+    they changed are written, and each pick file is opened once.
+    '''
+    snapshot = survey_line_snapshot(survey_line, changed_only)
+    write_survey_line_snapshot(project_dir, snapshot)
+
+
+def survey_line_snapshot(survey_line, changed_only=True):
+    ''' returns a copy of the survey line data to be written (see
+    write_survey_line_to_hdf) and marks it as written.  The snapshot does
+    not share arrays with the survey line, so it can be written on another
+    thread while editing continues.
+    '''
+    depth_line_dicts = [
+        survey_line.lake_depths,
+        survey_line.preimpoundment_depths
+    ]
+    picks = {'current': [], 'preimpoundment': []}
+    for depth_line_dict in depth_line_dicts:
+        for depth_line in depth_line_dict.values():
+            if depth_line.dirty or not changed_only:
+                picks[_pick_line_type(depth_line)].append(
+                    _depth_line_data(depth_line, copy=True))
+                depth_line.dirty = False
+
+    attrs_dict = None
+    if survey_line.attrs_dirty or not changed_only:
+        attrs_dict = {
+            'final_lake_depth': survey_line.final_lake_depth,
+            'final_preimpoundment_depth': survey_line.final_preimpoundment_depth,
+            'status': survey_line.status,
+            'status_string': survey_line.status_string
+        }
+        survey_line.attrs_dirty = False
+
+    mask = None
+    if survey_line.mask_dirty or not changed_only:
+        mask = np.array(survey_line.mask)
+        survey_line.mask_dirty = False
+
+    return dict(name=survey_line.name, picks=picks, attrs=attrs_dict,
+                mask=mask)
+
+
+def mark_snapshot_unwritten(survey_line, snapshot):
+    ''' marks the data in a snapshot of survey_line as changed again, e.g.
+    after writing it failed, so that the next snapshot includes it.
+    '''
+    unwritten = set(
+        (line_type, line_data['name'])
+        for line_type, line_datas in snapshot['picks'].items()
+        for line_data in line_datas
+    )
+    for depth_line_dict in [survey_line.lake_depths,
+                            survey_line.preimpoundment_depths]:
+        for depth_line in depth_line_dict.values():
+            if (_pick_line_type(depth_line), depth_line.name) in unwritten:
+                depth_line.dirty = True
+    if snapshot['attrs'] is not None:
+        survey_line.attrs_dirty = True
+    if snapshot['mask'] is not None:
+        survey_line.mask_dirty = True
+
+
+def snapshot_is_empty(snapshot):
+    return (not any(snapshot['picks'].values()) and
+            snapshot['attrs'] is None and snapshot['mask'] is None)
+
+
+@METRICS.timed('survey_line.save')
+def write_survey_line_snapshot(project_dir, snapshot, sync=False):
+    ''' writes a snapshot from survey_line_snapshot.  If sync, the files
+    written are synced to disk before returning.
+    '''
+    backend = hdf5.HDF5Backend(project_dir)
+    name = snapshot['name']
+    for line_type, line_datas in snapshot['picks'].items():
+        if line_datas:
+            backend.write_picks(line_datas, name, line_type)
+    if snapshot['attrs'] is not None:
+        backend.write_survey_line_attrs(snapshot['attrs'], name)
+    if snapshot['mask'] is not None:
+        backend.write_survey_line_mask(snapshot['mask'], name)
+    if sync:
+        backend.sync_survey_line(name)
+
+
+def _depth_line_data(depth_line, copy=False):
+    ''' returns the dict of a depth line's data written by write_pick.
+    If copy, its arrays are copies.
+    '''
     d = depth_line
     data = dict(
         name=d.name,
@@ -104,38 +234,79 @@ def write_depth_line_to_hdf(project_dir, depth_line, survey_line_name):
         source=d.source,
         source_name=d.source_name,
         args=d.args,
-        index_array=d.index_array,
+        index_range=d.index_range,
+        index_array=d.index_array if d.index_range is None else None,
         depth_array=d.depth_array,
         edited=d.edited,
         color=str(d.color.getRgb()),   # so pytables can handle it
         notes=d.notes,
         locked=d.locked,
     )
-    if d.line_type == 'current surface':
-        line_type = 'current'
+    if copy:
+        for key in ['index_array', 'depth_array']:
+            if data[key] is not None:
+                data[key] = np.array(data[key])
+    return data
+
+
+def _pick_line_type(depth_line):
+    if depth_line.line_type == 'current surface':
+        return 'current'
     else:
-        line_type = 'preimpoundment'
-    hdf5.HDF5Backend(project_dir).write_pick(data, survey_line_name, line_type)
+        return 'preimpoundment'
 
 
-def write_survey_line_to_hdf(project_dir, survey_line):
-    depth_line_dicts = [
-        survey_line.lake_depths,
-        survey_line.preimpoundment_depths
-    ]
-    for depth_line_dict in depth_line_dicts:
-        for depth_line in depth_line_dict.values():
-            write_depth_line_to_hdf(project_dir, depth_line, survey_line.name)
+def read_trace_num_validated_from_hdf(project_dir, name):
+    return hdf5.HDF5Backend(project_dir).read_trace_num_validated(name)
+
+
+def write_trace_num_arrays_to_hdf(project_dir, name, trace_num,
+                                  freq_trace_num):
+    hdf5.HDF5Backend(project_dir).write_trace_num_arrays(name, trace_num,
+                                                         freq_trace_num)
 
-    attrs_dict = {
-        'final_lake_depth': survey_line.final_lake_depth,
-        'final_preimpoundment_depth': survey_line.final_preimpoundment_depth,
-        'status': survey_line.status,
-        'status_string': survey_line.status_string
-    }
 
-    hdf5.HDF5Backend(project_dir).write_survey_line_attrs(attrs_dict, survey_line.name)
-    hdf5.HDF5Backend(project_dir).write_survey_line_mask(survey_line.mask, survey_line.name)
+def write_trace_num_validated_to_hdf(project_dir, name):
+    hdf5.HDF5Backend(project_dir).write_trace_num_validated(name)
+
+
+def validate_trace_num_arrays(project_dir, name, trace_num, freq_trace_num):
+    ''' returns (trace_num, freq_trace_num) as read for line name, repaired
+    if the line was imported before trace_num arrays were repaired on
+    import.  The first time, the repair (or just the validated flag) is
+    written to raw_data.h5.  That is done under HDF5_LOCK so a line read by
+    the prefetch and UI threads at once is repaired and written only once.
+    '''
+    if read_trace_num_validated_from_hdf(project_dir, name):
+        return trace_num, freq_trace_num
+    with hdf5.HDF5_LOCK:
+        # another thread may have stored the repair since the arrays were
+        # read, so repair them in memory either way
+        validated = read_trace_num_validated_from_hdf(project_dir, name)
+        trace_num, freq_trace_num, repaired = repair_trace_num_arrays(
+            trace_num, freq_trace_num, name)
+        if not validated:
+            if repaired:
+                write_trace_num_arrays_to_hdf(project_dir, name, trace_num,
+                                              freq_trace_num)
+            else:
+                write_trace_num_validated_to_hdf(project_dir, name)
+    return trace_num, freq_trace_num
+
+
+def repair_trace_num_arrays(trace_num_array, freq_trace_num,
+                            survey_line_name):
+    ''' checks trace_num array and fixes it and the freq_trace_num arrays
+    if it has bad values.  Returns (trace_num_array, freq_trace_num,
+    repaired) where repaired is True if anything changed.
+    '''
+    bad_indices, bad_values = check_trace_num_array(trace_num_array,
+                                                    survey_line_name)
+    if not len(bad_indices):
+        return trace_num_array, freq_trace_num, False
+    trace_num_array, freq_trace_num = fix_trace_num_arrays(
+        trace_num_array, bad_indices, freq_trace_num)
+    return trace_num_array, freq_trace_num, True
 
 
 def check_trace_num_array(trace_num_array, survey_line_name):
@@ -149,11 +320,11 @@ def check_trace_num_array(trace_num_array, survey_line_name):
     # this returns index for any traces that don't match ref
     bad_indices = np.nonzero(trace_num_array - ref)[0]
     bad_values = trace_num_array[bad_indices]
-    if bad_indices:
+    if len(bad_indices):
         # log the problem
         s = '''trace_num not contiguous for array: {}.
         values of {} at traces {}
-        '''.format('name', bad_values, bad_indices + 1)
+        '''.format(survey_line_name, bad_values, bad_indices + 1)
         logger.warn(s)
 
     return bad_indices, bad_values
@@ -163,17 +334,33 @@ def fix_trace_num_arrays(trace_num_array, bad_indices, freq_trace_num):
     ''' Replaces bad trace num values with the appropriate sequential value,
     then fixes main trace num_array
     This should really be done in sdi binary read but for now this is a fix.
+
+    Each freq_trace_num array holds, in order, the trace numbers of a subset
+    of the traces, so the k-th value of a frequency's array belongs at the
+    k-th trace whose (possibly bad) value is in that array.  All bad traces
+    of all frequencies are fixed at once from a membership matrix of traces
+    by frequency.
     '''
-    for freq, trace_array in freq_trace_num.items():
-        # find the trace num indices in the freq trace num subset
-        indices_in_freq = np.where(np.in1d(trace_num_array, trace_array))[0]
-        # get trace num indices of bad traces in this freq_trace_num array
-        bad_in_freq = bad_indices[np.in1d(bad_indices, indices_in_freq)]
-        for index in bad_in_freq:
-            # find the index in freq trace num where this index should go
-            i_in_freq = np.searchsorted(indices_in_freq, index)
-            # set the value to correct trace number which is the index + 1
-            trace_array[i_in_freq] = index + 1
+    keys = list(freq_trace_num.keys())
+    trace_num_array = np.asarray(trace_num_array)
+    bad_indices = np.asarray(bad_indices, dtype=np.int64)
+    if keys and len(bad_indices):
+        trace_arrays = [np.asarray(freq_trace_num[key]) for key in keys]
+        sizes = np.array([len(array) for array in trace_arrays])
+        starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        # membership[f, i]: trace i's value is in frequency f's trace nums
+        membership = np.vstack([np.in1d(trace_num_array, array)
+                                for array in trace_arrays])
+        # position of each trace within each frequency's array
+        ranks = np.cumsum(membership, axis=1) - 1
+        freq, bad = np.nonzero(membership[:, bad_indices])
+        positions = ranks[freq, bad_indices[bad]]
+        valid = positions < sizes[freq]
+        values = np.concatenate(trace_arrays)
+        values[starts[freq[valid]] + positions[valid]] = \
+            bad_indices[bad[valid]] + 1
+        for key, start, size in zip(keys, starts, sizes):
+            freq_trace_num[key] = values[start:start + size]
     trace_num_array = np.arange(1, len(trace_num_array) + 1)
 
     return trace_num_array, freq_trace_num
@@ -0,0 +1,322 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+import datetime
+import os
+import pickle
+import shutil
+from StringIO import StringIO
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hydropick.io import export_survey, hdf5
+from hydropick.io.tide import StaticTideProvider
+
+
+class FakeSurveyLine(object):
+    def __init__(self, name, project_dir=None, status='approved',
+                 final_preimpoundment_depth=''):
+        self.name = name
+        self.project_dir = project_dir
+        self.status = status
+        self.final_lake_depth = 'current_surface_from_bin'
+        self.final_preimpoundment_depth = final_preimpoundment_depth
+
+
+class FakeSurvey(object):
+    def __init__(self, project_dir, survey_lines):
+        self.project_dir = project_dir
+        self.survey_lines = survey_lines
+
+
+def write_sdi_data(project_dir, name, n=4):
+    """Write the raw sdi arrays an export reads for line name"""
+    trace = np.arange(n)
+    hdf5.HDF5Backend(project_dir)._write_raw_sdi_dict(name, {
+        'interpolated_easting': trace * 10.0,
+        'interpolated_northing': np.repeat(float(name[-1]), n),
+        'interpolated_latitude': np.repeat(29.5, n),
+        'interpolated_longitude': np.repeat(-97.5, n),
+        'date': name,
+        'hour': trace,
+        'minute': np.zeros(n, dtype=int),
+        'second': np.zeros(n, dtype=int),
+        'microsecond': np.zeros(n, dtype=int),
+        'depth_r1': np.repeat(1.0, n),
+    })
+
+
+def write_project(project_dir, tide_data):
+    """Write the raw data, picks, mask and tide file of a two line survey
+    to project_dir.  Returns a FakeSurvey of it.
+    """
+    backend = hdf5.HDF5Backend(project_dir)
+    n = 4
+    for name in ['12041701', '12041702']:
+        write_sdi_data(project_dir, name, n)
+        backend.write_pick({
+            'name': 'pre',
+            'depth_array': np.repeat(2.0, n),
+            'index_array': np.arange(n),
+        }, name, 'preimpoundment')
+    mask = np.zeros(n, dtype=bool)
+    mask[1] = True
+    backend.write_survey_line_mask(mask, '12041701')
+    tide_data.to_csv(os.path.join(project_dir, 'tide_file.txt'),
+                     index_label='datetime')
+    return FakeSurvey(project_dir, [
+        FakeSurveyLine(name, project_dir, final_preimpoundment_depth='pre')
+        for name in ['12041701', '12041702']
+    ])
+
+
+class TestExportSurvey(unittest.TestCase):
+    """ Tests for the survey point export helpers """
+    def setUp(self):
+        index = pd.DatetimeIndex(['2012-04-17 00:00', '2012-04-17 01:00',
+                                  '2012-04-17 02:00', '2012-04-17 03:00'])
+        self.tide_data = pd.DataFrame(
+            {'water_surface_elevation': [500.0, 501.0, np.nan, 503.0]},
+            index=index)
+
+    def test_parse_datetimes(self):
+        sdi_dict_raw = {
+            'date': '120417',
+            'hour': np.array([0, 1, 23]),
+            'minute': np.array([30, 0, 59]),
+            'second': np.array([15, 0, 59]),
+            'microsecond': np.array([250000, 0, 999999]),
+        }
+        datetimes = export_survey.parse_datetimes(sdi_dict_raw)
+        date = datetime.datetime(2012, 4, 17)
+        expected = [
+            date + datetime.timedelta(hours=int(t[0]), minutes=int(t[1]),
+                                      seconds=int(t[2]),
+                                      microseconds=int(t[3]))
+            for t in zip(sdi_dict_raw['hour'], sdi_dict_raw['minute'],
+                         sdi_dict_raw['second'], sdi_dict_raw['microsecond'])
+        ]
+        self.assertTrue(datetimes.equals(pd.DatetimeIndex(expected)))
+
+    def test_tide_interpolator(self):
+        interpolate = export_survey._tide_interpolator(self.tide_data)
+        datetimes = pd.DatetimeIndex(['2012-04-16 23:00', '2012-04-17 00:30',
+                                      '2012-04-17 02:00', '2012-04-17 01:00',
+                                      '2012-04-17 05:00'])
+        result = interpolate(datetimes)
+        self.assertTrue(np.isnan(result[0]))
+        np.testing.assert_allclose(result[1:], [500.5, 502.0, 501.0, 503.0])
+
+        # sent to worker processes when exporting in parallel
+        unpickled = pickle.loads(pickle.dumps(interpolate))
+        np.testing.assert_array_equal(unpickled(datetimes), result)
+
+    def test_imap_keeps_order(self):
+        values = [-5, 4, -3, 2, -1]
+        for processes in [1, 2]:
+            result = list(export_survey._imap(abs, values, processes))
+            self.assertEqual(result, [5, 4, 3, 2, 1])
+
+    def test_format_dates_and_times(self):
+        datetimes = pd.DatetimeIndex(['2012-04-17 00:30:15.250000',
+                                      '2012-04-17 01:00:00',
+                                      '2012-04-18 23:59:59.999999'])
+        dates = export_survey._format_dates(datetimes)
+        times = export_survey._format_times(datetimes)
+        self.assertEqual(list(dates), [str(d) for d in datetimes.date])
+        self.assertEqual(list(times), [str(t) for t in datetimes.time])
+
+    def test_write_survey_points_matches_pandas(self):
+        column_info = [
+            ('x', 8, '%13.8f'),
+            ('z', 2, '%5.2f'),
+            ('sdi_filename', None, None),
+            ('time', None, None),
+        ]
+        datetimes = pd.DatetimeIndex(['2012-04-17 00:30:15.250000',
+                                      '2012-04-17 01:00:00'])
+        points = {
+            'x': np.array([3025.123456789, -12.5]),
+            'z': np.array([1.005, np.nan], dtype=np.float32),
+            'sdi_filename': np.repeat('12041701', 2),
+            'time': export_survey._format_times(datetimes),
+        }
+        f = StringIO()
+        export_survey._write_survey_points(f, points, column_info,
+                                           header=True)
+
+        df = pd.DataFrame({'x': points['x'], 'z': points['z'],
+                           'sdi_filename': '12041701',
+                           'time': datetimes.time})
+        for name, decimals, fmt in column_info:
+            if decimals is not None:
+                df[name] = df[name].round(decimals=decimals)
+            if fmt is not None:
+                df[name] = df[name].apply(lambda f: fmt % f)
+        expected = StringIO()
+        cols = [name for name, decimals, fmt in column_info]
+        df[cols].to_csv(expected, header=True, index=False)
+
+        self.assertEqual(f.getvalue(), expected.getvalue())
+
+    def test_export_cache(self):
+        project_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, project_dir)
+        write_sdi_data(project_dir, '12041701')
+        line_info = export_survey.LineExportInfo(
+            name='12041701', project_dir=project_dir, status='approved',
+            final_lake_depth='current_surface_from_bin',
+            final_preimpoundment_depth='')
+        picks = {
+            'lake_depth': {'index_array': np.arange(3),
+                           'depth_array': np.array([1.0, 2.0, 3.0])},
+            'preimpoundment_depth': None,
+            'mask': np.array([False, False, False]),
+        }
+        column_info = [('x', 8, '%13.8f')]
+        key = export_survey._export_cache_key(line_info, picks, column_info,
+                                              False, 'tide')
+        self.assertIsNone(
+            export_survey._read_cached_block(line_info, False, key))
+
+        export_survey._write_cached_block(line_info, False, key, 'a,b\n')
+        self.assertEqual(
+            export_survey._read_cached_block(line_info, False, key), 'a,b\n')
+        self.assertIsNone(
+            export_survey._read_cached_block(line_info, True, key))
+
+        # editing the mask or the tide file changes the key
+        picks['mask'] = np.array([False, True, False])
+        masked_key = export_survey._export_cache_key(
+            line_info, picks, column_info, False, 'tide')
+        self.assertNotEqual(masked_key, key)
+        self.assertIsNone(
+            export_survey._read_cached_block(line_info, False, masked_key))
+        self.assertNotEqual(
+            export_survey._export_cache_key(line_info, picks, column_info,
+                                            False, 'other tide'),
+            masked_key)
+
+        # importing another line leaves the key alone, reimporting this
+        # line changes it
+        write_sdi_data(project_dir, '12041702')
+        self.assertEqual(
+            export_survey._export_cache_key(line_info, picks, column_info,
+                                            False, 'tide'),
+            masked_key)
+        write_sdi_data(project_dir, '12041701')
+        self.assertNotEqual(
+            export_survey._export_cache_key(line_info, picks, column_info,
+                                            False, 'tide'),
+            masked_key)
+
+    def test_export_survey_points(self):
+        project_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, project_dir)
+        survey = write_project(project_dir, self.tide_data)
+        path = os.path.join(project_dir, 'points.csv')
+        export_survey.export_survey_points(survey, path)
+
+        points = pd.read_csv(path)
+        # the masked trace of the first line is left out
+        self.assertEqual(list(points['sdi_filename']),
+                         [12041701] * 3 + [12041702] * 4)
+        # points at 00:00, 02:00 and 03:00; the 02:00 reading is missing
+        np.testing.assert_allclose(points['lake_elevation'][:3],
+                                   [500.0, 502.0, 503.0])
+        self.assertEqual(list(points['time'][:3]),
+                         ['00:00:00', '02:00:00', '03:00:00'])
+        feet = export_survey._meters_to_feet(1.0)
+        np.testing.assert_allclose(points['sediment_thickness'], feet,
+                                   atol=0.01)
+
+        # a second export is served from the export cache
+        with open(path, 'rb') as f:
+            first = f.read()
+        export_survey.export_survey_points(survey, path)
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), first)
+
+        # an edited tide file is used, not the cached blocks
+        tide_path = os.path.join(project_dir, 'tide_file.txt')
+        (self.tide_data + 10).to_csv(tide_path, index_label='datetime')
+        # the parsed tide file is cached on its mtime and size
+        os.utime(tide_path, (0, 0))
+        export_survey.export_survey_points(survey, path, with_pre=False)
+        points = pd.read_csv(path)
+        np.testing.assert_allclose(points['lake_elevation'][:3],
+                                   [510.0, 512.0, 513.0])
+        self.assertNotIn('sediment_thickness', points.columns)
+
+    def test_export_survey_points_hdf(self):
+        project_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, project_dir)
+        survey = write_project(project_dir, self.tide_data)
+        path = os.path.join(project_dir, 'points.h5')
+        export_survey.export_survey_points_hdf(survey, path)
+
+        points = export_survey.read_survey_points_hdf(path)
+        self.assertEqual(list(points['sdi_filename']),
+                         ['12041701'] * 3 + ['12041702'] * 4)
+        np.testing.assert_array_equal(points['x'],
+                                      [0, 20, 30, 0, 10, 20, 30])
+        np.testing.assert_allclose(points['lake_elevation'][:3],
+                                   [500.0, 502.0, 503.0])
+        feet = export_survey._meters_to_feet(1.0)
+        np.testing.assert_allclose(points['z'], feet)
+        np.testing.assert_allclose(points['sediment_thickness'], feet)
+
+    def test_generate_tide_file(self):
+        project_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, project_dir)
+        survey = FakeSurvey(project_dir, [FakeSurveyLine('12041702'),
+                                          FakeSurveyLine('12041701')])
+        provider = StaticTideProvider(self.tide_data)
+        export_survey.generate_tide_file('08167000', survey, provider)
+
+        path = os.path.join(project_dir, 'tide_file.txt')
+        tide_data = pd.read_csv(path, index_col='datetime')
+        self.assertTrue(pd.DatetimeIndex(tide_data.index).equals(
+            self.tide_data.index))
+
+    def test_hdf_points_round_trip(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        path = os.path.join(tempdir, 'points.h5')
+        columns = ['x', 'z', 'datetime']
+        datetimes = pd.DatetimeIndex(['2012-04-17 00:30:15.250000',
+                                      '2012-04-17 01:00:00'])
+        line_points = [
+            ('12041701', {'x': np.array([1.5, 2.5]),
+                          'z': np.array([10.0, 11.0]),
+                          'datetime': np.asarray(datetimes, 'M8[ns]')}),
+            ('12041702', {'x': np.array([3.5]), 'z': np.array([12.0]),
+                          'datetime': np.asarray(datetimes[:1], 'M8[ns]')}),
+        ]
+        export_survey._write_points_file(path, line_points, columns)
+
+        points = export_survey.read_survey_points_hdf(path)
+        np.testing.assert_array_equal(points['x'], [1.5, 2.5, 3.5])
+        self.assertEqual(list(points['sdi_filename']),
+                         ['12041701', '12041701', '12041702'])
+        self.assertTrue(pd.DatetimeIndex(points['datetime']).equals(
+            datetimes[[0, 1, 0]]))
+
+        points = export_survey.read_survey_points_hdf(path, columns=['z'],
+                                                      lines=['12041702'])
+        self.assertEqual(list(points.keys()), ['z'])
+        np.testing.assert_array_equal(points['z'], [12.0])
+
+        with self.assertRaises(KeyError):
+            export_survey.read_survey_points_hdf(path, columns=['nope'])
+
+
+if __name__ == '__main__':
+    unittest.main()
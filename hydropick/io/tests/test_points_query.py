@@ -0,0 +1,113 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from shapely.geometry import Polygon
+
+from hydropick.io import hdf5
+from hydropick.io.points_query import SurveyPointsIndex
+from hydropick.model.survey_line import CURRENT_SURFACE_FROM_BIN_NAME
+
+
+class FakeSurveyLine(object):
+    def __init__(self, name, final_preimpoundment_depth=''):
+        self.name = name
+        self.final_lake_depth = CURRENT_SURFACE_FROM_BIN_NAME
+        self.final_preimpoundment_depth = final_preimpoundment_depth
+
+
+class TestSurveyPointsIndex(unittest.TestCase):
+    """ Tests for spatial queries of survey points """
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.project_dir = os.path.join(self.tempdir, 'test-project')
+        backend = hdf5.HDF5Backend(self.project_dir)
+        n = 100
+        trace = np.arange(n)
+        # an east-west line at y=0 and a north-south line at x=50
+        lines = {
+            '12041701': (trace.astype(float), np.zeros(n)),
+            '12041702': (np.repeat(50.0, n), trace - 50.0),
+        }
+        for name, (x, y) in lines.items():
+            backend._write_raw_sdi_dict(name, {
+                'interpolated_easting': x,
+                'interpolated_northing': y,
+                'date': name,
+                'hour': np.repeat(10, n),
+                'minute': trace // 60,
+                'second': trace % 60,
+                'microsecond': np.zeros(n, dtype=int),
+                'depth_r1': trace / 10.0,
+            })
+        backend.write_pick({
+            'name': 'pre',
+            'depth_array': trace / 5.0,
+            'index_array': trace,
+        }, '12041701', 'preimpoundment')
+        mask = np.zeros(n, dtype=bool)
+        mask[5] = True
+        backend.write_survey_line_mask(mask, '12041701')
+
+        self.survey_lines = [FakeSurveyLine('12041701', 'pre'),
+                             FakeSurveyLine('12041702')]
+        self.index = SurveyPointsIndex(self.survey_lines, self.project_dir,
+                                       cell_size=7.0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_lines_in_bbox(self):
+        self.assertEqual(self.index.lines_in_bbox(0, 10, 10, 20), [])
+        self.assertEqual(self.index.lines_in_bbox(0, -1, 10, 1),
+                         ['12041701'])
+        self.assertEqual(self.index.lines_in_bbox(45, -5, 55, 5),
+                         ['12041701', '12041702'])
+
+    def test_query_bbox(self):
+        points = self.index.query_bbox(2, -1, 6, 1)
+        np.testing.assert_array_equal(points['trace'], [2, 3, 4, 5, 6])
+        np.testing.assert_array_equal(points['x'], [2, 3, 4, 5, 6])
+        np.testing.assert_allclose(points['lake_depth'],
+                                   [0.2, 0.3, 0.4, 0.5, 0.6])
+        np.testing.assert_allclose(points['preimpoundment_depth'],
+                                   [0.4, 0.6, 0.8, 1.0, 1.2])
+        np.testing.assert_array_equal(points['mask'],
+                                      [False, False, False, True, False])
+        self.assertEqual(str(points['datetime'][0].astype('M8[s]')),
+                         '2012-04-17T10:00:02')
+
+    def test_query_polygon(self):
+        triangle = Polygon([(45, -5), (55, -5), (50, 5)])
+        points = self.index.query_polygon(triangle)
+        self.assertEqual(sorted(set(points['line_name'])),
+                         ['12041701', '12041702'])
+        line_2 = points['line_name'] == '12041702'
+        np.testing.assert_array_equal(points['trace'][line_2],
+                                      np.arange(45, 55))
+        self.assertTrue(np.isnan(points['preimpoundment_depth'][line_2]).all())
+
+    def test_index_is_cached(self):
+        self.index.query_bbox(0, 0, 1, 1)
+        self.assertTrue(os.path.exists(self.index.cache_path))
+        index = SurveyPointsIndex(self.survey_lines, self.project_dir,
+                                  cell_size=7.0)
+        points = index.query_bbox(2, -1, 6, 1)
+        np.testing.assert_array_equal(points['trace'], [2, 3, 4, 5, 6])
+
+    def test_empty_query(self):
+        points = self.index.query_bbox(1000, 1000, 1001, 1001)
+        self.assertEqual(len(points['trace']), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,11 +10,13 @@ import shutil
 import tempfile
 import unittest
 
+import numpy as np
 from shapely.geometry.base import BaseGeometry
 from shapely.geometry import LineString
 
 from hydropick.io import survey_io
 from hydropick.model.depth_line import DepthLine
+from hydropick.model.survey_line import SurveyLine
 
 
 class TestSurveyIO(unittest.TestCase):
@@ -38,6 +40,9 @@ class TestSurveyIO(unittest.TestCase):
     def test_import_and_read_from_binary(self):
         survey_io.import_survey_line_from_file(self.binary_file, self.project_dir, self.line_name)
         line = survey_io.read_survey_line_from_hdf(self.project_dir, self.line_name)
+        # as on disk, so nothing to save
+        self.assertFalse(line.attrs_dirty)
+        self.assertFalse(line.mask_dirty)
         line.load_data(self.project_dir)
         self.assertEqual(line.name, self.line_name)
         self.assertIsInstance(line.navigation_line, LineString)
@@ -66,3 +71,58 @@ class TestSurveyIO(unittest.TestCase):
         self.assertIsInstance(pick, DepthLine)
         self.assertEqual(len(pick.depth_array), 3606)
         self.assertEqual(len(pick.index_array), 3606)
+
+    def test_fix_trace_num_arrays(self):
+        trace_num = np.array([1, 2, 99, 4, 5, 7, 7])
+        freq_trace_num = {
+            '200.0': np.array([1, 99, 5, 7]),
+            '50.0': np.array([2, 4, 7]),
+        }
+        bad_indices, bad_values = survey_io.check_trace_num_array(
+            trace_num, self.line_name)
+        self.assertEqual(bad_indices.tolist(), [2, 5])
+        trace_num, freq_trace_num, repaired = \
+            survey_io.repair_trace_num_arrays(trace_num, freq_trace_num,
+                                              self.line_name)
+        self.assertTrue(repaired)
+        self.assertEqual(trace_num.tolist(), range(1, 8))
+        self.assertEqual(freq_trace_num['200.0'].tolist(), [1, 3, 5, 6])
+        self.assertEqual(freq_trace_num['50.0'].tolist(), [2, 4, 6])
+
+    def test_write_only_changed(self):
+        line = SurveyLine(name=self.line_name)
+        for name in ['a', 'b']:
+            line.lake_depths[name] = DepthLine(
+                name=name, survey_line_name=self.line_name,
+                line_type='current surface', source='algorithm',
+                index_array=np.arange(10), depth_array=np.zeros(10))
+        # a new line has nothing on disk yet
+        self.assertTrue(line.attrs_dirty)
+        self.assertTrue(line.mask_dirty)
+        survey_io.write_survey_line_to_hdf(self.project_dir, line)
+        self.assertFalse(line.lake_depths['a'].dirty)
+        self.assertFalse(line.attrs_dirty)
+        attrs_path = os.path.join(self.project_dir, self.line_name,
+                                  'attributes.json')
+        os.remove(attrs_path)
+
+        line.lake_depths['b'].depth_array = np.ones(10)
+        self.assertTrue(line.lake_depths['b'].dirty)
+        self.assertFalse(line.lake_depths['a'].dirty)
+        survey_io.write_survey_line_to_hdf(self.project_dir, line,
+                                           changed_only=True)
+        self.assertFalse(line.lake_depths['b'].dirty)
+        self.assertFalse(os.path.exists(attrs_path))
+        picks = survey_io.read_pick_lines_from_hdf(
+            self.project_dir, self.line_name, 'current')
+        np.testing.assert_array_equal(picks['b'].depth_array, np.ones(10))
+        self.assertEqual(picks['b'].index_range, (0, 10, 1))
+        self.assertFalse(picks['b'].dirty)
+
+        line.status = 'approved'
+        self.assertTrue(line.attrs_dirty)
+        survey_io.write_survey_line_to_hdf(self.project_dir, line,
+                                           changed_only=True)
+        attrs = survey_io.read_survey_line_attrs_from_hdf(self.project_dir,
+                                                          self.line_name)
+        self.assertEqual(attrs['status'], 'approved')
@@ -0,0 +1,84 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from hydropick.io import tide
+
+
+class CountingProvider(tide.StaticTideProvider):
+    def __init__(self, water_surface):
+        super(CountingProvider, self).__init__(water_surface)
+        self.calls = 0
+
+    def get_series(self, start=None, end=None):
+        self.calls += 1
+        return super(CountingProvider, self).get_series(start, end)
+
+
+class TestTideProviders(unittest.TestCase):
+    """ Tests for the tide data sources """
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        index = pd.DatetimeIndex(['2012-04-17 00:00', '2012-04-17 01:00',
+                                  '2012-04-18 00:00'])
+        self.water_surface = pd.DataFrame(
+            {'water_surface_elevation': [500.0, 501.25, 502.5]}, index=index)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def assertSeriesEqual(self, a, b):
+        self.assertTrue(a.index.equals(b.index))
+        np.testing.assert_array_equal(a['water_surface_elevation'].values,
+                                      b['water_surface_elevation'].values)
+
+    def test_static_provider(self):
+        provider = tide.StaticTideProvider(self.water_surface)
+        series = provider.get_series('2012-04-17', '2012-04-17')
+        self.assertEqual(len(series), 2)
+
+    def test_file_provider_caches_parsed_series(self):
+        path = os.path.join(self.tempdir, 'tide_file.txt')
+        self.water_surface.to_csv(path, index_label='datetime')
+        provider = tide.TideFileProvider(path)
+
+        self.assertSeriesEqual(provider.get_series(), self.water_surface)
+        self.assertTrue(os.path.exists(provider.cache_path))
+        fingerprint = provider.fingerprint()
+        self.assertSeriesEqual(provider.get_series(), self.water_surface)
+
+        # a new tide file replaces the cached series
+        changed = self.water_surface * 2
+        changed.to_csv(path, index_label='datetime')
+        os.utime(path, (0, 0))
+        self.assertSeriesEqual(provider.get_series(), changed)
+        self.assertNotEqual(provider.fingerprint(), fingerprint)
+
+    def test_cached_provider(self):
+        source = CountingProvider(self.water_surface)
+        cache_dir = os.path.join(self.tempdir, 'tide_cache')
+        provider = tide.CachedTideProvider(source, cache_dir, '08167000')
+
+        first = provider.get_series('2012-04-17', '2012-04-19')
+        second = provider.get_series('2012-04-17', '2012-04-19')
+        self.assertEqual(source.calls, 1)
+        self.assertSeriesEqual(first, self.water_surface)
+        self.assertSeriesEqual(second, self.water_surface)
+
+        provider.get_series('2012-04-18', '2012-04-19')
+        self.assertEqual(source.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+"""Sources of water surface elevation (tide) series.
+
+A provider returns a DataFrame with a 'water_surface_elevation' column
+indexed by datetime, the same layout as the project's tide_file.txt.
+"""
+
+from __future__ import absolute_import
+
+import datetime
+import hashlib
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# NWIS parameter codes for gauge height, in order of preference
+INSTANTANEOUS_CODE = '00062:00011'
+MIDNIGHT_CODE = '00062:32400'
+DAILY_MEAN_CODE = '00062:00003'
+NWIS_PARAMETER_CODES = [INSTANTANEOUS_CODE, MIDNIGHT_CODE, DAILY_MEAN_CODE]
+
+
+class TideProvider(object):
+    """Base class for tide sources."""
+
+    def get_series(self, start=None, end=None):
+        """Return the water surface elevations between start and end
+        (datetime strings or dates, inclusive), or all of them if not given.
+        """
+        raise NotImplementedError
+
+    def fingerprint(self):
+        """Return a string that changes whenever the series would"""
+        raise NotImplementedError
+
+
+class StaticTideProvider(TideProvider):
+    """Serves a series held in memory, e.g. for tests."""
+
+    def __init__(self, water_surface):
+        self.water_surface = water_surface
+
+    def get_series(self, start=None, end=None):
+        return self.water_surface[start:end]
+
+    def fingerprint(self):
+        return _hash_series(self.water_surface)
+
+
+class TideFileProvider(TideProvider):
+    """Reads a tide file as written by export_survey.generate_tide_file.
+
+    The parsed series is kept in a binary .npz file next to the tide file,
+    so the text is only parsed again when the tide file changes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.cache_path = path + '.npz'
+
+    def get_series(self, start=None, end=None):
+        stamp = self._stamp()
+        water_surface = _read_npz_series(self.cache_path, stamp)
+        if water_surface is None:
+            water_surface = pd.read_csv(self.path, index_col='datetime')
+            water_surface.index = pd.DatetimeIndex(water_surface.index)
+            _write_npz_series(self.cache_path, water_surface, stamp)
+        return water_surface[start:end]
+
+    def fingerprint(self):
+        with open(self.path, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def _stamp(self):
+        stat = os.stat(self.path)
+        return '{}:{}'.format(stat.st_mtime, stat.st_size)
+
+
+class NWISTideProvider(TideProvider):
+    """Fetches gauge heights for a USGS gauge from NWIS (through ulmo).
+
+    Instantaneous values are preferred, then midnight values, then daily
+    means (placed at noon).
+    """
+
+    def __init__(self, gauge_code):
+        self.gauge_code = gauge_code
+
+    def get_series(self, start=None, end=None):
+        import ulmo
+        logger.info('Fetching tide data for gauge {} from NWIS'
+                    .format(self.gauge_code))
+        data = ulmo.usgs.nwis.get_site_data(self.gauge_code, start=start,
+                                            end=end)
+
+        df = pd.DataFrame()
+        for code in NWIS_PARAMETER_CODES:
+            daily_mean = code == DAILY_MEAN_CODE
+            df = df.combine_first(_df_for_code(data, code, start, end,
+                                               daily_mean))
+
+        df = df.rename(columns={'value': 'water_surface_elevation'})
+        return df[['water_surface_elevation']]
+
+    def fingerprint(self):
+        return 'nwis:{}'.format(self.gauge_code)
+
+
+class CachedTideProvider(TideProvider):
+    """Keeps the series fetched from another provider (e.g. NWIS) in
+    cache_dir, one .npz file per gauge and date range, so the same request
+    never goes back to the source.
+    """
+
+    def __init__(self, provider, cache_dir, key):
+        self.provider = provider
+        self.cache_dir = cache_dir
+        self.key = key
+
+    def get_series(self, start=None, end=None):
+        path = self._cache_path(start, end)
+        water_surface = _read_npz_series(path)
+        if water_surface is None:
+            water_surface = self.provider.get_series(start, end)
+            if not os.path.exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+            _write_npz_series(path, water_surface)
+        else:
+            logger.debug('Using cached tide data {}'.format(path))
+        return water_surface
+
+    def fingerprint(self):
+        return self.provider.fingerprint()
+
+    def _cache_path(self, start, end):
+        name = '{}_{}_{}.npz'.format(self.key, start or 'start', end or 'end')
+        return os.path.join(self.cache_dir, name.replace(os.sep, '-'))
+
+
+def _df_for_code(data, code, start, end, daily_mean=False):
+    if code not in data:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(data[code]['values'])
+
+    if df.empty:
+        return pd.DataFrame()
+
+    df = df.set_index('datetime')
+    df.index = pd.DatetimeIndex(df.index)
+
+    if daily_mean:
+        df.index = df.index + datetime.timedelta(hours=12)
+
+    df.value = df.value.astype(float)
+
+    return df[start:end]
+
+
+def _hash_series(water_surface):
+    key = hashlib.sha1()
+    key.update(np.ascontiguousarray(water_surface.index.asi8).data)
+    values = water_surface['water_surface_elevation'].values
+    key.update(np.ascontiguousarray(values, dtype=np.float64).data)
+    return key.hexdigest()
+
+
+def _read_npz_series(path, stamp=None):
+    """Return the series stored at path, or None if there is none or it
+    was stored with a different stamp.
+    """
+    if not os.path.exists(path):
+        return None
+    npz = np.load(path)
+    try:
+        if stamp is not None and str(npz['stamp']) != stamp:
+            return None
+        index = pd.DatetimeIndex(npz['datetime'].view('M8[ns]'))
+        return pd.DataFrame(
+            {'water_surface_elevation': npz['water_surface_elevation']},
+            index=index)
+    finally:
+        npz.close()
+
+
+def _write_npz_series(path, water_surface, stamp=''):
+    # write then rename so a reader never sees a partial file
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, datetime=water_surface.index.asi8,
+                 water_surface_elevation=water_surface[
+                     'water_surface_elevation'].values.astype(np.float64),
+                 stamp=np.array(stamp))
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
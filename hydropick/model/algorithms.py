@@ -16,7 +16,8 @@ import logging
 
 import numpy as np
 
-from traits.api import provides, Str, HasTraits, Float, Range, Enum
+from traits.api import (provides, Str, HasTraits, Float, Range, Enum,
+                        Instance)
 
 from scipy.signal import medfilt
 from skimage.filter import threshold_otsu
@@ -24,6 +25,7 @@ from sklearn.mixture import GMM
 from skimage.morphology import binary_opening, disk
 
 from .i_algorithm import IAlgorithm
+from ..util.profiling import StageProfiler
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +33,7 @@ logger = logging.getLogger(__name__)
 ALGORITHM_LIST = [
     'ThresholdCurrentSurface',
     'ThresholdPreImpoundmentSurface',
+    'ThresholdJointSurfaces',
 ]
 
 
@@ -47,6 +50,9 @@ class ThresholdCurrentSurface(HasTraits):
     # to set when the algorithm is applied
     arglist = ['frequency', 'threshold', 'threshold_offset', 'blank_above_distance', 'blank_below_distance']
 
+    # line types of the depth arrays returned by process_line
+    line_types = ['current surface']
+
     # instructions for user (description of algorithm and required args def)
     instructions = Str('Algorithm to autodetect current surface from selected intensity image. \n' +
                        '----------------------------------------------------------------------------- \n' +
@@ -73,6 +79,9 @@ class ThresholdCurrentSurface(HasTraits):
     blank_above_distance = Float(-1.0)
     blank_below_distance = Float(-1.0)
 
+    #: times the stages of process_line when enabled
+    profiler = Instance(StageProfiler, ())
+
     def process_line(self, survey_line):
         """ returns all zeros to provide a blank line to edit.
         Size matches horizontal pixel number of intensity arrays
@@ -81,8 +90,12 @@ class ThresholdCurrentSurface(HasTraits):
         depth_array = np.empty(len(trace_array))
         depth_array.fill(np.nan)
 
-        intensity, freq_trace_array = _get_intensity(survey_line, self.frequency)
-        top, bot = _find_top_bottom(intensity, buf=5)
+        profiler = self.profiler
+        profiler.start(survey_line.name)
+        intensity, freq_trace_array = profiler.call(
+            'get_intensity', _get_intensity, survey_line, self.frequency)
+        top, bot = profiler.call('find_top_bottom', _find_top_bottom,
+                                 intensity, buf=5)
         if self.blank_above_distance > 0.0:
             top = (self.blank_above_distance/survey_line.pixel_resolution).astype(np.int)
 
@@ -90,21 +103,28 @@ class ThresholdCurrentSurface(HasTraits):
             bot = (self.blank_below_distance/survey_line.pixel_resolution).astype(np.int)
 
         if self.threshold < 0.0:
-            actual_threshold = _auto_threshold(intensity) + self.threshold_offset
+            actual_threshold = profiler.call('auto_threshold', _auto_threshold,
+                                             intensity) + self.threshold_offset
         else:
             actual_threshold = self.threshold
 
-        binary_img = _apply_threshold(intensity, actual_threshold)
-        centers = _find_centers(intensity[top:bot, :]) + top
+        binary_img = profiler.call('apply_threshold', _apply_threshold,
+                                   intensity, actual_threshold)
+        centers = profiler.call('find_centers', _find_centers,
+                                intensity[top:bot, :]) + top
 
-        depth_array[freq_trace_array-1] = _find_edge(binary_img,
-                                                     centers,
-                                                     surface='upper')
+        depth_array[freq_trace_array-1] = profiler.call('find_edge',
+                                                        _find_edge,
+                                                        binary_img,
+                                                        centers,
+                                                        surface='upper')
 
-        depth_array = _convert_to_depth(depth_array,
-                                        survey_line.pixel_resolution,
-                                        survey_line.draft,
-                                        survey_line.heave)
+        depth_array = profiler.call('convert_to_depth', _convert_to_depth,
+                                    depth_array,
+                                    survey_line.pixel_resolution,
+                                    survey_line.draft,
+                                    survey_line.heave)
+        profiler.stop()
 
         return trace_array, depth_array
 
@@ -122,6 +142,9 @@ class ThresholdPreImpoundmentSurface(HasTraits):
     # to set when the algorithm is applied
     arglist = ['frequency', 'threshold', 'threshold_offset', 'current_surface_line']
 
+    # line types of the depth arrays returned by process_line
+    line_types = ['pre-impoundment surface']
+
     # instructions for user (description of algorithm and required args def)
     instructions = Str('Algorithm to autodetect preimpoundment surface from selected intensity image. \n' +
                        '----------------------------------------------------------------------------- \n' +
@@ -146,6 +169,9 @@ class ThresholdPreImpoundmentSurface(HasTraits):
     threshold_offset = Float(0.0)
     current_surface_line = Str('current_surface_from_bin')
 
+    #: times the stages of process_line when enabled
+    profiler = Instance(StageProfiler, ())
+
     def process_line(self, survey_line):
         """ returns all zeros to provide a blank line to edit.
         Size matches horizontal pixel number of intensity arrays
@@ -154,30 +180,171 @@ class ThresholdPreImpoundmentSurface(HasTraits):
         depth_array = np.empty(len(trace_array))
         depth_array.fill(np.nan)
 
-        intensity, freq_trace_array = _get_intensity(survey_line, self.frequency)
-        current_surface_locs = _get_current_surface(survey_line, self.current_surface_line)
+        profiler = self.profiler
+        profiler.start(survey_line.name)
+        intensity, freq_trace_array = profiler.call(
+            'get_intensity', _get_intensity, survey_line, self.frequency)
+        current_surface_locs = profiler.call('get_current_surface',
+                                             _get_current_surface,
+                                             survey_line,
+                                             self.current_surface_line)
         current_surface_locs = current_surface_locs[freq_trace_array-1]
-        intensity = _clear_image_above_line(intensity, current_surface_locs)
+        intensity = profiler.call('clear_image_above_line',
+                                  _clear_image_above_line,
+                                  intensity, current_surface_locs)
 
         if self.threshold < 0.0:
-            threshold = _auto_threshold(intensity) + self.threshold_offset
+            threshold = profiler.call('auto_threshold', _auto_threshold,
+                                      intensity) + self.threshold_offset
         else:
             threshold = self.threshold
 
-        binary_img = _apply_threshold(intensity, threshold)
-        centers = _find_centers(intensity)
-        depth_array[freq_trace_array-1] = _find_edge(binary_img,
-                                                     centers,
-                                                     surface='lower')
-
-        depth_array = _convert_to_depth(depth_array,
-                                        survey_line.pixel_resolution,
-                                        survey_line.draft,
-                                        survey_line.heave)
+        binary_img = profiler.call('apply_threshold', _apply_threshold,
+                                   intensity, threshold)
+        centers = profiler.call('find_centers', _find_centers, intensity)
+        depth_array[freq_trace_array-1] = profiler.call('find_edge',
+                                                        _find_edge,
+                                                        binary_img,
+                                                        centers,
+                                                        surface='lower')
+
+        depth_array = profiler.call('convert_to_depth', _convert_to_depth,
+                                    depth_array,
+                                    survey_line.pixel_resolution,
+                                    survey_line.draft,
+                                    survey_line.heave)
+        profiler.stop()
 
         return trace_array, depth_array
 
 
+@provides(IAlgorithm)
+class ThresholdJointSurfaces(HasTraits):
+    """ Algorithm to pick the current and preimpoundment surfaces together
+
+    """
+
+    #: a user-friendly name for the algorithm
+    name = Str('Joint Current and PreImpoundment Threshold Algorithm')
+
+    # list of names of traits defined in this class that the user needs
+    # to set when the algorithm is applied
+    arglist = ['current_frequency', 'current_threshold',
+               'current_threshold_offset', 'blank_above_distance',
+               'blank_below_distance', 'preimpoundment_frequency',
+               'preimpoundment_threshold', 'preimpoundment_threshold_offset']
+
+    # line types of the depth arrays returned by process_line
+    line_types = ['current surface', 'pre-impoundment surface']
+
+    # instructions for user (description of algorithm and required args def)
+    instructions = Str('Algorithm to autodetect both the current and preimpoundment surfaces in one pass. \n' +
+                       '----------------------------------------------------------------------------- \n' +
+                       'Creates a current surface line and a preimpoundment surface line of the same name. \n' +
+                       'Algorithm has following steps: \n' +
+                       '  1) Picks the current surface from its frequency as the Current Surface Threshold Algorithm does \n' +
+                       '  2) Aligns the current surface with the traces of the preimpoundment frequency \n' +
+                       '  3) Clears the preimpoundment image above the current surface \n' +
+                       '  4) Picks the preimpoundment surface as the PreImpoundment Threshold Algorithm does \n' +
+                       '----------------------------------------------------------------------------- \n' +
+                       'Parameters:\n' +
+                       '  current_frequency = frequency to pick current surface from (200 (default), 50 or 24)\n' +
+                       '  current_threshold = 0.0 - 1.0 (if negative then automatically determine threshold using OTSU)\n' +
+                       '  current_threshold_offset = +/- value (default = 0.0, adjust the automatically determined threshold by this offset)\n' +
+                       '  blank_above_distance = value (ignore image above this depth when picking current surface, if negative, detect automatically)\n' +
+                       '  blank_below_distance = value (ignore image below this depth when picking current surface, if negative, detect automatically)\n' +
+                       '  preimpoundment_frequency = frequency to pick preimpoundment surface from (24 (default), 50 or 200)\n' +
+                       '  preimpoundment_threshold = 0.0 - 1.0 (if negative then automatically determine threshold using OTSU)\n' +
+                       '  preimpoundment_threshold_offset = +/- value (default = 0.0, adjust the automatically determined threshold by this offset)\n' +
+                       '----------------------------------------------------------------------------- \n')
+
+    # args
+    current_frequency = Enum(['200', '50', '24'])
+    current_threshold = Range(value=-0.1, low=-0.1, high=1.0)
+    current_threshold_offset = Float(0.0)
+    blank_above_distance = Float(-1.0)
+    blank_below_distance = Float(-1.0)
+    preimpoundment_frequency = Enum(['24', '50', '200'])
+    preimpoundment_threshold = Range(value=-0.1, low=-0.1, high=1.0)
+    preimpoundment_threshold_offset = Float(0.0)
+
+    #: times the stages of process_line when enabled
+    profiler = Instance(StageProfiler, ())
+
+    def process_line(self, survey_line):
+        """ returns the trace numbers and the current and preimpoundment
+        surface depths on every trace.
+
+        Each image is read once.  The current surface is picked from its
+        frequency's traces and interpolated onto the whole trace_num axis,
+        which aligns it with the traces of the preimpoundment frequency
+        through freq_trace_num.  Edges are found for all traces at once.
+        """
+        trace_array = survey_line.trace_num
+        profiler = self.profiler
+        profiler.start(survey_line.name)
+
+        intensity, current_trace_array = profiler.call(
+            'get_intensity', _get_intensity, survey_line,
+            self.current_frequency)
+        top, bot = profiler.call('find_top_bottom', _find_top_bottom,
+                                 intensity, buf=5)
+        if self.blank_above_distance > 0.0:
+            top = int(self.blank_above_distance /
+                      survey_line.pixel_resolution)
+        if self.blank_below_distance > 0.0:
+            bot = int(self.blank_below_distance /
+                      survey_line.pixel_resolution)
+        if self.current_threshold < 0.0:
+            threshold = profiler.call('auto_threshold', _auto_threshold,
+                                      intensity) + \
+                self.current_threshold_offset
+        else:
+            threshold = self.current_threshold
+        binary_img = profiler.call('apply_threshold', _apply_threshold,
+                                   intensity, threshold)
+        centers = profiler.call('find_centers', _find_centers,
+                                intensity[top:bot, :]) + top
+
+        # current surface pixel rows on every trace
+        current_rows = np.empty(len(trace_array))
+        current_rows.fill(np.nan)
+        current_rows[current_trace_array-1] = profiler.call(
+            'find_edges', _find_edges, binary_img, centers, surface='upper')
+        current_rows = _interpolate_nans(current_rows)
+
+        if self.preimpoundment_frequency != self.current_frequency:
+            intensity, pre_trace_array = profiler.call(
+                'get_intensity', _get_intensity, survey_line,
+                self.preimpoundment_frequency)
+        else:
+            pre_trace_array = current_trace_array
+        intensity = profiler.call('clear_above', _clear_above, intensity,
+                                  current_rows[pre_trace_array-1])
+        if self.preimpoundment_threshold < 0.0:
+            threshold = profiler.call('auto_threshold', _auto_threshold,
+                                      intensity) + \
+                self.preimpoundment_threshold_offset
+        else:
+            threshold = self.preimpoundment_threshold
+        binary_img = profiler.call('apply_threshold', _apply_threshold,
+                                   intensity, threshold)
+        centers = profiler.call('find_centers', _find_centers, intensity)
+        pre_rows = np.empty(len(trace_array))
+        pre_rows.fill(np.nan)
+        pre_rows[pre_trace_array-1] = profiler.call(
+            'find_edges', _find_edges, binary_img, centers, surface='lower')
+
+        offset = survey_line.draft - survey_line.heave
+        current_depth = current_rows * survey_line.pixel_resolution + offset
+        pre_depth = profiler.call('convert_to_depth', _convert_to_depth,
+                                  pre_rows, survey_line.pixel_resolution,
+                                  survey_line.draft, survey_line.heave)
+        profiler.stop()
+
+        return trace_array, current_depth, pre_depth
+
+
 def _find_top_bottom(img, buf=5):
     x = np.mean(img, axis=1)
     classif = GMM(n_components=2, covariance_type='full')
@@ -270,6 +437,36 @@ def _find_edge(binary_img, centers, surface='upper'):
     return cur_pics
 
 
+def _find_edges(binary_img, centers, surface='upper'):
+    """ _find_edge for all columns at once: the row of the last set pixel
+    above each center ('upper') or of the first at or below it ('lower'),
+    nan where there is none """
+    n_rows = binary_img.shape[0]
+    rows = np.arange(n_rows)[:, np.newaxis]
+    if surface == 'upper':
+        candidates = binary_img & (rows < centers)
+        edges = np.where(candidates, rows, -1).max(axis=0)
+    else:
+        candidates = binary_img & (rows >= centers)
+        edges = np.where(candidates, rows, n_rows).min(axis=0)
+    edges = edges.astype(np.float)
+    edges[~candidates.any(axis=0)] = np.nan
+
+    return edges
+
+
+def _clear_above(intensity, surface_rows):
+    """ _clear_image_above_line for all columns at once, returning a new
+    image: pixels above each column's surface row are set to their median
+    """
+    rows = np.arange(intensity.shape[0])[:, np.newaxis]
+    above = rows < surface_rows
+    medians = np.ma.median(np.ma.masked_array(intensity, ~above), axis=0)
+    cleared = np.where(above, np.ma.filled(medians, 0), intensity)
+
+    return cleared.astype(intensity.dtype)
+
+
 def _freq_dict(keys):
     key_24, key_50, key_200 = sorted([float(k) for k in keys])
 
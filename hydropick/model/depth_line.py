@@ -7,12 +7,34 @@
 
 from __future__ import absolute_import
 
-from traits.api import (Str, Enum, Array, Bool, Color, Dict,
-                        provides, HasTraits)
+import numpy as np
+
+from traits.api import (Str, Enum, Array, Bool, Color, Dict, Int, Property,
+                        Either, Tuple, provides, HasTraits, on_trait_change)
 
 from .i_depth_line import IDepthLine
 
 
+def index_range_from_array(index_array):
+    ''' returns (start, stop, step) if index_array is an evenly spaced,
+    increasing run of integers, so that it equals arange(start, stop, step),
+    else None'''
+    index_array = np.asarray(index_array)
+    if (index_array.ndim != 1 or index_array.size == 0 or
+            index_array.dtype.kind not in 'iu'):
+        return None
+    start = int(index_array[0])
+    step = 1
+    if index_array.size > 1:
+        step = int(index_array[1]) - start
+        if step <= 0:
+            return None
+    stop = start + step * index_array.size
+    if not np.array_equal(index_array, np.arange(start, stop, step)):
+        return None
+    return (start, stop, step)
+
+
 @provides(IDepthLine)
 class DepthLine(HasTraits):
     """ An interface representing a depth line
@@ -40,8 +62,16 @@ class DepthLine(HasTraits):
     #: arguments for the source: typically arguments to be sent to an algorithm
     args = Dict
 
-    #: array of indices (trace_num - 1) on which the line is defined
-    index_array = Array
+    #: array of indices (trace_num - 1) on which the line is defined.
+    #: evenly spaced runs (almost always trace_num - 1) are only held as
+    #: index_range and the array is made when asked for
+    index_array = Property(Array, depends_on='index_range, _index_array')
+
+    #: (start, stop, step) of index_array if it is an evenly spaced run
+    index_range = Either(None, Tuple(Int, Int, Int))
+
+    #: number of indices, without making the index array
+    index_size = Property(Int, depends_on='index_range, _index_array')
 
     # array of depth values for each index
     depth_array = Array
@@ -58,11 +88,46 @@ class DepthLine(HasTraits):
     # lock prevents depth line from being edited.
     locked = Bool(True)
 
+    # True when the line has changes not yet written to disk.  New lines
+    # are dirty; lines read from disk are marked clean after reading.
+    dirty = Bool(True)
+
+    # index_array when it is not an evenly spaced run
+    _index_array = Array
+
     def distance_array(self, distance_array):
         ''' Creates array for x-axis
 
         takes an array of distance values and pulls out those corresponding to
         this lines index array
         '''
-        xs = distance_array[self.index_array]
+        if self.index_range is not None:
+            start, stop, step = self.index_range
+            return distance_array[start:stop:step]
+        xs = distance_array[self._index_array]
         return xs
+
+    @on_trait_change('survey_line_name, name, line_type, source, source_name,'
+                     'args, args_items, index_range, _index_array, '
+                     'depth_array, edited, color, notes, locked')
+    def _mark_dirty(self):
+        self.dirty = True
+
+    def _get_index_array(self):
+        if self.index_range is not None:
+            return np.arange(*self.index_range)
+        return self._index_array
+
+    def _set_index_array(self, index_array):
+        index_range = index_range_from_array(index_array)
+        if index_range is None:
+            self._index_array = index_array
+        else:
+            self._index_array = np.array([], dtype=int)
+        self.index_range = index_range
+
+    def _get_index_size(self):
+        if self.index_range is not None:
+            start, stop, step = self.index_range
+            return len(xrange(start, stop, step))
+        return len(self._index_array)
@@ -0,0 +1,243 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+""" Gridding of exported survey points into elevation and sediment
+thickness surfaces, and the lake and sediment volumes they enclose.
+
+Points (as returned by io.export_survey.read_survey_points_hdf) are
+interpolated by inverse distance weighting over their nearest neighbours,
+found with a KD-tree.  The grid covers the lake polygon built from
+Lake.shoreline and is processed in square tiles, in parallel if asked.
+"""
+
+from __future__ import absolute_import
+
+import logging
+import multiprocessing
+
+import numpy as np
+from scipy.spatial import cKDTree
+from shapely.geometry import box, MultiLineString, Polygon
+from shapely.ops import polygonize
+
+logger = logging.getLogger(__name__)
+
+# defaults for the IDW interpolation
+IDW_POWER = 2
+IDW_NEIGHBOURS = 8
+
+# grid cells along each side of a tile
+TILE_SIZE = 256
+
+# point columns gridded into surfaces, if present
+SURFACE_COLUMNS = ['current_surface_elevation', 'pre_impoundment_elevation']
+
+# per process state for tile workers: {column: (tree, values)} and options
+_worker_state = {}
+
+
+def lake_polygon(shoreline):
+    """ Return the lake as a polygon from a shoreline geometry.
+
+    Line work is polygonized and the largest polygon kept, so islands
+    (closed rings inside the shoreline) become holes.
+    """
+    geoms = getattr(shoreline, 'geoms', [shoreline])
+    polygons = [geom for geom in geoms if isinstance(geom, Polygon)]
+    lines = [geom for geom in geoms if not isinstance(geom, Polygon)]
+    if lines:
+        polygons.extend(polygonize(MultiLineString(lines)))
+    if not polygons:
+        raise ValueError('shoreline does not enclose any area')
+    return max(polygons, key=lambda polygon: polygon.area)
+
+
+def points_in_polygon(x, y, polygon):
+    """ Vectorized even-odd test of points x, y against all the rings of a
+    polygon (or multipolygon).  Meant for small, clipped polygons: the cost
+    is one pass over the points per polygon edge.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    inside = np.zeros(x.shape, dtype=bool)
+    for ring in _rings(polygon):
+        coords = np.asarray(ring.coords)
+        for (xa, ya), (xb, yb) in zip(coords[:-1], coords[1:]):
+            if ya == yb:
+                continue
+            crosses = (ya > y) != (yb > y)
+            x_cross = xa + (y - ya) * (xb - xa) / (yb - ya)
+            inside ^= crosses & (x < x_cross)
+    return inside
+
+
+def grid_survey_points(points, shoreline, cell_size,
+                       water_surface_elevation=None, power=IDW_POWER,
+                       neighbours=IDW_NEIGHBOURS, radius=np.inf,
+                       tile_size=TILE_SIZE, processes=1):
+    """ Grid survey points inside the lake boundary.
+
+    points is a dict of arrays with x, y, current_surface_elevation and
+    optionally pre_impoundment_elevation.  Each surface is interpolated by
+    IDW over the `neighbours` nearest points within `radius`; cells with no
+    points in range are NaN.  Tiles of tile_size cells square are gridded
+    by `processes` worker processes (in this process if 1).
+
+    Returns a dict with the cell centre coordinates x (columns) and y
+    (rows), the float32 surface grids (NaN outside the lake), 'inside' (bool
+    grid), 'sediment_thickness' (if preimpoundment was given), the
+    cell_area, and the volume totals: 'sediment_volume', and 'volume'
+    (water volume below water_surface_elevation, e.g. Lake.elevation, if
+    given).  Negative depths and thicknesses do not count toward volumes.
+    """
+    polygon = lake_polygon(shoreline)
+    columns = [column for column in SURFACE_COLUMNS if column in points]
+    xmin, ymin, xmax, ymax = polygon.bounds
+    n_cols = int(np.ceil((xmax - xmin) / cell_size))
+    n_rows = int(np.ceil((ymax - ymin) / cell_size))
+    x = xmin + (np.arange(n_cols) + 0.5) * cell_size
+    y = ymin + (np.arange(n_rows) + 0.5) * cell_size
+
+    result = dict(x=x, y=y, cell_area=float(cell_size) ** 2,
+                  inside=np.zeros((n_rows, n_cols), dtype=bool))
+    for column in columns:
+        result[column] = np.empty((n_rows, n_cols), dtype=np.float32)
+        result[column].fill(np.nan)
+
+    tiles = list(_tiles(polygon, x, y, cell_size, tile_size))
+    logger.info('gridding {} x {} cells in {} tiles'
+                .format(n_cols, n_rows, len(tiles)))
+    state = (points, columns, power, neighbours, radius)
+    for row_slice, col_slice, inside, surfaces in _map_tiles(
+            tiles, state, processes):
+        result['inside'][row_slice, col_slice] = inside
+        for column in columns:
+            result[column][row_slice, col_slice] = surfaces[column]
+
+    _add_totals(result, water_surface_elevation)
+    return result
+
+
+def _add_totals(result, water_surface_elevation):
+    inside = result['inside']
+    cell_area = result['cell_area']
+    current = result['current_surface_elevation'].astype(np.float64)
+    if water_surface_elevation is not None:
+        depth = np.clip(water_surface_elevation - current[inside], 0, np.inf)
+        result['volume'] = np.nansum(depth) * cell_area
+    if 'pre_impoundment_elevation' in result:
+        pre = result['pre_impoundment_elevation']
+        thickness = result['current_surface_elevation'] - pre
+        result['sediment_thickness'] = thickness
+        sediment = np.clip(thickness[inside].astype(np.float64), 0, np.inf)
+        result['sediment_volume'] = np.nansum(sediment) * cell_area
+
+
+def _init_worker(state):
+    """ build the KD-trees for each surface once per process """
+    points, columns, power, neighbours, radius = state
+    x = np.asarray(points['x'], dtype=np.float64)
+    y = np.asarray(points['y'], dtype=np.float64)
+    trees = {}
+    for column in columns:
+        values = np.asarray(points[column], dtype=np.float64)
+        valid = np.isfinite(values) & np.isfinite(x) & np.isfinite(y)
+        xy = np.column_stack([x[valid], y[valid]])
+        trees[column] = (cKDTree(xy) if len(xy) else None, values[valid])
+    _worker_state.clear()
+    _worker_state.update(trees=trees, power=power, neighbours=neighbours,
+                         radius=radius)
+
+
+def _grid_tile(tile):
+    """ grid one tile: (row_slice, col_slice, x, y, clip) where clip is
+    True for tiles inside the lake or the part of the lake in the tile.
+    """
+    row_slice, col_slice, x, y, clip = tile
+    grid_x, grid_y = np.meshgrid(x, y)
+    if clip is True:
+        inside = np.ones(grid_x.shape, dtype=bool)
+    else:
+        inside = points_in_polygon(grid_x, grid_y, clip)
+
+    surfaces = {}
+    cells = np.column_stack([grid_x[inside], grid_y[inside]])
+    for column, (tree, values) in _worker_state['trees'].items():
+        surface = np.empty(grid_x.shape, dtype=np.float32)
+        surface.fill(np.nan)
+        if tree is not None and len(cells):
+            surface[inside] = _idw(tree, values, cells,
+                                   _worker_state['power'],
+                                   _worker_state['neighbours'],
+                                   _worker_state['radius'])
+        surfaces[column] = surface
+    return row_slice, col_slice, inside, surfaces
+
+
+def _idw(tree, values, cells, power, neighbours, radius):
+    """ inverse distance weighted values at cells from the nearest points """
+    k = min(neighbours, len(values))
+    distances, indices = tree.query(cells, k=k, distance_upper_bound=radius)
+    if k == 1:
+        distances = distances[:, np.newaxis]
+        indices = indices[:, np.newaxis]
+    # missing neighbours (beyond radius) have infinite distance
+    found = np.isfinite(distances)
+    indices = np.where(found, indices, 0)
+    with np.errstate(divide='ignore'):
+        weights = np.where(found, 1.0 / distances ** power, 0.0)
+    # a point on the cell centre takes all the weight
+    exact = distances == 0
+    has_exact = exact.any(axis=1)
+    weights[has_exact] = exact[has_exact]
+    total = weights.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (weights * values[indices]).sum(axis=1) / total
+
+
+def _map_tiles(tiles, state, processes):
+    """ yield gridded tiles, in a pool of processes if more than 1 """
+    if processes == 1:
+        _init_worker(state)
+        for tile in tiles:
+            yield _grid_tile(tile)
+        return
+
+    pool = multiprocessing.Pool(processes, _init_worker, (state,))
+    try:
+        for result in pool.imap_unordered(_grid_tile, tiles):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _rings(polygon):
+    for geom in getattr(polygon, 'geoms', [polygon]):
+        if isinstance(geom, Polygon):
+            yield geom.exterior
+            for interior in geom.interiors:
+                yield interior
+
+
+def _tiles(polygon, x, y, cell_size, tile_size):
+    """ yield tiles that overlap the lake polygon """
+    half = cell_size / 2.0
+    for row in range(0, len(y), tile_size):
+        row_slice = slice(row, row + tile_size)
+        tile_y = y[row_slice]
+        for col in range(0, len(x), tile_size):
+            col_slice = slice(col, col + tile_size)
+            tile_x = x[col_slice]
+            tile_box = box(tile_x[0] - half, tile_y[0] - half,
+                           tile_x[-1] + half, tile_y[-1] + half)
+            if not polygon.intersects(tile_box):
+                continue
+            if polygon.contains(tile_box):
+                clip = True
+            else:
+                clip = polygon.intersection(tile_box)
+            yield row_slice, col_slice, tile_x, tile_y, clip
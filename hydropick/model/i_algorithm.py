@@ -25,6 +25,11 @@ class IAlgorithm(Interface):
     # to set when the algorithm is applied
     arglist = []
 
+    # line types ('current surface', 'pre-impoundment surface') of the depth
+    # arrays process_line returns.  An algorithm that picks several
+    # surfaces returns one depth array for each.
+    line_types = []
+
     # instructions for user (description of algorithm and required args def)
     instructions = Str()
 
@@ -35,9 +40,15 @@ class IAlgorithm(Interface):
         line is created (ie use to get the x axis).
         
         return trace_num_array, depth_array
+        or, for several surfaces, trace_num_array followed by a depth_array
+        for each of line_types
         """
         raise NotImplementedError
 
+    #: a hydropick.util.profiling.StageProfiler which, when enabled, times
+    #: the stages of process_line
+    profiler = Any
+
     # should be a View object or somthing that returns a view object for
     # configuring the arguments in arglist and displaying instructions
     traits_view = Any
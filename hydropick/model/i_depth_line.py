@@ -7,7 +7,8 @@
 
 from __future__ import absolute_import
 
-from traits.api import Interface, Str, Enum, Array, Bool, Color, Dict
+from traits.api import (Interface, Str, Enum, Array, Bool, Color, Dict, Int,
+                        Either, Tuple)
 
 
 class IDepthLine(Interface):
@@ -39,6 +40,9 @@ class IDepthLine(Interface):
     #: array of indices (trace_num's) on which the line is defined
     index_array = Array
 
+    #: (start, stop, step) of index_array if it is an evenly spaced run
+    index_range = Either(None, Tuple(Int, Int, Int))
+
     # array of depth values for each index
     depth_array = Array
 
@@ -53,3 +57,6 @@ class IDepthLine(Interface):
 
     # lock prevents depth line from being edited.
     locked = Bool
+
+    # True when the line has changes not yet written to disk
+    dirty = Bool
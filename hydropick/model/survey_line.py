@@ -12,12 +12,14 @@ import numpy as np
 from shapely.geometry import LineString
 
 from traits.api import (HasTraits, Array, Dict, Event, List, Supports, Str,
-                        provides, CFloat, Instance, Bool, Enum, Property)
+                        provides, CFloat, Instance, Bool, Enum, Property,
+                        on_trait_change)
 
 from .i_core_sample import ICoreSample
 from .i_survey_line import ISurveyLine
 from .i_depth_line import IDepthLine
 from .depth_line import DepthLine
+from ..util.metrics import METRICS
 
 logger = logging.getLogger(__name__)
 
@@ -115,6 +117,14 @@ class SurveyLine(HasTraits):
     # project directory where this survey line will save itself
     project_dir = Str
 
+    # True when final depths, status or status string have changed since
+    # they were read or last saved.  New lines are dirty; lines read from
+    # disk are marked clean after reading.
+    attrs_dirty = Bool(True)
+
+    # True when the mask has changed since it was read or last saved
+    mask_dirty = Bool(True)
+
     #==========================================================================
     # PROPERTY TRAITS - NO NEED TO SAVE
     #==========================================================================
@@ -162,10 +172,18 @@ class SurveyLine(HasTraits):
             self.core_depth_reference_str = None
             logger.error('Cannot find current surface line to set.')
 
+    @on_trait_change('final_lake_depth, final_preimpoundment_depth, status,'
+                     'status_string')
+    def _mark_attrs_dirty(self):
+        self.attrs_dirty = True
+
+    def _mask_changed(self):
+        self.mask_dirty = True
+
     def _final_lake_depth_default(self):
-        default = self.lake_depths.get(
-            CURRENT_SURFACE_FROM_BIN_NAME, None)
-        return default.name
+        # the surface from the bin file is created on load if missing, so
+        # this is valid whether or not the line data is loaded
+        return CURRENT_SURFACE_FROM_BIN_NAME
 
     def _get_masked(self):
         ''' rather than being externally set this trait is set when mask
@@ -178,10 +196,11 @@ class SurveyLine(HasTraits):
                 masked = True
         return masked
 
-    def save_to_disk(self, project_dir=None):
+    def save_to_disk(self, project_dir=None, changed_only=True):
         ''' saves this survey line to disk
         This will save all the trait data list above in the "user generated"
-        traits section
+        traits section.  By default only the depth lines, attributes and
+        mask changed since they were read or last saved are written.
         If the project dir is set in the survey line, this method does not
         need to have it passed by the caller
         '''
@@ -193,66 +212,107 @@ class SurveyLine(HasTraits):
         if os.path.isdir(project_dir):
             logger.warn('this would save survey line {} to disk if it could'
                         .format(self.name))
-            survey_io.write_survey_line_to_hdf(project_dir, self)
+            survey_io.write_survey_line_to_hdf(project_dir, self,
+                                               changed_only=changed_only)
         else:
             logger.error('project directory is not valid')
 
-    def load_data(self, project_dir):
+    def load_data(self, project_dir, data=None):
         ''' Called by UI to load this survey line when selected to edit
+        If data (as returned by read_data, e.g. prefetched on a worker
+        thread) is given it is used instead of reading from disk.
+        '''
+        with METRICS.timer('survey_line.load_data'):
+            if data is None:
+                data = self.read_data(project_dir)
+            self.apply_data(data)
+
+    @METRICS.timed('survey_line.read_data')
+    def read_data(self, project_dir):
+        ''' Reads and decodes the arrays for this survey line from disk.
+        No traits are set so this may be called from a worker thread.
+        Returns a dictionary of trait values to pass to apply_data.
+
+        The one write: a line imported before trace_num arrays were
+        repaired on import is repaired on its first read and the repair
+        stored in raw_data.h5 (see survey_io.validate_trace_num_arrays).
         '''
         from ..io import survey_io
 
+        name = self.name
         # read frequency dict from hdf5 file.
         sdi_dict_raw = survey_io.read_sdi_data_unseparated_from_hdf(project_dir,
-                                                                    self.name)
+                                                                    name)
         freq_dict_list = survey_io.read_frequency_data_from_hdf(project_dir,
-                                                                self.name)
+                                                                name)
 
         # fill frequncies and freq_trace_num dictionaries with freqs as keys.
+        frequencies = {}
+        freq_trace_num = {}
         for freq_dict in freq_dict_list:
             key = freq_dict['kHz']
             # transpose array to go into image plot correctly oriented
             intensity = freq_dict['intensity'].T
-            self.frequencies[str(key)] = intensity
-            self.freq_trace_num[str(key)] = freq_dict['trace_num']
+            frequencies[str(key)] = intensity
+            freq_trace_num[str(key)] = freq_dict['trace_num']
 
         # for all other traits, use un-freq-sorted values
-        self.trace_num = sdi_dict_raw['trace_num']
-        self.locations = np.vstack([sdi_dict_raw['interpolated_easting'],
-                                   sdi_dict_raw['interpolated_northing']]).T
-        self.lat_long = np.vstack([sdi_dict_raw['latitude'],
-                                  sdi_dict_raw['longitude']]).T
-        self.draft = (np.mean(sdi_dict_raw['draft']))
-        self.heave = sdi_dict_raw['heave']
-        self.pixel_resolution = (np.mean(sdi_dict_raw['pixel_resolution']))
-        self.power = sdi_dict_raw['power']
-        self.gain = sdi_dict_raw['gain']
-        # check consistent arrays
-        self.array_sizes_ok()
-        # depth lines stored separately
-        self.lake_depths = survey_io.read_pick_lines_from_hdf(
-            project_dir, self.name, 'current')
-        self.preimpoundment_depths = survey_io.read_pick_lines_from_hdf(
-            project_dir, self.name, 'preimpoundment')
+        trace_num, freq_trace_num = survey_io.validate_trace_num_arrays(
+            project_dir, name, sdi_dict_raw['trace_num'], freq_trace_num)
+        data = dict(
+            frequencies=frequencies,
+            freq_trace_num=freq_trace_num,
+            trace_num=trace_num,
+            locations=np.vstack([sdi_dict_raw['interpolated_easting'],
+                                 sdi_dict_raw['interpolated_northing']]).T,
+            lat_long=np.vstack([sdi_dict_raw['latitude'],
+                                sdi_dict_raw['longitude']]).T,
+            draft=np.mean(sdi_dict_raw['draft']),
+            heave=sdi_dict_raw['heave'],
+            pixel_resolution=np.mean(sdi_dict_raw['pixel_resolution']),
+            power=sdi_dict_raw['power'],
+            gain=sdi_dict_raw['gain'],
+        )
 
-        if not CURRENT_SURFACE_FROM_BIN_NAME in self.lake_depths:
+        # depth lines stored separately
+        lake_depths = survey_io.read_pick_lines_from_hdf(
+            project_dir, name, 'current')
+        if not CURRENT_SURFACE_FROM_BIN_NAME in lake_depths:
             filename = os.path.basename(sdi_dict_raw['filepath'])
             sdi_surface = DepthLine(
                 name='current_surface_from_bin',
-                survey_line_name=self.name,
+                survey_line_name=name,
                 line_type='current surface',
                 source='sdi_file',
                 source_name=filename,
-                index_array=self.trace_num - 1,
+                index_array=trace_num - 1,
                 depth_array=sdi_dict_raw['depth_r1'],
                 color=(255, 255, 255, 255),
                 lock=True
             )
-            survey_io.write_depth_line_to_hdf(project_dir, sdi_surface, self.name)
-            self.lake_depths = survey_io.read_pick_lines_from_hdf(
-                project_dir, self.name, 'current')
-
-        self.mask = survey_io.read_survey_line_mask_from_hdf(project_dir, self.name)
+            survey_io.write_depth_line_to_hdf(project_dir, sdi_surface, name)
+            lake_depths = survey_io.read_pick_lines_from_hdf(
+                project_dir, name, 'current')
+        data['lake_depths'] = lake_depths
+        data['preimpoundment_depths'] = survey_io.read_pick_lines_from_hdf(
+            project_dir, name, 'preimpoundment')
+
+        data['mask'] = survey_io.read_survey_line_mask_from_hdf(project_dir,
+                                                                name)
+        return data
+
+    def apply_data(self, data):
+        ''' Sets the traits of this survey line from a dictionary returned
+        by read_data.  Must be called on the thread that owns the UI.
+        '''
+        user_data = ['lake_depths', 'preimpoundment_depths', 'mask']
+        self.trait_set(**dict((k, v) for k, v in data.items()
+                              if k not in user_data))
+        # check consistent arrays
+        self.array_sizes_ok()
+        self.trait_set(**dict((k, data[k]) for k in user_data))
+        # as read from disk
+        self.mask_dirty = False
 
     def unload_data(self):
         """Dereferences larger data structures so they can be garbage collected"""
@@ -267,6 +327,8 @@ class SurveyLine(HasTraits):
         self.lake_depths = {}
         self.preimpoundment_depths = {}
         self.mask = []
+        # nothing left to save; the mask on disk is unchanged
+        self.mask_dirty = False
 
     def nearby_core_samples(self, core_samples, dist_tol=100):
         """ Find core samples from a list of CoreSample instances
@@ -285,21 +347,15 @@ class SurveyLine(HasTraits):
         ''' this is an check that the arrays for this line make sense
         All the non-separated arrays should be the same size and the
         trace_num array should be range(1,N).  This could be slightly
-        more general by assuming and order array instead of contiguous'''
+        more general by assuming and order array instead of contiguous.
+        The trace_num arrays are repaired on import (or on the first read
+        of older projects, see read_data) so they are not checked here.'''
         name = self.name
         logger.info('Checking all array integrity for line {}'.format(name))
         arrays = ['trace_num', 'locations', 'lat_long', 'heave', 'power',
                   'gain']
 
-        from ..io import survey_io
-        bad_indices, bad_vals = survey_io.check_trace_num_array(self.trace_num,
-                                                                self.name)
-        tn, fn = survey_io.fix_trace_num_arrays(self.trace_num,
-                                                bad_indices,
-                                                self.freq_trace_num)
-        self.trace_num = tn
-        self.freq_trace_num = fn
-        N = len(tn)
+        N = len(self.trace_num)
         for a in arrays:
             if getattr(self, a).shape[0] != N:
                 s = '{} is not size {}'.format(a, N)
@@ -58,15 +58,45 @@ class TestAlgorithms(unittest.TestCase):
         try:
             class_list = self.get_classes()
             for cls in class_list:
-                trace_array, depth_array = cls().process_line(self.survey_line)
+                result = cls().process_line(self.survey_line)
+                trace_array, depth_arrays = result[0], result[1:]
+                self.assertEqual(len(depth_arrays), len(cls.line_types))
                 self.assertIsInstance(np.asarray(trace_array), np.ndarray,
                                     msg='cannot convert to array')
-                self.assertIsInstance(np.asarray(depth_array), np.ndarray,
-                                    msg='cannot convert to array')
-                self.assertEqual(len(trace_array),len(depth_array))
+                for depth_array in depth_arrays:
+                    self.assertIsInstance(np.asarray(depth_array), np.ndarray,
+                                        msg='cannot convert to array')
+                    self.assertEqual(len(trace_array),len(depth_array))
         except AttributeError as err:
             self.assertTrue(False, msg='undefined: {}'.format(err))
 
+    def test_joint_surfaces(self):
+        ''' check the joint algorithm picks the same current surface as the
+        current surface algorithm and a preimpoundment surface on every
+        trace'''
+        from hydropick.model import algorithms
+        trace_array, current_depth = \
+            algorithms.ThresholdCurrentSurface().process_line(self.survey_line)
+        joint = algorithms.ThresholdJointSurfaces()
+        joint_trace_array, joint_current, joint_pre = \
+            joint.process_line(self.survey_line)
+        np.testing.assert_array_equal(joint_trace_array, trace_array)
+        np.testing.assert_allclose(joint_current, current_depth)
+        self.assertEqual(len(joint_pre), len(trace_array))
+        self.assertFalse(np.isnan(joint_pre).any())
+
+    def test_find_edges(self):
+        ''' check the vectorized edge finding matches _find_edge'''
+        from hydropick.model import algorithms
+        random = np.random.RandomState(0)
+        binary_img = random.uniform(size=(50, 40)) < 0.1
+        binary_img[:, 0] = False
+        centers = random.randint(0, 50, 40)
+        for surface in ['upper', 'lower']:
+            np.testing.assert_array_equal(
+                algorithms._find_edges(binary_img, centers, surface),
+                algorithms._find_edge(binary_img, centers, surface))
+
 
 if __name__ == "__main__":
     # from package use "python -m unittest discover -v -s ./tests/"
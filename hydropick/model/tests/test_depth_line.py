@@ -67,6 +67,41 @@ class TestDepthLine(unittest.TestCase):
             self.assertTrue(False, msg='distance array err: {}'.format(err))
 
 
+class TestDepthLineIndexRange(unittest.TestCase):
+    ''' Test range encoding of DepthLine index arrays'''
+
+    def test_index_range_from_array(self):
+        from hydropick.model.depth_line import index_range_from_array
+        self.assertEqual(index_range_from_array(np.arange(5, 15)), (5, 15, 1))
+        self.assertEqual(index_range_from_array(np.arange(0, 9, 2)),
+                         (0, 10, 2))
+        self.assertEqual(index_range_from_array(np.array([3])), (3, 4, 1))
+        self.assertIsNone(index_range_from_array(np.array([1, 2, 4])))
+        self.assertIsNone(index_range_from_array(np.array([])))
+        self.assertIsNone(index_range_from_array(np.array([1., 2., 3.])))
+
+    def test_contiguous_index_array(self):
+        from hydropick.model.depth_line import DepthLine
+        line = DepthLine(index_array=np.arange(10, 20),
+                         depth_array=np.ones(10))
+        self.assertEqual(line.index_range, (10, 20, 1))
+        self.assertEqual(line.index_size, 10)
+        np.testing.assert_array_equal(line.index_array, np.arange(10, 20))
+        distance = np.arange(30) * 2.0
+        xs = line.distance_array(distance)
+        np.testing.assert_array_equal(xs, distance[10:20])
+
+    def test_scattered_index_array(self):
+        from hydropick.model.depth_line import DepthLine
+        index_array = np.array([1, 5, 6])
+        line = DepthLine(index_array=index_array, depth_array=np.ones(3))
+        self.assertIsNone(line.index_range)
+        self.assertEqual(line.index_size, 3)
+        np.testing.assert_array_equal(line.index_array, index_array)
+        np.testing.assert_array_equal(line.distance_array(np.arange(10) * 2),
+                                      [2, 10, 12])
+
+
 if __name__ == "__main__":
     # from package use "python -m unittest discover -v -s ./tests/"
     unittest.main()
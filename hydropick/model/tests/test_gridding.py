@@ -0,0 +1,79 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+import unittest
+
+import numpy as np
+from shapely.geometry import LineString, MultiLineString, Polygon
+
+from hydropick.model.gridding import (grid_survey_points, lake_polygon,
+                                      points_in_polygon)
+
+
+def _plane_points(n=41, size=100.0):
+    x, y = np.meshgrid(np.linspace(0, size, n), np.linspace(0, size, n))
+    x = x.ravel()
+    y = y.ravel()
+    current = 90.0 - 0.05 * x
+    return dict(x=x, y=y, current_surface_elevation=current,
+                pre_impoundment_elevation=current - 2.0)
+
+
+class TestGridding(unittest.TestCase):
+
+    def setUp(self):
+        self.square = LineString([(0, 0), (100, 0), (100, 100), (0, 100),
+                                  (0, 0)])
+
+    def test_lake_polygon_from_lines(self):
+        island = LineString([(40, 40), (60, 40), (60, 60), (40, 60),
+                             (40, 40)])
+        polygon = lake_polygon(MultiLineString([self.square, island]))
+        # the island is a hole
+        self.assertAlmostEqual(polygon.area, 100 * 100 - 20 * 20)
+        self.assertEqual(len(polygon.interiors), 1)
+
+    def test_points_in_polygon_with_hole(self):
+        polygon = Polygon([(0, 0), (10, 0), (10, 10), (0, 10)],
+                          [[(4, 4), (6, 4), (6, 6), (4, 6)]])
+        x = np.array([1, 5, 9, 11])
+        y = np.array([1, 5, 9, 5])
+        inside = points_in_polygon(x, y, polygon)
+        self.assertEqual(inside.tolist(), [True, False, True, False])
+
+    def test_grid_plane(self):
+        points = _plane_points()
+        for processes in [1, 2]:
+            result = grid_survey_points(points, self.square, 1.0,
+                                        water_surface_elevation=100.0,
+                                        tile_size=32, processes=processes)
+            self.assertEqual(result['current_surface_elevation'].shape,
+                             (100, 100))
+            self.assertTrue(result['inside'].all())
+            expected = 90.0 - 0.05 * result['x']
+            np.testing.assert_allclose(
+                result['current_surface_elevation'][50], expected, atol=0.05)
+            np.testing.assert_allclose(result['sediment_thickness'], 2.0,
+                                       atol=1e-4)
+            # mean depth is 100 - (90 - 0.05 * 50) = 12.5
+            self.assertAlmostEqual(result['volume'] / 1e4, 12.5, places=1)
+            self.assertAlmostEqual(result['sediment_volume'] / 1e4, 2.0,
+                                   places=3)
+
+    def test_grid_excludes_cells_outside_lake(self):
+        triangle = LineString([(0, 0), (100, 0), (0, 100), (0, 0)])
+        result = grid_survey_points(_plane_points(), triangle, 1.0,
+                                    tile_size=16)
+        inside = result['inside']
+        self.assertAlmostEqual(inside.sum() / 1e4, 0.5, places=1)
+        self.assertTrue(np.isnan(
+            result['current_surface_elevation'][~inside]).all())
+        self.assertNotIn('volume', result)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -9,10 +9,14 @@ from __future__ import absolute_import
 
 import os
 import sys
+import threading
 import logging
 
 from traits.etsconfig.etsconfig import ETSConfig
-from traits.api import HasTraits, Directory, Instance, Supports
+from traits.api import HasTraits, Directory, File, Instance, Supports
+
+from ..util.memory import DEFAULT_MEMORY_BUDGET
+from ..util.metrics import METRICS, METRICS_FILENAME
 
 
 class Application(HasTraits):
@@ -39,6 +43,9 @@ class Application(HasTraits):
     #: the main task window
     task = Instance('pyface.tasks.task.Task')
 
+    #: file the timing metrics are written to on exit
+    metrics_file = File
+
     def exception_handler(self, exc_type, exc_value, exc_traceback):
         """ Handle un-handled exceptions """
         if not isinstance(exc_value, Exception):
@@ -79,6 +86,16 @@ class Application(HasTraits):
                             dest='export_', metavar='SURVEY_POINTS_FILE')
         parser.add_argument('--export-no-pre', help='export survey points to this file, no preimpoundment or sediment thickness will be included',
                             dest='export_no_pre_', metavar='SURVEY_POINTS_FILE_WITHOUT_PRE')
+        parser.add_argument('--export-processes', help='number of processes used to export survey lines (default 1)',
+                            dest='export_processes_', metavar='N', type=int, default=1)
+        parser.add_argument('--export-hdf', help='export survey points as compressed arrays to this hdf5 file',
+                            dest='export_hdf_', metavar='SURVEY_POINTS_HDF5_FILE')
+        parser.add_argument('--export-no-cache', help='regenerate every survey line when exporting instead of reusing unchanged lines',
+                            dest='export_no_cache_', action='store_true')
+        parser.add_argument('--metrics', help='write timing metrics to this json file on exit (default {} in the application data directory)'.format(METRICS_FILENAME),
+                            dest='metrics_', metavar='METRICS_FILE')
+        parser.add_argument('--memory-budget', help='megabytes of survey line data to hold in memory before evicting lines (default {})'.format(DEFAULT_MEMORY_BUDGET // 1024 ** 2),
+                            dest='memory_budget_', metavar='MB', type=int)
         args = parser.parse_args()
         return args
 
@@ -88,22 +105,34 @@ class Application(HasTraits):
         args = self.parse_arguments()
         handler = self.get_logging_handler()
         self.logger.addHandler(handler)
+        if args.metrics_:
+            self.metrics_file = args.metrics_
+        if args.memory_budget_:
+            self.task.memory.memory_budget = args.memory_budget_ * 1024 ** 2
 
         if args.import_:
             from ..io.import_survey import import_survey
             survey = import_survey(args.import_, args.with_picks_)
             self.task.survey = survey
-        if (args.tide_gauge_ or args.export_) and not self.task.survey:
+        if (args.tide_gauge_ or args.export_ or args.export_hdf_) and not self.task.survey:
             raise RuntimeError("When exporting or generating a tide file, you must provide a survey with --import")
         if args.tide_gauge_:
             from ..io.export_survey import generate_tide_file
             generate_tide_file(args.tide_gauge_, self.task.survey)
         if args.export_:
             from ..io.export_survey import export_survey_points
-            export_survey_points(self.task.survey, args.export_, with_pre=True)
+            export_survey_points(self.task.survey, args.export_, with_pre=True,
+                                 processes=args.export_processes_,
+                                 use_cache=not args.export_no_cache_)
         if args.export_no_pre_:
             from ..io.export_survey import export_survey_points
-            export_survey_points(self.task.survey, args.export_no_pre_, with_pre=False)
+            export_survey_points(self.task.survey, args.export_no_pre_, with_pre=False,
+                                 processes=args.export_processes_,
+                                 use_cache=not args.export_no_cache_)
+        if args.export_hdf_:
+            from ..io.export_survey import export_survey_points_hdf
+            export_survey_points_hdf(self.task.survey, args.export_hdf_, with_pre=True,
+                                     processes=args.export_processes_)
         if args.logging is not None:
             self.logger.setLevel(args.logging)
         else:
@@ -140,6 +169,16 @@ class Application(HasTraits):
 
     def stop(self):
         self.logger.info('Stopping application')
+        self.dump_metrics()
+
+    def dump_metrics(self):
+        try:
+            METRICS.dump(self.metrics_file)
+        except (IOError, OSError):
+            self.logger.exception('could not write metrics to {}'
+                                  .format(self.metrics_file))
+        else:
+            self.logger.info('wrote metrics to {}'.format(self.metrics_file))
 
     def cleanup(self):
         logging.shutdown()
@@ -150,6 +189,9 @@ class Application(HasTraits):
             os.makedirs(home)
         return home
 
+    def _metrics_file_default(self):
+        return os.path.join(self.application_home, METRICS_FILENAME)
+
     def _logger_default(self):
         return logging.getLogger()
 
@@ -205,5 +247,14 @@ class Filter(object):
 
     def filter(self, record):
         new_string = self.formatter.format(record) + '\n'
-        self.task.msg_string = new_string + self.task.msg_string
+        if isinstance(threading.current_thread(), threading._MainThread):
+            self.add_message(new_string)
+        else:
+            # records from worker threads (e.g. the line loader) must only
+            # touch the UI from the main thread
+            from pyface.api import GUI
+            GUI.invoke_later(self.add_message, new_string)
         return True
+
+    def add_message(self, new_string):
+        self.task.msg_string = new_string + self.task.msg_string
@@ -0,0 +1,113 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import logging
+import time
+
+from traits.api import HasTraits, Bool, Callable, Float, Instance, Int
+
+from .survey_writer import SurveyWriter
+
+logger = logging.getLogger(__name__)
+
+# milliseconds without changes to a line before it is saved
+AUTOSAVE_QUIET_PERIOD = 1000
+
+
+def _do_after(interval, callable):
+    from pyface.timer.api import do_after
+    return do_after(interval, callable)
+
+
+class AutosaveScheduler(HasTraits):
+    """ Saves changed survey lines to disk once changes stop.
+
+    Edits usually come in bursts (a pick renamed, its color changed, a
+    status set...).  Rather than each one saving the whole line, schedule
+    marks the line as needing a save and the line is written once, after
+    quiet_period milliseconds without further changes.  flush writes
+    pending lines immediately, and must be called before a line's data is
+    unloaded and when the application closes.
+
+    If a writer is given, lines are handed to it to be written in the
+    background instead of being saved on the UI thread.
+    """
+
+    #: milliseconds without changes before pending lines are saved
+    quiet_period = Int(AUTOSAVE_QUIET_PERIOD)
+
+    #: used to call back after a delay on the UI thread
+    do_after = Callable(_do_after)
+
+    #: current time in seconds
+    clock = Callable(time.time)
+
+    #: background writer for saves, None to save on the calling thread
+    writer = Instance(SurveyWriter)
+
+    #: lines waiting to be saved, keyed by name, in order of first change
+    _pending = Instance(OrderedDict, ())
+
+    #: time of the last change
+    _last_change = Float
+
+    #: whether a timer is waiting to check for the quiet period
+    _timer_running = Bool(False)
+
+    def __contains__(self, name):
+        return name in self._pending
+
+    def __len__(self):
+        return len(self._pending)
+
+    def schedule(self, survey_line):
+        ''' save survey_line once there have been no changes for
+        quiet_period '''
+        self._pending.setdefault(survey_line.name, survey_line)
+        self._last_change = self.clock()
+        if not self._timer_running:
+            self._timer_running = True
+            self.do_after(self.quiet_period, self._check_quiet)
+
+    def flush(self, survey_line=None):
+        ''' save pending lines now: just survey_line if given, else all.
+        Returns the names of the lines saved.
+        '''
+        if survey_line is None:
+            names = list(self._pending.keys())
+        elif survey_line.name in self._pending:
+            names = [survey_line.name]
+        else:
+            names = []
+        for name in names:
+            line = self._pending.pop(name)
+            logger.info('saving survey line {}'.format(name))
+            try:
+                if self.writer is None:
+                    line.save_to_disk()
+                else:
+                    self.writer.save(line)
+            except Exception:
+                logger.exception('failed to save survey line {}'
+                                 .format(name))
+        return names
+
+    def _check_quiet(self):
+        self._timer_running = False
+        if not self._pending:
+            return
+        elapsed = (self.clock() - self._last_change) * 1000
+        if elapsed < self.quiet_period:
+            # changed since the timer started: wait out the rest
+            self._timer_running = True
+            self.do_after(int(self.quiet_period - elapsed) + 1,
+                          self._check_quiet)
+        else:
+            self.flush()
@@ -0,0 +1,211 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import itertools
+import logging
+from Queue import PriorityQueue
+import threading
+
+from traits.api import HasTraits, Any, Callable, Instance, Int
+
+from ..io import survey_io
+from ..util.memory import array_nbytes
+
+logger = logging.getLogger(__name__)
+
+# number of prefetched survey lines held waiting to be shown
+PREFETCH_CACHE_SIZE = 2
+
+# queue priorities: the line the user is waiting on goes first
+LOAD_PRIORITY = 0
+PREFETCH_PRIORITY = 1
+
+
+def _invoke_later(callable, *args):
+    from pyface.api import GUI
+    GUI.invoke_later(callable, *args)
+
+
+class LineLoader(HasTraits):
+    """ Reads survey line data on a background thread.
+
+    load reads the line the user has selected, ahead of any prefetches, and
+    hands the data to a callback on the UI thread.  Only the latest load is
+    delivered: selecting another line supersedes (cancels) the previous one.
+
+    Lines queued with prefetch are read and decoded with
+    SurveyLine.read_data and held in a small cache, so that loading them
+    later is immediate.  Cached data whose picks, attributes or mask changed
+    on disk since it was read is discarded.
+    """
+
+    #: maximum number of prefetched lines held
+    max_lines = Int(PREFETCH_CACHE_SIZE)
+
+    #: used to call load callbacks on the UI thread
+    dispatch = Callable(_invoke_later)
+
+    #: prefetched data keyed by line name:  (project_dir, mtime, data)
+    _cache = Instance(OrderedDict, ())
+
+    #: names of lines waiting in the queue to be prefetched
+    _queued = Instance(set, ())
+
+    #: name of line being read by the worker, if any
+    _loading = Any
+
+    #: the current load: (token, name, project_dir, callback) or None
+    _wanted = Any
+
+    #: increases with every load, so superseded loads can be recognised
+    _token = Any
+
+    #: (priority, seq, (token, survey_line, project_dir)) requests for the
+    #: worker, priority None to stop
+    _queue = Instance(PriorityQueue, ())
+
+    #: keeps requests of equal priority in FIFO order
+    _seq = Any
+
+    #: guards the state above
+    _lock = Any
+
+    _thread = Instance(threading.Thread)
+
+    def __init__(self, **traits):
+        super(LineLoader, self).__init__(**traits)
+        self._lock = threading.RLock()
+        self._token = itertools.count(1)
+        self._seq = itertools.count()
+
+    def load(self, survey_line, project_dir, callback):
+        ''' read survey line in the background and call callback with
+        (survey_line, data) on the UI thread.  data is None if the read
+        failed.  Supersedes any earlier load.
+        '''
+        name = survey_line.name
+        with self._lock:
+            token = next(self._token)
+            self._wanted = (token, name, project_dir, callback)
+            self._queued.discard(name)
+            entry = self._pop_fresh(name, project_dir)
+            if entry is not None:
+                self._wanted = None
+            elif self._loading != name:
+                self._put(LOAD_PRIORITY, (token, survey_line, project_dir))
+            # else the worker delivers it when it finishes reading
+        if entry is not None:
+            logger.debug('using prefetched data for {}'.format(name))
+            self.dispatch(callback, survey_line, entry[2])
+
+    def cancel(self):
+        ''' forget the current load; its data will not be delivered '''
+        with self._lock:
+            self._wanted = None
+
+    def prefetch(self, survey_lines, project_dir):
+        ''' queue unloaded lines to be read in the background '''
+        with self._lock:
+            for survey_line in survey_lines:
+                if survey_line is None or survey_line.trace_num.size > 0:
+                    continue
+                name = survey_line.name
+                if (name in self._cache or name in self._queued or
+                        name == self._loading):
+                    continue
+                self._queued.add(name)
+                self._put(PREFETCH_PRIORITY, (None, survey_line, project_dir))
+
+    def cached_nbytes(self):
+        ''' bytes of array data held by prefetched lines, keyed by name '''
+        with self._lock:
+            return dict((name, array_nbytes(entry[2].values()))
+                        for name, entry in self._cache.items())
+
+    def clear_cache(self):
+        ''' drop all prefetched data.  Returns the bytes it held '''
+        with self._lock:
+            nbytes = sum(self.cached_nbytes().values())
+            self._cache.clear()
+        return nbytes
+
+    def stop(self):
+        ''' stop the worker thread after the line it is reading '''
+        with self._lock:
+            self._queued.clear()
+            self._wanted = None
+            if self._thread is not None:
+                self._queue.put((None, None, None))
+                self._thread = None
+
+    def _mtime(self, project_dir, name):
+        return survey_io.read_survey_line_mtime_from_hdf(project_dir, name)
+
+    def _pop_fresh(self, name, project_dir):
+        ''' remove and return cache entry for name if it is still valid '''
+        entry = self._cache.pop(name, None)
+        if entry is None:
+            return None
+        entry_dir, mtime, data = entry
+        if entry_dir != project_dir or mtime != self._mtime(project_dir, name):
+            logger.debug('prefetched data for {} is stale'.format(name))
+            return None
+        return entry
+
+    def _put(self, priority, request):
+        # call with _lock held
+        self._queue.put((priority, next(self._seq), request))
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name='hydropick-line-loader')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            priority, seq, request = self._queue.get()
+            if priority is None:
+                break
+            token, survey_line, project_dir = request
+            name = survey_line.name
+            with self._lock:
+                if token is None:
+                    if name not in self._queued:
+                        # loaded or cancelled before the worker got to it
+                        continue
+                elif not (self._wanted and self._wanted[0] == token):
+                    # superseded before the worker got to it
+                    continue
+                self._queued.discard(name)
+                self._loading = name
+            entry = None
+            try:
+                mtime = self._mtime(project_dir, name)
+                data = survey_line.read_data(project_dir)
+                if self._mtime(project_dir, name) != mtime:
+                    # written to while reading (or surface from bin created)
+                    mtime = self._mtime(project_dir, name)
+                    data = survey_line.read_data(project_dir)
+                entry = (project_dir, mtime, data)
+            except Exception:
+                logger.exception('failed to read survey line {}'.format(name))
+            with self._lock:
+                self._loading = None
+                wanted = self._wanted
+                if wanted and wanted[1:3] == (name, project_dir):
+                    self._wanted = None
+                    data = entry[2] if entry is not None else None
+                    self.dispatch(wanted[3], survey_line, data)
+                elif entry is not None:
+                    # prefetched, or superseded while reading: keep it in
+                    # case the user comes back to this line
+                    self._cache[name] = entry
+                    while len(self._cache) > self.max_lines:
+                        self._cache.popitem(last=False)
@@ -0,0 +1,113 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import logging
+
+from traits.api import HasTraits, Dict, Instance, Int, Property
+
+from ..util.memory import array_nbytes, survey_line_nbytes
+
+logger = logging.getLogger(__name__)
+
+# default limit on the array data held by cached sessions (bytes)
+DEFAULT_MEMORY_BUDGET = 1024 ** 3
+
+
+def session_copies_nbytes(session):
+    ''' bytes of array data a data session holds itself, beyond the arrays
+    of its survey line (trait values and cached properties are stored in
+    its __dict__; delegated traits are not)'''
+    return array_nbytes(session.__dict__.values())
+
+
+def session_nbytes(session):
+    ''' bytes of array data held by a data session and its survey line '''
+    return (survey_line_nbytes(session.survey_line) +
+            session_copies_nbytes(session))
+
+
+class SessionCache(HasTraits):
+    """ Least recently used cache of SurveyDataSession objects keyed by
+    survey line name.
+
+    The size of each session is measured from the byte sizes of the arrays
+    its survey line holds.  When the total goes over memory_budget the least
+    recently used sessions are dropped and their survey lines unloaded.
+    """
+
+    #: maximum bytes of array data held by cached sessions
+    memory_budget = Int(DEFAULT_MEMORY_BUDGET)
+
+    #: total bytes of array data held by cached sessions
+    total_bytes = Property(Int)
+
+    #: sessions keyed by line name, least recently used first
+    _sessions = Instance(OrderedDict, ())
+
+    #: measured size of each cached session keyed by line name
+    _sizes = Dict
+
+    def __contains__(self, name):
+        return name in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, name, default=None):
+        ''' returns cached session for name and marks it most recently used'''
+        session = self._sessions.pop(name, None)
+        if session is None:
+            return default
+        self._sessions[name] = session
+        return session
+
+    def add(self, name, session):
+        ''' add or refresh a session as most recently used and remeasure it'''
+        self._sessions.pop(name, None)
+        self._sessions[name] = session
+        self._sizes[name] = session_nbytes(session)
+
+    def remove(self, name):
+        ''' drop session without unloading its line. returns the session'''
+        self._sizes.pop(name, None)
+        return self._sessions.pop(name, None)
+
+    def names(self):
+        ''' cached line names, least recently used first'''
+        return list(self._sessions.keys())
+
+    def sessions(self):
+        ''' (name, session) pairs, least recently used first.  Unlike get
+        this does not change the order.'''
+        return list(self._sessions.items())
+
+    def evict(self, keep=(), budget=None):
+        ''' evict least recently used sessions until total bytes fits the
+        budget (memory_budget by default).  Sessions named in keep are never
+        evicted.  Returns list of evicted line names.
+        '''
+        if budget is None:
+            budget = self.memory_budget
+        evicted = []
+        for name in self.names():
+            if self.total_bytes <= budget:
+                break
+            if name in keep:
+                continue
+            session = self.remove(name)
+            session.survey_line.unload_data()
+            evicted.append(name)
+        if evicted:
+            logger.info('evicted survey lines {} from session cache'
+                        .format(evicted))
+        return evicted
+
+    def _get_total_bytes(self):
+        return sum(self._sizes.values())
@@ -19,6 +19,7 @@ from traits.api import (Instance, HasTraits, Property, List,
 
 # Local imports
 from ..model.survey_line import SurveyLine
+from .autosave import AutosaveScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -130,6 +131,10 @@ class SurveyDataSession(HasTraits):
     # choices for core reference depth (any lake depth or 'final lake depth')
     core_reference_choices = Property(depends_on=['depth_lines_updated'])
 
+    # coalesces saves of edited lines; set by the pane.  Lines are saved
+    # immediately if there is none.
+    autosave = Instance(AutosaveScheduler)
+
     #==========================================================================
     # Defaults
     #==========================================================================
@@ -178,6 +183,22 @@ class SurveyDataSession(HasTraits):
     #==========================================================================
     # Helper functions
     #==========================================================================
+    def save_survey_line(self, survey_line=None):
+        ''' save survey_line (by default this session's line) to disk once
+        editing pauses'''
+        if survey_line is None:
+            survey_line = self.survey_line
+        if self.autosave is None:
+            survey_line.save_to_disk()
+        else:
+            self.autosave.schedule(survey_line)
+
+    def flush_saves(self, survey_line=None):
+        ''' write any pending save of survey_line (all lines if None) now.
+        Call before unloading a line'''
+        if self.autosave is not None:
+            self.autosave.flush(survey_line)
+
     def make_core_info_dict(self):
         ''' make dictionary to store info for each core for ready access by
         view.  index can be used to dynamically change the absolute depth
@@ -23,6 +23,8 @@ from ..model.depth_line import DepthLine
 from ..model.i_survey_line_group import ISurveyLineGroup
 from ..model.i_survey_line import ISurveyLine
 from ..model.i_algorithm import IAlgorithm
+from ..util.metrics import METRICS
+from ..util.profiling import StageProfiler
 #from .algorithm_presenter import AlgorithmPresenter
 from .depth_line_presenters import (AlgorithmPresenter, NotesEditorPresenter,
                                     ApplyToGroupSettingsPresenter,
@@ -38,6 +40,8 @@ APPLY_TOOLTIP = (
     'applies current setting to line')
 APPLY_TO_GROUP_TOOLTIP = (
     'applies current settings to all selected lines')
+COMPANION_FINAL_TOOLTIP = (
+    'also make the lines an algorithm picks for other surfaces final')
 
 MODEL_TRAITS_TO_SAVE_ON_CHANGE = (
     'name, line_type, color, locked, notes')
@@ -110,6 +114,13 @@ class DepthLineView(HasStrictTraits):
     # currently configured algorithm: used as model for alg edit dialog
     current_algorithm = Supports(IAlgorithm)
 
+    # lines for the other surfaces picked by an algorithm that picks more
+    # than one, saved along with the line being made
+    companion_lines = List(Instance(DepthLine))
+
+    # whether companion lines also become the final lines of their surfaces
+    set_companion_final = Bool(False)
+
     ##### BOOLS / FLAGS #######################################################
     # convenience condition for functions related to binary sourced line
     on_bin_line = Property(Bool, depends_on='selected_depth_line_name')
@@ -203,6 +214,10 @@ class DepthLineView(HasStrictTraits):
                      editor=ButtonEditor(label='Configure Algorithm (DONE)'),
                      visible_when=('current_algorithm'),
                      enabled_when='not locked'),
+               Item('set_companion_final', label='Other Surfaces Final',
+                    tooltip=COMPANION_FINAL_TOOLTIP,
+                    visible_when='source == "algorithm"',
+                    enabled_when='not locked'),
                ),
         # these are the buttons to control this pane
         HGroup(UItem('apply_button',
@@ -321,7 +336,7 @@ class DepthLineView(HasStrictTraits):
                         survey_line.preimpoundment_depths.pop(self.model.name)
                     else:
                         survey_line.lake_depths.pop(self.model.name)
-                    survey_line.save_to_disk()
+                    self.data_session.save_survey_line(survey_line)
                     self.update_plot()
             else:
                 logger.warning('changes not saved. data session does not' +
@@ -357,7 +372,7 @@ class DepthLineView(HasStrictTraits):
                 survey_line.preimpoundment_depths.pop(model.name)
             self.selected_depth_line_name = 'New Line'
             self.update_plot()
-            survey_line.save_to_disk()
+            self.data_session.save_survey_line(survey_line)
 
     @on_trait_change('apply_to_group')
     def apply_to_selected(self, new):
@@ -403,6 +418,10 @@ class DepthLineView(HasStrictTraits):
             overwrite_approved = view.overwrite_approved
             new_name = view.new_name
 
+            profiler = getattr(self.current_algorithm, 'profiler', None)
+            if profiler is not None:
+                profiler.reset()
+
             # apply to each survey line
             good_lines = [line for line in self.selected_survey_lines
                           if line.status != 'bad']
@@ -430,18 +449,24 @@ class DepthLineView(HasStrictTraits):
                     self.apply_to_line(model=model,
                                        survey_line=line,
                                        overwrite_name=overwrite_name,
-                                       overwrite_locked=overwrite_locked)
+                                       overwrite_locked=overwrite_locked,
+                                       overwrite_approved=overwrite_approved)
                 else:
                     # continue with remaining lines
                     self.no_problem = True
 
-                # unload the line to free memory
+                # unload the line to free memory, once it is saved
                 if line.name != self.survey_line_name:
+                    self.data_session.flush_saves(line)
                     line.unload_data()
 
                 if self.stop:
                     break
             self.stop = False
+
+            if profiler is not None and profiler.records:
+                self.log_model_params(lines=good_lines, model=self.model,
+                                      profiler=profiler)
         else:
             # there was a problem.  User should correct based on messages
             # and retry.  Reset no problem flag so user can continue.
@@ -471,7 +496,8 @@ class DepthLineView(HasStrictTraits):
     #==========================================================================
 
     def apply_to_line(self, model=None, survey_line=None,
-                      overwrite_name=False, overwrite_locked=False):
+                      overwrite_name=False, overwrite_locked=False,
+                      overwrite_approved=False):
         ''' update data with current source selection and save all settings to
         appropriate dictionary in survey line.
 
@@ -479,7 +505,9 @@ class DepthLineView(HasStrictTraits):
 
         Overwrite for just editing current model should be false
         (user should select existing depth line to edit), but can be set to
-        true for apply to group method.
+        true for apply to group method.  Lines the algorithm picks for other
+        surfaces (companion lines) are checked with the same overwrite
+        options, and on approved lines are only saved if overwrite_approved.
         '''
         # reset no_problem flag assuming user is ready to apply settings
         self.no_problem = True
@@ -528,6 +556,10 @@ class DepthLineView(HasStrictTraits):
             self.update_arrays(model=model, survey_line=survey_line)
 
         if self.no_problem:
+            self.companion_lines = self.check_companion_lines(
+                survey_line, overwrite_name=overwrite_name,
+                overwrite_locked=overwrite_locked,
+                overwrite_approved=overwrite_approved)
             self.save_model_to_surveyline(model=model, survey_line=survey_line)
         else:
             # notify user of problem again and reset no problem flag
@@ -585,14 +617,13 @@ class DepthLineView(HasStrictTraits):
             model = self.model
         logger.info('saving new depth line to surveyline {}'
                     .format(survey_line.name))
-        if model.line_type == 'current surface':
-            survey_line.lake_depths[model.name] = model
-            survey_line.final_lake_depth = model.name
-            key = 'POST_' + model.name
-        else:
-            survey_line.preimpoundment_depths[model.name] = model
-            survey_line.final_preimpoundment_depth = model.name
-            key = 'PRE_' + model.name
+        key = self._add_to_survey_line(model, survey_line)
+        # companion lines were checked by apply_to_line
+        for companion in self.companion_lines:
+            if companion.survey_line_name == survey_line.name:
+                self._add_to_survey_line(companion, survey_line,
+                                         final=self.set_companion_final)
+        self.companion_lines = []
 
         # if model being saved is model being edited, update editor panes
         if model is self.model:
@@ -600,7 +631,25 @@ class DepthLineView(HasStrictTraits):
             self.selected_depth_line_name = key
         self.update_plot()
         # update survey_line on disk
-        survey_line.save_to_disk()
+        self.data_session.save_survey_line(survey_line)
+
+    def _depth_dict_for(self, model, survey_line):
+        ''' the survey line's dict of depth lines of model's line type '''
+        if model.line_type == 'current surface':
+            return survey_line.lake_depths
+        return survey_line.preimpoundment_depths
+
+    def _add_to_survey_line(self, model, survey_line, final=True):
+        ''' add model to survey line, as its final line of its type if final.
+        returns depthline_dict key (with PRE / POST prepended)'''
+        self._depth_dict_for(model, survey_line)[model.name] = model
+        if model.line_type == 'current surface':
+            if final:
+                survey_line.final_lake_depth = model.name
+            return 'POST_' + model.name
+        if final:
+            survey_line.final_preimpoundment_depth = model.name
+        return 'PRE_' + model.name
 
     def set_current_algorithm(self, alg_name=None):
         ''' Set current alg based on model.
@@ -611,6 +660,11 @@ class DepthLineView(HasStrictTraits):
             alg_name = self.model.source_name
         model_args = self.model.args
         self.current_algorithm = self.algorithms[alg_name]()
+        if isinstance(getattr(self.current_algorithm, 'profiler', None),
+                      StageProfiler):
+            # time the algorithm's stages when debugging
+            self.current_algorithm.profiler.enabled = \
+                logger.isEnabledFor(logging.DEBUG)
         if model_args:
             self.set_alg_args(model_args)
             self.model.args = model_args
@@ -632,19 +686,48 @@ class DepthLineView(HasStrictTraits):
         logger.debug('applying algorithm : "{}" to line {}'
                      .format(alg_name, survey_line.name))
         algorithm = self.current_algorithm
+        self.companion_lines = []
+        METRICS.increment('algorithm.runs')
         try:
-            trace_array, depth_array = algorithm.process_line(survey_line)
+            with METRICS.timer('algorithm.' + type(algorithm).__name__):
+                result = algorithm.process_line(survey_line)
         except Exception as e:
             self.log_problem('Error occurred applying algoritm to line {}\n{}'
                              .format(survey_line.name, e))
         if self.no_problem:
-            model.index_array = np.asarray(trace_array, dtype=np.int32) - 1
+            trace_array, depth_arrays = result[0], result[1:]
+            index_array = np.asarray(trace_array, dtype=np.int32) - 1
+            if len(depth_arrays) == 1:
+                depth_array = depth_arrays[0]
+            else:
+                # one depth array per surface: the one matching the model
+                # fills it and the others fill companion lines
+                line_types = list(algorithm.line_types)
+                if model.line_type not in line_types:
+                    self.log_problem('algorithm {} does not pick a {}'
+                                     .format(algorithm.name, model.line_type))
+                    return
+                depth_array = depth_arrays[line_types.index(model.line_type)]
+                for line_type, companion_depths in zip(line_types,
+                                                       depth_arrays):
+                    if line_type == model.line_type:
+                        continue
+                    companion = deepcopy(model)
+                    companion.line_type = line_type
+                    companion.index_array = index_array
+                    companion.depth_array = np.asarray(companion_depths,
+                                                       dtype=np.float32)
+                    self.companion_lines.append(companion)
+            model.index_array = index_array
             model.depth_array = np.asarray(depth_array, dtype=np.float32)
 
     def make_from_depth_line(self, line_name):
         source_line = self.data_session.depth_dict[line_name]
-        self.model.index_array = np.asarray(source_line.index_array,
-                                            dtype=np.int32)
+        if source_line.index_range is not None:
+            self.model.index_range = source_line.index_range
+        else:
+            self.model.index_array = np.asarray(source_line.index_array,
+                                                dtype=np.int32)
         self.model.depth_array = source_line.depth_array
 
     def create_new_line(self):
@@ -683,7 +766,7 @@ class DepthLineView(HasStrictTraits):
         if depth_line is None:
             depth_line = self.model
         d_array_size = self._array_size(depth_line.depth_array)
-        i_array_size = self._array_size(depth_line.index_array)
+        i_array_size = depth_line.index_size
         no_depth_array = d_array_size == 0
         no_index_array = i_array_size == 0
         depth_notequal_index = d_array_size != i_array_size
@@ -730,6 +813,42 @@ class DepthLineView(HasStrictTraits):
             existing_line = None
         return existing_line
 
+    def check_companion_lines(self, survey_line, overwrite_name=False,
+                              overwrite_locked=False,
+                              overwrite_approved=False):
+        ''' returns the companion lines that may be saved to survey_line,
+        checking each as apply_to_line checks the model: its name is not
+        used unless overwrite_name, a used name's line is not locked unless
+        overwrite_locked, and the survey line is not approved unless
+        overwrite_approved.  Other companions are logged and dropped, but
+        do not set the problem flag since the model itself can be saved.
+        '''
+        if survey_line.status == 'approved' and not overwrite_approved:
+            if self.companion_lines:
+                logger.warning('survey line {} is approved: lines for other'
+                               ' surfaces were not saved'
+                               .format(survey_line.name))
+            return []
+        allowed = []
+        for companion in self.companion_lines:
+            if companion.survey_line_name != survey_line.name:
+                continue
+            existing = self.check_if_name_is_used(companion,
+                                                  survey_line=survey_line)
+            if existing is not None and not overwrite_name:
+                s = ('{} line {} already on survey line {} and overwrite not'
+                     ' allowed: not replaced')
+            elif (existing is not None and existing.locked and
+                  not overwrite_locked):
+                s = ('{} line {} on survey line {} is locked and overwrite'
+                     ' locked is not checked: not replaced')
+            else:
+                allowed.append(companion)
+                continue
+            logger.warning(s.format(companion.line_type, companion.name,
+                                    survey_line.name))
+        return allowed
+
     def check_alg_ready(self, model=None):
         """ check algorithm is selected and configured and args match model.
         If args don't match model, probably configure alg was not run, or
@@ -794,8 +913,9 @@ class DepthLineView(HasStrictTraits):
         logger.error(msg)
         self.message(msg)
 
-    def log_model_params(self, lines=None, model=None):
-        ''' log parameters of line for saving or other'''
+    def log_model_params(self, lines=None, model=None, profiler=None):
+        ''' log parameters of line for saving or other.  If given the
+        stage timings recorded by profiler are logged with them'''
 
         if lines:
             lines_str = '\n'.join([line.name for line in lines])
@@ -825,6 +945,8 @@ class DepthLineView(HasStrictTraits):
                              source=model.source,
                              sourcename=model.source_name,
                              args=model.args)
+        if profiler is not None and profiler.records:
+            s += '\nalgorithm stage timings:\n' + profiler.report()
         logger.info(s)
 
     #==========================================================================
@@ -887,7 +1009,7 @@ class DepthLineView(HasStrictTraits):
         return lines
 
     def _get_index_array_size(self):
-        return self._array_size(self.model.index_array)
+        return self.model.index_size
 
     def _get_depth_array_size(self):
         return self._array_size(self.model.depth_array)
@@ -11,14 +11,16 @@ import logging
 import numpy as np
 
 # ETS imports
-from traits.api import (Instance, Dict, List, on_trait_change)
+from traits.api import (Instance, Dict, List, Supports, on_trait_change)
 from traitsui.api import ModelView, View, VGroup
 
 from chaco.api import (ArrayPlotData)
+from apptools.undo.i_undo_manager import IUndoManager
 
 # Local imports
 from .survey_data_session import SurveyDataSession
 from .survey_tools import TraceTool, LocationTool, DepthTool
+from ..util.commands import ArraySliceCommand
 from .survey_views import (ControlView, InstanceUItem, PlotContainer, DataView,
                            ImageAdjustView, MsgView, LineSettingsView,
                            HPlotSelectionView, ColormapEditView)
@@ -57,6 +59,10 @@ class SurveyLineView(ModelView):
     # dict to remember image control (b&c) settings for each freq
     image_settings = Dict
 
+    # undo manager that line and mask edits are pushed to. If None edits
+    # can not be undone
+    undo_manager = Supports(IUndoManager)
+
     ############## View classes used by editor ########################
 
     # Defines view for all the plot controls and info. Sits by plot container.
@@ -174,6 +180,8 @@ class SurveyLineView(ModelView):
                 tool.toggle_character = EDIT_MASK_TOGGLE_STATE_CHAR
                 tool.on_trait_change(self.toggle_mask_edit,
                                      'toggle_mask_edit_mode')
+                tool.on_trait_change(self.write_stroke_to_target,
+                                     'stroke_finished')
                 main.tools.append(tool)
                 tools[key] = tool
         return tools
@@ -267,7 +275,7 @@ class SurveyLineView(ModelView):
 
             # add the depth line data
             for line_key, depth_line in self.model.depth_dict.items():
-                x = self.model.distance_array[depth_line.index_array]
+                x = depth_line.distance_array(self.model.distance_array)
                 y = depth_line.depth_array
                 key_x, key_y = line_key + '_x', line_key + '_y'
                 kw = {key_x: x, key_y: y}
@@ -287,13 +295,63 @@ class SurveyLineView(ModelView):
     def save_survey_line(self, obj, name, old, new):
         logger.info('survey_line {} attribute "{}" changed: saving'
                     .format(self.model.survey_line.name, name))
-        self.model.survey_line.save_to_disk()
+        self.model.save_survey_line()
 
     # @on_trait_change('model.anytrait')
     # def logchange(self, obj, name, old, new):
     #     logger.debug('DATASESSION trait changed: {}'
     #                  .format((name, old, new)))
 
+    def write_stroke_to_target(self, tool, name, old, stroke_range):
+        ''' Called by a trace tool when the mouse is released after editing.
+        The plot data was edited in place during the stroke; write the edited
+        range back to the target depth line (or mask) as an undoable command
+        holding only that range.
+        '''
+        if tool.target_line is None or tool.key == 'None':
+            return
+        start, stop = stroke_range
+        edited_data = tool.target_line.value.get_data()[start:stop]
+        if tool.key == 'mask':
+            if not self.model.survey_line.masked:
+                self.model.initialize_mask_xy()
+            target = self.model.survey_line
+            attribute = 'mask'
+            value = edited_data != 0
+        else:
+            target = self.model.depth_dict.get(tool.key, None)
+            if target is None:
+                return
+            target.edited = True
+            attribute = 'depth_array'
+            value = edited_data.copy()
+        command = ArraySliceCommand(data=target, attribute=attribute,
+                                    start=start, stop=stop, value=value,
+                                    mergeable=True,
+                                    changed=self.array_edit_undone,
+                                    name='Edit {}'.format(tool.key))
+        if self.undo_manager is None:
+            command.do()
+        else:
+            self.undo_manager.active_stack.push(command)
+        logger.debug('wrote edits {} to {}'.format(stroke_range, tool.key))
+
+    def array_edit_undone(self, command):
+        ''' redraw and save a depth line or mask after an edit to it is
+        undone or redone'''
+        if command.attribute == 'mask':
+            x, y = self.model.get_mask_xy()
+            self.plotdata.update_data(mask_x=x, mask_y=y)
+        else:
+            # plot keys are depth_dict keys, which are prefixed by surface
+            depth_line = command.data
+            line_key = next((k for k, v in self.model.depth_dict.items()
+                             if v is depth_line), None)
+            key_y = '{}_y'.format(line_key)
+            if line_key is not None and key_y in self.plotdata.arrays:
+                self.plotdata.update_data({key_y: depth_line.depth_array})
+        self.model.save_survey_line()
+
     def toggle_mask_edit(self, obj, name, old, new):
         ''' if key toggle event fires from a tool, toggle the control view
         which should set tools accordingly'''
@@ -622,6 +680,12 @@ class SurveyLineView(ModelView):
             tool = self.trace_tools[key]
             edited.append(tool.data_changed)
             tool.target_line = new_target_plot
+            if new_target != 'None':
+                tool.linked_lines = [plot_dict[k + '_' + new_target]
+                                     for k in self.model.freq_choices
+                                     if k != key]
+            else:
+                tool.linked_lines = []
             tool.key = new_target
             tool.edit_allowed = not locked    ###
 
@@ -637,7 +701,7 @@ class SurveyLineView(ModelView):
                     # never edited so set to edited if and tool has edited it.
                     old_target_depth_line.edited = any(edited)
             # update survey_line on disk
-            self.model.survey_line.save_to_disk()
+            self.model.save_survey_line()
 
         self.plot_container.vplot_container.invalidate_and_redraw()
 
@@ -12,6 +12,10 @@ from enable.api import BaseTool, KeySpec
 from traits.api import (Float, Enum, CInt, Bool, Instance, Str, List, Set,
                         Property, Event, Any, Tuple)
 from chaco.api import PlotComponent
+from pyface.timer.api import do_after
+
+# minimum time between redraws of a line while it is being edited (ms).
+EDIT_REDRAW_INTERVAL = 33
 
 #==============================================================================
 # Custom Tools
@@ -89,6 +93,12 @@ class TraceTool(BaseTool):
     position.  Move events will then replace values at the mouse's index
     position, filling in any missing points with lines, until the button is
     released.
+
+    Edits are written in place into the plot data array and the edited
+    index range is marked dirty; the plots showing the line are redrawn at
+    most once per EDIT_REDRAW_INTERVAL.  When the button is released
+    stroke_finished fires with the (start, stop) index range of the stroke
+    so the owner can write the data back to the model once.
     """
 
     event_state = Enum('normal', 'edit')
@@ -119,6 +129,10 @@ class TraceTool(BaseTool):
     # line being edited
     target_line = Instance(PlotComponent)
 
+    # plots of the same line on the other freq plots.  They share the data
+    # array of target_line so only need to be told to redraw.
+    linked_lines = List(Instance(PlotComponent))
+
     # ArrayPlotData object holding all data.  This tool will change this data
     # which then updates all three freq plots at once.
     data = Property()
@@ -132,6 +146,9 @@ class TraceTool(BaseTool):
 
     toggle_mask_edit_mode = Event
 
+    # fired at mouse up with the (start, stop) index range that was edited
+    stroke_finished = Event
+
     window = Any
 
     # ybounds for this tool limits the data values to set
@@ -140,6 +157,15 @@ class TraceTool(BaseTool):
     ##### private trait  ####
     _mask_value = Float(0)
 
+    # [start, stop) index range edited since the last redraw, or None
+    _dirty_range = Any
+
+    # [start, stop) index range edited since the mouse went down, or None
+    _stroke_range = Any
+
+    # one-shot timer for the next redraw. None when nothing is scheduled
+    _redraw_timer = Any
+
     def _target_line_changed(self):
         self.data_changed = False
 
@@ -174,12 +200,14 @@ class TraceTool(BaseTool):
         if self.drag_button == "right":
             self.event_state = 'normal'
             self.mouse_down = False
+            self.finish_stroke()
 
     def edit_left_up(self, event):
         ''' finish editing'''
         if self.drag_button == "left":
             self.event_state = 'normal'
             self.mouse_down = False
+            self.finish_stroke()
 
     def edit_key_pressed(self, event):
         ''' this event fires the toggle event so that an outside listener
@@ -230,6 +258,39 @@ class TraceTool(BaseTool):
             ys = [newy]
         return np.array(indices), np.array(ys)
 
+    def mark_dirty(self, start, stop):
+        ''' record that [start, stop) of the target data changed and make sure
+        a redraw is scheduled'''
+        for name in ('_dirty_range', '_stroke_range'):
+            current = getattr(self, name)
+            if current is None:
+                setattr(self, name, [start, stop])
+            else:
+                current[0] = min(current[0], start)
+                current[1] = max(current[1], stop)
+        if self._redraw_timer is None:
+            self._redraw_timer = do_after(EDIT_REDRAW_INTERVAL,
+                                          self.flush_edits)
+
+    def flush_edits(self):
+        ''' redraw the edited line on every plot sharing its data.  The data
+        array was changed in place, so just tell the data sources'''
+        self._redraw_timer = None
+        if self._dirty_range is None or self.target_line is None:
+            return
+        self._dirty_range = None
+        for line in [self.target_line] + self.linked_lines:
+            line.value.data_changed = True
+
+    def finish_stroke(self):
+        ''' called at mouse up: draw any pending edits and report the edited
+        range so the data can be written back to the model once'''
+        self.flush_edits()
+        stroke_range = self._stroke_range
+        self._stroke_range = None
+        if stroke_range is not None:
+            self.stroke_finished = tuple(stroke_range)
+
     def normal_mouse_move(self, event):
         newx, newy = self.component.map_data((event.x, event.y))
         self.depth = newy
@@ -261,9 +322,9 @@ class TraceTool(BaseTool):
                     indices, ys = self.fill_in_missing_pts(current_index,
                                                            clipped_y, ydata)
                 try:
+                    # write in place; plots are redrawn by flush_edits
                     ydata[indices] = ys
-                    data_key = self.key + '_y'
-                    self.data.set_data(data_key, ydata)
+                    self.mark_dirty(indices.min(), indices.max() + 1)
                     self.data_changed = True
                     if self.last_index < indices[-1]:
                         # moved right
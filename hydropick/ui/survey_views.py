@@ -18,7 +18,7 @@ import numpy as np
 from enable.api import ComponentEditor
 from traits.api import (Instance, Str, List, HasTraits, Float, Property,
                         Enum, Bool, Dict, on_trait_change, Trait,
-                        Callable, Tuple, CFloat, Event)
+                        Callable, Tuple, CFloat, Event, Any, Array)
 from traitsui.api import (View, Item, EnumEditor, UItem, InstanceEditor,
                           TextEditor, RangeEditor, Label, HGroup, VGroup,
                           CheckListEditor, Group, ButtonEditor)
@@ -28,6 +28,7 @@ from chaco.api import (Plot, ArrayPlotData, VPlotContainer, HPlotContainer,
                        create_line_plot)
 from chaco.tools.api import (PanTool, ZoomTool, RangeSelection, LineInspector,
                              RangeSelectionOverlay, LegendHighlighter)
+from pyface.timer.api import do_after
 
 # Local imports
 from .survey_tools import InspectorFreezeTool
@@ -55,6 +56,10 @@ MAIN_PADDING_LEFT = 25
 CONTRAST_MAX = float(20)
 
 CORE_VISIBILITY_CRITERIA = 200.0
+
+# minimum time between slice plot updates (ms). Line inspector events arriving
+# faster than this are coalesced so only the latest cursor position is drawn.
+SLICE_UPDATE_INTERVAL = 33
 CORE_LINE_WIDTH = 2
 
 MASK_EDGE_COLOR = 'black'
@@ -139,6 +144,22 @@ class PlotContainer(HasTraits):
     zoom_tools = Dict
 
     legend_drag = Event
+
+    # latest line inspector metadata waiting to be applied to the slice plots
+    _pending_slice_meta = Any
+
+    # one-shot timer for the next slice update. None when nothing is scheduled
+    _slice_timer = Any
+
+    # image column currently shown in each slice plot, keyed by freq
+    _slice_index_dict = Dict
+
+    # core positions along the line (distance), sorted, with matching ids
+    _core_positions = Array
+    _core_ids = List
+
+    # id of core whose layer plots are currently visible in the slice plots
+    _visible_core_id = Any
     #==========================================================================
     # Define Views
     #==========================================================================
@@ -211,6 +232,9 @@ class PlotContainer(HasTraits):
         # add tool to freeze line inspector cursor when in desired position
         vpc.tools.append(self.inspector_freeze_tool)
 
+        self._slice_index_dict = {}
+        self.update_core_positions()
+
         self.vplot_container = vpc
         self.set_hplot_visibility(all=True)
         self.set_intensity_profile_visibility()
@@ -549,7 +573,7 @@ class PlotContainer(HasTraits):
 
         # add data to ArrayPlotData if not there
         if line_key not in self.data.arrays.keys():
-            x = self.model.distance_array[depth_line.index_array]
+            x = depth_line.distance_array(self.model.distance_array)
             y_raw = depth_line.depth_array
             # limit range of plot to ybounds of image/model
             ybounds = self.model.ybounds[key]
@@ -636,27 +660,47 @@ class PlotContainer(HasTraits):
         ''' handler for line inspector tool.
         provides changed "index" trait of intensity image whose meta data
         was changed by the line inspector.  The line inspector sets the
-        "x_slice" key in the meta data.  We then retrieve this and use it
-        to update the metadata for the intensity plots for all freqs'''
+        "x_slice" key in the meta data.  Mouse moves fire this much faster
+        than we can redraw, so only the latest value is kept and the slice
+        plots are updated by flush_slice_updates at most once per
+        SLICE_UPDATE_INTERVAL'''
         selected_meta = obj.metadata
-        slice_meta = selected_meta.get("x_slice", None)
+        self._pending_slice_meta = selected_meta.get("x_slice", None)
+        if self._slice_timer is None:
+            self._slice_timer = do_after(SLICE_UPDATE_INTERVAL,
+                                         self.flush_slice_updates)
+
+    def flush_slice_updates(self):
+        ''' apply the latest line inspector metadata to the intensity plots
+        for all freqs, then update core visibility once for the new cursor
+        position'''
+        self._slice_timer = None
+        slice_meta = self._pending_slice_meta
+        x_pos = None
         for key, hplot in self.hplot_dict.items():
             if key != 'mini':
-                self.update_hplot_slice(key, hplot, slice_meta)
+                pos = self.update_hplot_slice(key, hplot, slice_meta)
+                if pos is not None:
+                    x_pos = pos
+        if x_pos is not None:
+            self.update_core_visibility(x_pos)
 
     def update_hplot_slice(self, key, hplot, slice_meta):
         ''' when meta data changes call this with relevant hplots to update
-        slice from cursor position'''
+        slice from cursor position.  Returns the distance along the line of
+        the cursor if the slice column changed, otherwise None.'''
 
         slice_key = key + '_slice'
         img = hplot.components[0].plots[key][0]
 
-        # get slice plot and sinc the value to the img plot
+        # get slice plot and sync the value to the img plot if it changed
         slice = hplot.components[1]
         low, high = img.value_range.low, img.value_range.high
-        slice.value_range.low_setting = low
-        slice.value_range.high_setting = high
-        self.data.set_data('slice_depth_y', np.array([low, high]))
+        if (slice.value_range.low_setting != low or
+                slice.value_range.high_setting != high):
+            slice.value_range.low_setting = low
+            slice.value_range.high_setting = high
+            self.data.set_data('slice_depth_y', np.array([low, high]))
 
         if slice_meta:    # set metadata and data
 
@@ -667,6 +711,11 @@ class PlotContainer(HasTraits):
                 this_meta.update({"x_slice": slice_meta})
 
             x_index, y_index = slice_meta
+            if self._slice_index_dict.get(key, None) == x_index:
+                # cursor only moved vertically so slice is already current
+                return None
+            self._slice_index_dict[key] = x_index
+
             try:
                 if x_index:
                     # now updata data array which will updata slice plot
@@ -694,27 +743,57 @@ class PlotContainer(HasTraits):
                 x_ind_clipped = np.clip(x_index, 0, x_ind_max)
                 abs_index = indices[x_ind_clipped]
                 x_pos = self.model.distance_array[abs_index]
-
-            # check if cursor is 'near' core, and set visibility in sliceplot
-            for core in self.model.core_samples:
-                # show core if cursor within range of core location
-                loc_index, loc, dist = self.model.core_info_dict[core.core_id]
-                core_plot_list = self.core_plots_dict[core.core_id]
-                for core_plot in core_plot_list:
-                    try:
-                        if np.abs(x_pos - loc) < CORE_VISIBILITY_CRITERIA:
-                            core_plot.visible = True
-                            self.model.current_core = [core.core_id, dist]
-                        else:
-                            core_plot.visible = False
-                            self.model.current_core = [-1, -1]
-                    except ValueError:
-                        debug = 'core dist check xpos,loc,abs(x-l)\n={},{},{}'
-                        absdiff = np.abs(x_pos - loc)
-                        logger.debug(debug.format(x_pos[:3], loc, absdiff[:3]))
+            return x_pos
 
         else:   # clear all slice plots
+            self._slice_index_dict.pop(key, None)
             self.data.update_data({slice_key: np.array([])})
+            return None
+
+    def update_core_positions(self):
+        ''' cache the core positions along the line, sorted, so the cursor
+        can be matched to the nearest core with a binary search'''
+        ids = [core.core_id for core in self.model.core_samples
+               if core.core_id in self.model.core_info_dict]
+        positions = np.array([self.model.core_info_dict[core_id][1]
+                              for core_id in ids], dtype=float)
+        order = np.argsort(positions)
+        self._core_positions = positions[order]
+        self._core_ids = [ids[i] for i in order]
+        # force the next cursor update to reset visibility of all cores
+        self._visible_core_id = -1
+
+    def update_core_visibility(self, x_pos):
+        ''' show the core layers in the slice plots for the core nearest to
+        x_pos if it is within CORE_VISIBILITY_CRITERIA. Plots are only
+        toggled when the nearest core changes.'''
+        positions = self._core_positions
+        visible_id = None
+        distance = -1
+        if positions.size > 0:
+            try:
+                x_pos = float(x_pos)
+            except (TypeError, ValueError):
+                logger.debug('core dist check: bad cursor position {}'
+                             .format(x_pos))
+                return
+            i = np.searchsorted(positions, x_pos)
+            nearest = [j for j in (i - 1, i) if 0 <= j < positions.size]
+            j = min(nearest, key=lambda j: abs(positions[j] - x_pos))
+            if abs(positions[j] - x_pos) < CORE_VISIBILITY_CRITERIA:
+                visible_id = self._core_ids[j]
+                distance = self.model.core_info_dict[visible_id][2]
+
+        if visible_id == self._visible_core_id:
+            return
+        for core_id, core_plot_list in self.core_plots_dict.items():
+            for core_plot in core_plot_list:
+                core_plot.visible = (core_id == visible_id)
+        self._visible_core_id = visible_id
+        if visible_id is None:
+            self.model.current_core = [-1, -1]
+        else:
+            self.model.current_core = [visible_id, distance]
 
     def update_core_plots(self):
         for core in self.model.core_samples:
@@ -731,6 +810,8 @@ class PlotContainer(HasTraits):
                         slice.components.remove(old_plot)
                 if key != 'mini':
                     self.plot_core_depths(slice, core, ref_depth_line=None)
+        # new layer plots need visibility set on next cursor update
+        self._visible_core_id = -1
 
     def plot_core(self, main, core, ref_depth_line=None):
         ''' plot core info on main plot'''
@@ -0,0 +1,184 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+from __future__ import absolute_import
+
+from collections import Counter
+import logging
+from Queue import Queue
+import threading
+
+from traits.api import HasTraits, Any, Callable, Instance, Int, Property, Str
+
+from ..io import survey_io
+
+logger = logging.getLogger(__name__)
+
+
+def _invoke_later(callable, *args):
+    from pyface.api import GUI
+    GUI.invoke_later(callable, *args)
+
+
+class SurveyWriter(HasTraits):
+    """ Writes survey line changes to disk on a background thread.
+
+    save takes a snapshot of what changed in a survey line (on the UI
+    thread, so it is consistent) and queues it; a single writer thread
+    writes snapshots in the order they were queued and syncs the files to
+    disk before counting a snapshot as written.  flush waits for queued
+    writes, and must be called before reading a line back from disk and
+    before the application exits.
+
+    When a write fails the changes in its snapshot are marked unsaved again
+    on the UI thread, so the next save of the line retries them; until then
+    the line counts as failed and flush returns False for it.
+    """
+
+    #: number of snapshots queued or being written, updated on the UI thread
+    pending = Int
+
+    #: number of lines with changes that failed to write and have not been
+    #: queued again, updated on the UI thread
+    failed = Int
+
+    #: description of pending and failed writes for the UI, empty if there
+    #: are none
+    status = Property(Str, depends_on='pending, failed')
+
+    #: used to update pending on the UI thread
+    dispatch = Callable(_invoke_later)
+
+    #: (project_dir, snapshot) to write, None to stop
+    _queue = Instance(Queue, ())
+
+    #: number of queued snapshots by line name
+    _pending_names = Instance(Counter, ())
+
+    #: lines whose writes failed, by name: True once the failed changes
+    #: have been marked unsaved again, so that the next save retries them
+    _failed_names = Instance(dict, ())
+
+    #: guards _pending_names and _failed_names; notified when a snapshot
+    #: has been written (or failed)
+    _written = Any
+
+    _thread = Instance(threading.Thread)
+
+    def __init__(self, **traits):
+        super(SurveyWriter, self).__init__(**traits)
+        self._written = threading.Condition(threading.RLock())
+
+    def save(self, survey_line, project_dir=None):
+        ''' queue the changes to survey_line to be written.  Returns False
+        if there was nothing to write.'''
+        if project_dir is None:
+            project_dir = survey_line.project_dir
+        snapshot = survey_io.survey_line_snapshot(survey_line)
+        if survey_io.snapshot_is_empty(snapshot):
+            return False
+        with self._written:
+            if self._failed_names.get(survey_line.name):
+                # the snapshot includes the changes that failed
+                del self._failed_names[survey_line.name]
+            self._pending_names[survey_line.name] += 1
+            self._queue.put((project_dir, snapshot, survey_line))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run,
+                                                name='hydropick-writer')
+                self._thread.daemon = True
+                self._thread.start()
+        self._update_pending()
+        return True
+
+    def has_pending(self, name=None):
+        ''' whether writes for line name (any line if None) are queued '''
+        with self._written:
+            if name is None:
+                return sum(self._pending_names.values()) > 0
+            return self._pending_names[name] > 0
+
+    def has_failed(self, name=None):
+        ''' whether writes for line name (any line if None) failed and have
+        not been queued again '''
+        with self._written:
+            if name is None:
+                return bool(self._failed_names)
+            return name in self._failed_names
+
+    def flush(self, name=None, timeout=None):
+        ''' wait until queued writes for line name (all lines if None) are
+        on disk.  Returns False if timeout (seconds) ran out first or if
+        any of the writes failed.'''
+        with self._written:
+            while self.has_pending(name):
+                if not self._thread or not self._thread.is_alive():
+                    logger.error('survey writer is not running; {} changes'
+                                 ' not written'.format(self.pending))
+                    return False
+                self._written.wait(timeout)
+                if timeout is not None and self.has_pending(name):
+                    return False
+            return not self.has_failed(name)
+
+    def stop(self):
+        ''' write everything queued then stop the writer thread '''
+        self.flush()
+        with self._written:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def _run(self):
+        while True:
+            request = self._queue.get()
+            if request is None:
+                break
+            project_dir, snapshot, survey_line = request
+            name = snapshot['name']
+            failed = False
+            try:
+                survey_io.write_survey_line_snapshot(project_dir, snapshot,
+                                                     sync=True)
+            except Exception:
+                logger.exception('failed to save survey line {}'.format(name))
+                failed = True
+            with self._written:
+                self._pending_names[name] -= 1
+                if self._pending_names[name] <= 0:
+                    del self._pending_names[name]
+                if failed:
+                    self._failed_names[name] = False
+                    self.dispatch(self._write_failed, survey_line, snapshot)
+                # dispatch before waking flushes, so that a synchronous
+                # dispatch updates the UI state before they return
+                self.dispatch(self._update_pending)
+                self._written.notify_all()
+
+    def _write_failed(self, survey_line, snapshot):
+        ''' mark the changes of a snapshot that failed to write as unsaved,
+        on the UI thread '''
+        survey_io.mark_snapshot_unwritten(survey_line, snapshot)
+        with self._written:
+            if survey_line.name in self._failed_names:
+                self._failed_names[survey_line.name] = True
+
+    def _update_pending(self):
+        with self._written:
+            self.pending = sum(self._pending_names.values())
+            self.failed = len(self._failed_names)
+
+    def _get_status(self):
+        messages = []
+        if self.pending:
+            messages.append('Saving changes to disk ({} pending)...'
+                            .format(self.pending))
+        if self.failed:
+            messages.append('Failed to save changes to {} survey line(s);'
+                            ' see the log'.format(self.failed))
+        return ' '.join(messages)
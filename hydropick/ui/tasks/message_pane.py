@@ -21,7 +21,17 @@ class MessagePane(TraitsDockPane):
     #: stores all messages for this session
     msg_string = DelegatesTo('task')
 
-    traits_view = View(UItem('msg_string',
+    #: progress of loading the current survey line
+    load_status = DelegatesTo('task')
+
+    #: survey line changes waiting to be written to disk
+    save_status = DelegatesTo('task')
+
+    traits_view = View(UItem('load_status', style='readonly',
+                             visible_when='load_status'),
+                       UItem('save_status', style='readonly',
+                             visible_when='save_status'),
+                       UItem('msg_string',
                              editor=TextEditor(read_only=True),
                              style='custom')
                        )
@@ -0,0 +1,64 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+from __future__ import absolute_import
+
+import logging
+
+from traits.api import Button, DelegatesTo, Str
+from traitsui.api import View, HGroup, UItem, TextEditor, Spring
+from pyface.tasks.api import TraitsDockPane
+
+from ...util.metrics import METRICS, METRICS_FILENAME
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsPane(TraitsDockPane):
+    """ The dock pane showing the application's timing metrics """
+
+    id = 'hydropick.metrics'
+    name = "Metrics"
+
+    #: the metrics as text, as of the last refresh
+    metrics_text = Str
+
+    #: measures the memory.* gauges on refresh
+    memory = DelegatesTo('task')
+
+    refresh = Button('Refresh')
+
+    save = Button('Save...')
+
+    reset = Button('Reset')
+
+    traits_view = View(HGroup(UItem('refresh'), UItem('save'), UItem('reset'),
+                              Spring()),
+                       UItem('metrics_text',
+                             editor=TextEditor(read_only=True),
+                             style='custom')
+                       )
+
+    def _metrics_text_default(self):
+        return METRICS.format_table()
+
+    def _refresh_fired(self):
+        self.memory.measure()
+        self.metrics_text = METRICS.format_table()
+
+    def _save_fired(self):
+        ''' dump the metrics to a JSON file chosen by the user '''
+        from pyface.api import FileDialog, OK
+        dialog = FileDialog(action='save as', default_filename=METRICS_FILENAME,
+                            wildcard='JSON files (*.json)|*.json')
+        if dialog.open() == OK:
+            METRICS.dump(dialog.path)
+            logger.info('saved metrics to {}'.format(dialog.path))
+
+    def _reset_fired(self):
+        METRICS.reset()
+        self.metrics_text = METRICS.format_table()
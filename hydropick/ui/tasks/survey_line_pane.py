@@ -8,7 +8,7 @@
 from __future__ import absolute_import
 
 import logging
-from traits.api import (DelegatesTo, Instance, Property, Bool, Dict, List, Str,
+from traits.api import (DelegatesTo, Instance, Property, Bool, List,
                         Supports, on_trait_change)
 from traitsui.api import View, Item
 from pyface.tasks.api import TraitsTaskPane
@@ -16,12 +16,19 @@ from pyface.tasks.api import TraitsTaskPane
 from ...model.i_survey_line import ISurveyLine
 from ..survey_data_session import SurveyDataSession
 from ..survey_line_view import SurveyLineView
+from ..session_cache import SessionCache, session_copies_nbytes
+from ..line_loader import LineLoader
+from ...util.memory import array_nbytes
+from ...util.metrics import METRICS
 from hydropick.model.i_core_sample import ICoreSample
 
 logger = logging.getLogger(__name__)
 
 CORE_DISTANCE_TOLERANCE = 200
 
+# bytes of survey line array data kept loaded for quick line changes
+SESSION_CACHE_MEMORY_BUDGET = 1024 ** 3
+
 class SurveyLinePane(TraitsTaskPane):
     """ The dock pane holding the map view of the survey """
 
@@ -52,8 +59,14 @@ class SurveyLinePane(TraitsTaskPane):
     survey_line_view = Instance(SurveyLineView)
 
     # once a valid survey line is selected a datasession will
-    # created and stored for quick retrieval on line changes
-    data_session_dict = Dict(Str, Instance(SurveyDataSession))
+    # created and stored for quick retrieval on line changes.  Least
+    # recently used sessions are evicted (and their lines unloaded) when
+    # the cache goes over its memory budget.
+    session_cache = Instance(SessionCache)
+
+    # reads the next and previous lines in the background so stepping
+    # through lines does not wait on disk
+    line_loader = Instance(LineLoader, ())
 
     #: dictionary of (name, class) pairs for available depth pic algorithms
     algorithms = DelegatesTo('task')
@@ -61,6 +74,67 @@ class SurveyLinePane(TraitsTaskPane):
     # set when survey_line is none to prevent showing invalid view.
     show_view = Bool(False)
 
+    # progress of loading the selected line; shown in place of the view
+    # and in the message pane while the line loads
+    load_status = DelegatesTo('task')
+
+    # saves edited lines once editing pauses
+    autosave = DelegatesTo('task')
+
+    # writes saved changes to disk in the background
+    writer = DelegatesTo('task')
+
+    # accounts for the memory held by loaded lines
+    memory = DelegatesTo('task')
+
+    def _session_cache_default(self):
+        return SessionCache(memory_budget=SESSION_CACHE_MEMORY_BUDGET)
+
+    def destroy(self):
+        self.line_loader.stop()
+        self.autosave.flush()
+        self.writer.flush()
+        super(SurveyLinePane, self).destroy()
+
+    def memory_sources(self):
+        ''' (subsystem, source) pairs measuring the memory this pane holds,
+        for the memory accountant '''
+        return [('session_copies', self._session_copies_nbytes),
+                ('plot_data', self._plot_data_nbytes),
+                ('caches', self.line_loader.cached_nbytes)]
+
+    def reclaim_memory(self, keep=()):
+        ''' if another line would not fit the memory budget, drop the
+        prefetched lines and then evict least recently used sessions
+        (except those named in keep) until it would.  Returns the bytes
+        still over budget.'''
+        memory = self.memory
+        memory.measure()
+        excess = memory.excess(memory.line_estimate())
+        if excess > 0:
+            logger.info('{:.0f} MB over the memory budget; freeing memory'
+                        .format(excess / 1024.0 ** 2))
+            excess -= self.line_loader.clear_cache()
+        if excess > 0:
+            cache = self.session_cache
+            cache.evict(keep=keep, budget=max(cache.total_bytes - excess, 0))
+        if memory.measure() > memory.memory_budget:
+            logger.warning('survey lines held in memory are over the memory'
+                           ' budget even after evicting cached lines')
+        return memory.excess(memory.line_estimate())
+
+    def prefetch_neighbours(self):
+        ''' start reading the lines on either side of the current line '''
+        if self.memory.excess(2 * self.memory.line_estimate()) > 0:
+            # no room for them
+            return
+        lines = [self.task._get_next_survey_line(),
+                 self.task._get_previous_survey_line()]
+        # a line still being written would be read stale
+        lines = [line for line in lines
+                 if line is None or not self.writer.has_pending(line.name)]
+        self.line_loader.prefetch(lines, self.survey.project_dir)
+
     def on_zoom_extent(self):
         self.survey_line_view.zoom_extent()
 
@@ -105,38 +179,97 @@ class SurveyLinePane(TraitsTaskPane):
 
     def _survey_line_changed(self, old=None, new=None):
         ''' handle loading of survey line view if valid line provide or else
-        provide an empty view.
+        provide an empty view.  Lines whose data is not loaded are read on
+        the loader's worker thread while a placeholder is shown.
         '''
+        # write pending changes before lines can be unloaded or evicted
+        self.autosave.flush()
         if self.survey_line is None:
             logger.warning('current survey line is None')
+            self.line_loader.cancel()
+            self.load_status = ''
             self.show_view = False
             self.survey_line_view = None
+        elif self.survey_line.trace_num.size == 0:
+            # not loaded yet, or unloaded since it was last viewed
+            self.show_view = False
+            self.survey_line_view = None
+            self.load_status = 'Loading survey line {}: reading data...'\
+                               .format(self.line_name)
+            # make room for the line before reading it
+            self.reclaim_memory(keep=[self.line_name])
+            # read only once changes to the line are on disk
+            self.writer.flush(self.line_name)
+            self.line_loader.load(self.survey_line, self.survey.project_dir,
+                                  self._line_data_loaded)
         else:
-            self.survey_line.load_data(self.survey.project_dir)
-            data_session = self.data_session_dict.get(self.line_name, None)
-            if data_session is None:
-                # create new datasession object and entry for this surveyline.
-                data_session = SurveyDataSession(survey_line=self.survey_line,
-                                                 algorithms=self.algorithms)
-                self.data_session_dict[self.line_name] = data_session
-
-            # load relevant core samples into survey line
-            # must do this before creating survey line view
-            all_samples = self.survey.core_samples
-            d = CORE_DISTANCE_TOLERANCE
-            near_samples = self.survey_line.nearby_core_samples(all_samples, d)
-            self.survey_line.core_samples = near_samples
-            data_session.make_core_info_dict()
-            self.current_data_session = data_session
-
-            # create survey line view
-            logger.debug('updating survey line view with changed survey line')
-            self.survey_line_view = SurveyLineView(model=data_session)
-            self.show_view = True
-        if old is not None:
+            self.line_loader.cancel()
+            self.show_survey_line()
+        if old is not None and old.name not in self.session_cache:
             old.unload_data()
 
+    def _line_data_loaded(self, survey_line, data):
+        ''' called on the UI thread by the line loader when data is read '''
+        if survey_line is not self.survey_line:
+            # user moved on while this line was loading
+            return
+        if data is None:
+            self.load_status = 'Could not load survey line {}'\
+                               .format(self.line_name)
+            return
+        self.load_status = 'Loading survey line {}: building view...'\
+                           .format(self.line_name)
+        survey_line.load_data(self.survey.project_dir, data=data)
+        self.show_survey_line()
+
+    @METRICS.timed('ui.show_survey_line')
+    def show_survey_line(self):
+        ''' create the view for the current (loaded) survey line '''
+        data_session = self.session_cache.get(self.line_name)
+        if data_session is None:
+            # create new datasession object and entry for this surveyline.
+            with METRICS.timer('ui.create_data_session'):
+                data_session = SurveyDataSession(
+                    survey_line=self.survey_line, algorithms=self.algorithms,
+                    autosave=self.autosave)
+        else:
+            METRICS.increment('ui.data_session_cache_hits')
+
+        # load relevant core samples into survey line
+        # must do this before creating survey line view
+        all_samples = self.survey.core_samples
+        d = CORE_DISTANCE_TOLERANCE
+        near_samples = self.survey_line.nearby_core_samples(all_samples, d)
+        self.survey_line.core_samples = near_samples
+        data_session.make_core_info_dict()
+        self.current_data_session = data_session
+
+        # create survey line view
+        logger.debug('updating survey line view with changed survey line')
+        with METRICS.timer('ui.create_survey_line_view'):
+            self.survey_line_view = SurveyLineView(
+                model=data_session, undo_manager=self.task.undo_manager)
+        self.show_view = True
+        self.load_status = ''
+
+        # keep session (and line data) hot; evict old ones if over budget
+        self.session_cache.add(self.line_name, data_session)
+        self.session_cache.evict(keep=[self.line_name])
+        self.prefetch_neighbours()
+
+    def _session_copies_nbytes(self):
+        return dict((name, session_copies_nbytes(session))
+                    for name, session in self.session_cache.sessions())
+
+    def _plot_data_nbytes(self):
+        view = self.survey_line_view
+        if view is None or view.plotdata is None:
+            return {}
+        return {self.line_name: array_nbytes(view.plotdata.arrays)}
+
     view = View(
         Item('survey_line_view', style='custom', show_label=False,
-             visible_when='show_view')
+             visible_when='show_view'),
+        Item('load_status', style='readonly', show_label=False,
+             visible_when='not show_view')
     )
@@ -11,7 +11,7 @@ import os
 import logging
 
 from traits.api import (Bool, Property, Supports, List, on_trait_change, Dict,
-                        Str, Instance)
+                        Str, Instance, DelegatesTo)
 
 from pyface.api import ImageResource
 from pyface.tasks.api import Task, TaskLayout, PaneItem, VSplitter
@@ -25,6 +25,10 @@ from ...model.i_survey_line import ISurveyLine
 from ...model.i_survey_line_group import ISurveyLineGroup
 from ...model import algorithms
 from ...ui.survey_data_session import SurveyDataSession
+from ...ui.autosave import AutosaveScheduler
+from ...ui.survey_writer import SurveyWriter
+from ...util.commands import BoundedCommandStack
+from ...util.memory import MemoryAccountant, survey_line_nbytes
 
 from .task_command_action import TaskCommandAction
 
@@ -94,6 +98,22 @@ class SurveyTask(Task):
     # used to hold history of logging messages to display in message pane
     msg_string = Str
 
+    # progress of loading the current survey line, empty when loaded
+    load_status = Str
+
+    # writes saved survey line changes to disk in the background
+    writer = Instance(SurveyWriter, ())
+
+    # saves edited survey lines once editing pauses
+    autosave = Instance(AutosaveScheduler)
+
+    # pending background writes, shown in the message pane
+    save_status = DelegatesTo('writer', prefix='status')
+
+    # bytes held by loaded survey lines, their views and caches; loading a
+    # line evicts cached lines when this is over its budget
+    memory = Instance(MemoryAccountant)
+
     # used to set some actions as always disabled (avoid not implemented)
     _not_enable = Bool(False)
 
@@ -101,6 +121,15 @@ class SurveyTask(Task):
     # 'Task' interface.
     ###########################################################################
 
+    def _memory_default(self):
+        memory = MemoryAccountant()
+        memory.add_source('raw_arrays', self._survey_line_nbytes)
+        memory.add_source('undo', self._undo_nbytes)
+        return memory
+
+    def _autosave_default(self):
+        return AutosaveScheduler(writer=self.writer)
+
     def _zoom_box_action_default(self):
         ''' need to make this a trait to have access to action.checked state
         '''
@@ -303,11 +332,21 @@ class SurveyTask(Task):
         """
         self.window.title = self._window_title()
 
+    def prepare_destroy(self):
+        """ Overriden to save any survey line changes waiting on autosave
+        and wait for them to be written.
+        """
+        self.autosave.flush()
+        self.writer.stop()
+        super(SurveyTask, self).prepare_destroy()
+
     def create_central_pane(self):
         """ Create the central pane: the editor pane.
         """
         from .survey_line_pane import SurveyLinePane
         pane = SurveyLinePane(survey_task=self)
+        for subsystem, source in pane.memory_sources():
+            self.memory.add_source(subsystem, source)
         # listen for changes to the current survey line
         self.on_trait_change(lambda new: setattr(pane, 'survey_line', new),
                              'current_survey_line')
@@ -320,6 +359,7 @@ class SurveyTask(Task):
         from .survey_map_pane import SurveyMapPane
         from .survey_depth_pane import SurveyDepthPane
         from .message_pane import MessagePane
+        from .metrics_pane import MetricsPane
         data = SurveyDataPane(survey=self.survey)
         self.on_trait_change(lambda new: setattr(data, 'survey', new),
                              'survey')
@@ -328,16 +368,19 @@ class SurveyTask(Task):
                              'survey')
         depth = SurveyDepthPane()
         message = MessagePane()
+        metrics = MetricsPane()
 
-        return [data, map_pane, depth, message]
+        return [data, map_pane, depth, message, metrics]
 
     def _survey_changed(self):
-        from apptools.undo.api import CommandStack
+        # pending saves belong to the previous survey's lines
+        self.autosave.flush()
         self.current_survey_line = None
         self.current_survey_line_group = None
         self.selected_survey_lines = []
         # reset undo stack
-        self.command_stack = CommandStack(undo_manager=self.undo_manager)
+        self.command_stack = BoundedCommandStack(
+            undo_manager=self.undo_manager)
         self.undo_manager.active_stack = self.command_stack
 
     @on_trait_change('survey.name')
@@ -482,8 +525,7 @@ class SurveyTask(Task):
 
     def _command_stack_default(self):
         """ Return the default undo manager """
-        from apptools.undo.api import CommandStack
-        command_stack = CommandStack()
+        command_stack = BoundedCommandStack()
         return command_stack
 
     def _undo_manager_default(self):
@@ -504,6 +546,15 @@ class SurveyTask(Task):
     # private interface.
     ###########################################################################
 
+    def _survey_line_nbytes(self):
+        ''' array bytes of each loaded survey line '''
+        return dict((line.name, survey_line_nbytes(line))
+                    for line in self.survey.survey_lines
+                    if line.trace_num.size > 0)
+
+    def _undo_nbytes(self):
+        return {None: getattr(self.command_stack, 'nbytes', 0)}
+
     def _window_title(self):
         """ Get the title of the window """
         name = self.survey.name
@@ -0,0 +1,78 @@
+''' Unit tests for the survey line autosave scheduler
+
+'''
+import unittest
+
+from hydropick.ui.autosave import AutosaveScheduler
+
+
+class FakeSurveyLine(object):
+    def __init__(self, name):
+        self.name = name
+        self.saves = 0
+
+    def save_to_disk(self):
+        self.saves += 1
+
+
+class TestAutosaveScheduler(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.timers = []
+        self.autosave = AutosaveScheduler(quiet_period=1000,
+                                          do_after=self.do_after,
+                                          clock=lambda: self.now)
+        self.line_a = FakeSurveyLine('a')
+        self.line_b = FakeSurveyLine('b')
+
+    def do_after(self, interval, callable):
+        self.timers.append((interval, callable))
+
+    def fire_timer(self, advance):
+        self.now += advance
+        interval, callable = self.timers.pop(0)
+        callable()
+
+    def test_burst_is_saved_once(self):
+        for i in range(5):
+            self.autosave.schedule(self.line_a)
+            self.now += 0.1
+        self.autosave.schedule(self.line_b)
+        self.assertEqual(len(self.timers), 1)
+        self.assertEqual(len(self.autosave), 2)
+
+        # changes continued after the timer started: wait the rest out
+        self.fire_timer(0.6)
+        self.assertEqual(self.line_a.saves, 0)
+        self.assertEqual(len(self.timers), 1)
+
+        self.fire_timer(1.0)
+        self.assertEqual(self.line_a.saves, 1)
+        self.assertEqual(self.line_b.saves, 1)
+        self.assertEqual(len(self.autosave), 0)
+
+    def test_flush_one_line(self):
+        self.autosave.schedule(self.line_a)
+        self.autosave.schedule(self.line_b)
+        self.assertEqual(self.autosave.flush(self.line_a), ['a'])
+        self.assertEqual(self.line_a.saves, 1)
+        self.assertNotIn('a', self.autosave)
+        self.assertIn('b', self.autosave)
+        self.assertEqual(self.autosave.flush(self.line_a), [])
+
+        # timer then saves only what is left
+        self.fire_timer(2.0)
+        self.assertEqual(self.line_a.saves, 1)
+        self.assertEqual(self.line_b.saves, 1)
+
+    def test_flush_all(self):
+        self.autosave.schedule(self.line_a)
+        self.autosave.schedule(self.line_b)
+        self.assertEqual(self.autosave.flush(), ['a', 'b'])
+        self.fire_timer(2.0)
+        self.assertEqual(self.line_a.saves, 1)
+        self.assertEqual(self.timers, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
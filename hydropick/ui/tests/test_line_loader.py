@@ -0,0 +1,102 @@
+''' Unit tests for the background survey line loader
+
+'''
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from hydropick.ui.line_loader import LineLoader
+
+
+class FakeSurveyLine(object):
+    def __init__(self, name):
+        self.name = name
+        self.trace_num = np.array([])
+        self.reads = 0
+
+    def read_data(self, project_dir):
+        self.reads += 1
+        return {'name': self.name}
+
+
+class TestLineLoader(unittest.TestCase):
+    def setUp(self):
+        self.project_dir = tempfile.mkdtemp()
+        self.loaded = []
+        self.loader = LineLoader(max_lines=2, dispatch=self.dispatch)
+
+    def tearDown(self):
+        self.loader.stop()
+        shutil.rmtree(self.project_dir)
+
+    def dispatch(self, callback, *args):
+        callback(*args)
+
+    def callback(self, survey_line, data):
+        self.loaded.append((survey_line.name, data))
+
+    def wait_for_load(self):
+        for i in range(500):
+            if self.loaded:
+                return
+            time.sleep(0.01)
+        self.fail('line never loaded')
+
+    def wait_for(self, *names):
+        for i in range(500):
+            if all(name in self.loader._cache for name in names):
+                return
+            time.sleep(0.01)
+        self.fail('lines {} never prefetched'.format(names))
+
+    def test_load(self):
+        line = FakeSurveyLine('a')
+        self.loader.load(line, self.project_dir, self.callback)
+        self.wait_for_load()
+        self.assertEqual(self.loaded, [('a', {'name': 'a'})])
+        # delivered data is not cached
+        self.assertNotIn('a', self.loader._cache)
+
+    def test_load_uses_prefetched_data(self):
+        line = FakeSurveyLine('a')
+        self.loader.prefetch([line, None], self.project_dir)
+        self.wait_for('a')
+        self.loader.load(line, self.project_dir, self.callback)
+        self.assertEqual(self.loaded, [('a', {'name': 'a'})])
+        self.assertEqual(line.reads, 1)
+
+    def test_cancelled_load_is_not_delivered(self):
+        line = FakeSurveyLine('a')
+        self.loader.load(line, self.project_dir, self.callback)
+        self.loader.cancel()
+        # b is read after a, so a has been dealt with once b is cached
+        self.loader.prefetch([FakeSurveyLine('b')], self.project_dir)
+        self.wait_for('b')
+        self.assertEqual(self.loaded, [])
+
+    def test_loaded_lines_are_skipped(self):
+        line = FakeSurveyLine('a')
+        line.trace_num = np.arange(1, 10)
+        self.loader.prefetch([line], self.project_dir)
+        self.assertEqual(len(self.loader._queued), 0)
+
+    def test_cache_is_bounded(self):
+        lines = [FakeSurveyLine(name) for name in 'abc']
+        self.loader.prefetch(lines, self.project_dir)
+        self.wait_for('b', 'c')
+        self.assertEqual(list(self.loader._cache.keys()), ['b', 'c'])
+
+    def test_other_project_is_stale(self):
+        line = FakeSurveyLine('a')
+        self.loader.prefetch([line], self.project_dir)
+        self.wait_for('a')
+        self.loader.load(line, self.project_dir + '_other', self.callback)
+        self.wait_for_load()
+        self.assertEqual(line.reads, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
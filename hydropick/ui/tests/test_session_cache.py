@@ -0,0 +1,65 @@
+''' Unit tests for the survey data session cache
+
+'''
+import unittest
+
+import numpy as np
+
+from hydropick.ui.session_cache import SessionCache
+
+
+class FakeSurveyLine(object):
+    def __init__(self, name, size):
+        self.name = name
+        self.trace_num = np.zeros(size, dtype=np.uint8)
+        self.lake_depths = {}
+
+    def unload_data(self):
+        self.trace_num = np.array([])
+
+
+class FakeSession(object):
+    def __init__(self, name, size):
+        self.survey_line = FakeSurveyLine(name, size)
+
+
+class TestSessionCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = SessionCache(memory_budget=250)
+        self.sessions = {}
+        for name in ['a', 'b', 'c']:
+            self.sessions[name] = FakeSession(name, 100)
+            self.cache.add(name, self.sessions[name])
+
+    def test_total_bytes(self):
+        self.assertEqual(self.cache.total_bytes, 300)
+        self.assertEqual(len(self.cache), 3)
+
+    def test_evict_least_recently_used(self):
+        evicted = self.cache.evict()
+        self.assertEqual(evicted, ['a'])
+        self.assertNotIn('a', self.cache)
+        self.assertEqual(self.sessions['a'].survey_line.trace_num.size, 0)
+        self.assertEqual(self.sessions['b'].survey_line.trace_num.size, 100)
+
+    def test_get_marks_recently_used(self):
+        self.assertIs(self.cache.get('a'), self.sessions['a'])
+        self.assertEqual(self.cache.evict(), ['b'])
+        self.assertIsNone(self.cache.get('b'))
+
+    def test_session_copies_are_counted(self):
+        session = FakeSession('d', 100)
+        session.y_arrays = {'200.0': np.zeros(50, dtype=np.uint8)}
+        self.cache.add('d', session)
+        self.assertEqual(self.cache.total_bytes, 450)
+        self.assertEqual([name for name, s in self.cache.sessions()],
+                         ['a', 'b', 'c', 'd'])
+
+    def test_keep_is_never_evicted(self):
+        evicted = self.cache.evict(keep=['a', 'b'], budget=0)
+        self.assertEqual(evicted, ['c'])
+        self.assertEqual(self.cache.names(), ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+''' Unit tests for the survey line view
+
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from traits import has_traits
+
+from hydropick.model.depth_line import DepthLine
+from hydropick.ui.survey_data_session import SurveyDataSession
+from hydropick.ui.survey_line_view import SurveyLineView
+from hydropick.io.import_survey import import_sdi
+from hydropick.util.commands import ArraySliceCommand
+
+
+class TestSurveyLineView(unittest.TestCase):
+    def setUp(self):
+        has_traits.CHECK_INTERFACES = 1
+
+        data_dir = 'SurveyData'
+        survey_name = '12030221'
+        self.tempdir = tempfile.mkdtemp()
+
+        test_dir = os.path.dirname(__file__)
+        data_path = os.path.join(test_dir, data_dir)
+        lines, groups = import_sdi(data_path, self.tempdir)
+        for line in lines:
+            if line.name == survey_name:
+                self.survey_line = line
+        self.survey_line.load_data(self.tempdir)
+
+        size = len(self.survey_line.trace_num)
+        self.depth_line = DepthLine(
+            name='edited', survey_line_name=survey_name,
+            line_type='current surface', source='algorithm',
+            index_array=np.arange(size), depth_array=np.ones(size) * 10)
+        self.survey_line.lake_depths['edited'] = self.depth_line
+        self.data_session = SurveyDataSession(survey_line=self.survey_line)
+        self.view = SurveyLineView(model=self.data_session)
+        self.view.create_data_array()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_undo_stroke_redraws_line(self):
+        plotdata = self.view.plotdata
+        command = ArraySliceCommand(data=self.depth_line,
+                                    attribute='depth_array', start=5, stop=10,
+                                    value=np.ones(5) * 20,
+                                    changed=self.view.array_edit_undone)
+        command.do()
+
+        command.undo()
+        np.testing.assert_array_equal(plotdata.get_data('POST_edited_y'),
+                                      self.depth_line.depth_array)
+        self.assertTrue(np.all(plotdata.get_data('POST_edited_y') == 10))
+
+        command.redo()
+        y = plotdata.get_data('POST_edited_y')
+        np.testing.assert_array_equal(y[5:10], np.ones(5) * 20)
+        np.testing.assert_array_equal(y[:5], np.ones(5) * 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
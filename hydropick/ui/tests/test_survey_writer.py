@@ -0,0 +1,97 @@
+''' Unit tests for the background survey line writer
+
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from hydropick.io import survey_io
+from hydropick.model.depth_line import DepthLine
+from hydropick.model.survey_line import SurveyLine
+from hydropick.ui.survey_writer import SurveyWriter
+
+
+class TestSurveyWriter(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.project_dir = os.path.join(self.tempdir, 'test-project')
+        self.writer = SurveyWriter(dispatch=self.dispatch)
+        self.line = SurveyLine(name='12041701', project_dir=self.project_dir)
+        self.line.lake_depths['a'] = DepthLine(
+            name='a', survey_line_name=self.line.name,
+            line_type='current surface', source='algorithm',
+            index_array=np.arange(10), depth_array=np.zeros(10))
+
+    def tearDown(self):
+        self.writer.stop()
+        shutil.rmtree(self.tempdir)
+
+    def dispatch(self, callback, *args):
+        callback(*args)
+
+    def read_pick(self, name):
+        picks = survey_io.read_pick_lines_from_hdf(
+            self.project_dir, self.line.name, 'current')
+        return picks[name]
+
+    def test_writes_are_ordered(self):
+        depth_line = self.line.lake_depths['a']
+        self.assertTrue(self.writer.save(self.line))
+        for i in range(1, 5):
+            # edits made after a save are not part of its snapshot
+            depth_line.depth_array = np.repeat(float(i), 10)
+            self.assertTrue(self.writer.save(self.line))
+        depth_line.depth_array = np.repeat(99.0, 10)
+        self.assertTrue(self.writer.flush(self.line.name))
+        self.assertFalse(self.writer.has_pending())
+        self.assertEqual(self.writer.pending, 0)
+        self.assertEqual(self.writer.status, '')
+        np.testing.assert_array_equal(self.read_pick('a').depth_array,
+                                      np.repeat(4.0, 10))
+        attrs = survey_io.read_survey_line_attrs_from_hdf(self.project_dir,
+                                                          self.line.name)
+        self.assertEqual(attrs['final_lake_depth'],
+                         self.line.final_lake_depth)
+
+    def test_unchanged_line_is_not_queued(self):
+        self.writer.save(self.line)
+        self.writer.flush()
+        self.assertFalse(self.writer.save(self.line))
+        self.assertFalse(self.writer.has_pending(self.line.name))
+
+    def test_failed_write_is_retried(self):
+        # a project directory below a file can not be written
+        not_a_dir = os.path.join(self.tempdir, 'not-a-dir')
+        open(not_a_dir, 'w').close()
+        bad_project_dir = os.path.join(not_a_dir, 'test-project')
+        depth_line = self.line.lake_depths['a']
+
+        self.assertTrue(self.writer.save(self.line, bad_project_dir))
+        self.assertFalse(self.writer.flush(self.line.name))
+        self.assertTrue(self.writer.has_failed(self.line.name))
+        self.assertEqual(self.writer.failed, 1)
+        self.assertIn('Failed', self.writer.status)
+        # the changes are unsaved again
+        self.assertTrue(depth_line.dirty)
+        self.assertTrue(self.line.attrs_dirty)
+
+        self.assertTrue(self.writer.save(self.line))
+        self.assertTrue(self.writer.flush())
+        self.assertFalse(self.writer.has_failed())
+        self.assertEqual(self.writer.status, '')
+        np.testing.assert_array_equal(self.read_pick('a').depth_array,
+                                      np.zeros(10))
+
+    def test_stop_writes_pending(self):
+        self.writer.save(self.line)
+        self.writer.stop()
+        self.assertFalse(self.writer.has_pending())
+        np.testing.assert_array_equal(self.read_pick('a').depth_array,
+                                      np.zeros(10))
+
+
+if __name__ == '__main__':
+    unittest.main()
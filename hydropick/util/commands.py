@@ -13,8 +13,15 @@ These should probably go into apptools rather than in this project.
 """
 from __future__ import absolute_import
 
-from traits.api import Any, Bool, Str, Callable
-from apptools.undo.api import AbstractCommand
+import logging
+
+from traits.api import Any, Array, Bool, Str, Callable, Int, Property
+from apptools.undo.api import AbstractCommand, CommandStack
+
+logger = logging.getLogger(__name__)
+
+# default bytes of command data kept for undo by a BoundedCommandStack
+UNDO_MEMORY_BUDGET = 256 * 1024 ** 2
 
 
 class AttributeSetCommand(AbstractCommand):
@@ -22,7 +29,8 @@ class AttributeSetCommand(AbstractCommand):
 
     This command keeps a reference to both the old and new values of the
     attribute, so this should be used with care if the values are expected to
-    consume a lot of memory.
+    consume a lot of memory.  ArraySliceCommand keeps only the changed part
+    of an array.
 
     """
 
@@ -41,6 +49,9 @@ class AttributeSetCommand(AbstractCommand):
     #: the previous value, for undoing
     _saved = Any
 
+    #: approximate bytes of array data held by this command
+    nbytes = Property
+
     def do(self):
         """ Set the value of the attribute """
         self._undefined = not hasattr(self.data, self.attribute)
@@ -71,6 +82,103 @@ class AttributeSetCommand(AbstractCommand):
     def _name_default(self):
         return "Set {0}".format(self.attribute)
 
+    def _get_nbytes(self):
+        return (getattr(self.value, 'nbytes', 0) +
+                getattr(self._saved, 'nbytes', 0))
+
+
+class ArraySliceCommand(AbstractCommand):
+    """ Command which wraps setting a slice of an array attribute
+
+    Only the values of the slice [start, stop) before and after the change
+    are kept, so edits to a small part of a large array are cheap to keep
+    in the undo history.  The attribute is set to a new array rather than
+    changed in place so that listeners see the change.
+
+    """
+
+    #: the array attribute that we are changing
+    attribute = Str
+
+    #: start of the changed slice
+    start = Int
+
+    #: stop of the changed slice
+    stop = Int
+
+    #: the new values of the slice
+    value = Array
+
+    #: whether we should merge overlapping or adjacent slices of the same
+    #: object and attribute
+    mergeable = Bool(False)
+
+    #: called with this command after it is undone or redone, e.g. to
+    #: refresh views of the array
+    changed = Callable
+
+    #: approximate bytes of array data held by this command
+    nbytes = Property(depends_on='value, _saved')
+
+    #: the previous values of the slice, for undoing
+    _saved = Array
+
+    def do(self):
+        """ Set the slice, saving its previous values """
+        array = getattr(self.data, self.attribute)
+        self._saved = array[self.start:self.stop].copy()
+        self._set_slice(self.value)
+
+    def merge(self, other):
+        """ Merge if mergeable, target and attribute match and the slices
+        overlap or touch """
+        if not self.mergeable:
+            return False
+        if not (isinstance(other, ArraySliceCommand) and other.mergeable and
+                other.data is self.data and other.attribute == self.attribute):
+            return False
+        if other.start > self.stop or other.stop < self.start:
+            return False
+        start = min(self.start, other.start)
+        stop = max(self.stop, other.stop)
+        # the array holds self's values but not yet other's
+        current = getattr(self.data, self.attribute)[start:stop]
+        saved = current.copy()
+        saved[self.start - start:self.stop - start] = self._saved
+        value = current.copy()
+        value[other.start - start:other.stop - start] = other.value
+        self.trait_set(start=start, stop=stop, value=value, _saved=saved)
+        self._set_slice(self.value)
+        return True
+
+    def undo(self):
+        self._set_slice(self._saved)
+        if self.changed is not None:
+            self.changed(self)
+
+    def redo(self):
+        self._set_slice(self.value)
+        if self.changed is not None:
+            self.changed(self)
+
+    def _set_slice(self, values):
+        array = getattr(self.data, self.attribute)
+        if len(array) < self.stop:
+            # the data was replaced (e.g. unloaded) since the edit
+            logger.warning('cannot change {}[{}:{}] of {}: array has size {}'
+                           .format(self.attribute, self.start, self.stop,
+                                   self.data, len(array)))
+            return
+        array = array.copy()
+        array[self.start:self.stop] = values
+        setattr(self.data, self.attribute, array)
+
+    def _name_default(self):
+        return "Edit {0}".format(self.attribute)
+
+    def _get_nbytes(self):
+        return self.value.nbytes + self._saved.nbytes
+
 
 class CallableCommand(AbstractCommand):
     """ Command which wraps a function or method call
@@ -111,3 +219,43 @@ class CallableCommand(AbstractCommand):
 
     def _undo_callable_default(self):
         return getattr(self.do_callable, 'undo')
+
+
+class BoundedCommandStack(CommandStack):
+    """ Command stack which limits the memory kept for undo
+
+    Once the commands on the stack hold more than memory_budget bytes (as
+    reported by their nbytes attribute; commands without one count as
+    nothing) the oldest commands are dropped and can no longer be undone.
+    The most recent command is always kept.
+
+    """
+
+    #: bytes of command data to keep for undo
+    memory_budget = Int(UNDO_MEMORY_BUDGET)
+
+    #: bytes of command data held by the commands on the stack
+    nbytes = Property
+
+    def push(self, command):
+        result = super(BoundedCommandStack, self).push(command)
+        self.evict()
+        return result
+
+    def evict(self):
+        """ Drop the oldest commands until the stack is within budget """
+        sizes = [getattr(entry.command, 'nbytes', 0) for entry in self._stack]
+        total = sum(sizes)
+        dropped = 0
+        while total > self.memory_budget and dropped < len(sizes) - 1:
+            total -= sizes[dropped]
+            dropped += 1
+        if dropped:
+            logger.debug('dropping {} commands from undo history'
+                         .format(dropped))
+            del self._stack[:dropped]
+            self._index = max(self._index - dropped, -1)
+
+    def _get_nbytes(self):
+        return sum(getattr(entry.command, 'nbytes', 0)
+                   for entry in self._stack)
@@ -0,0 +1,136 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+"""
+Accounting of the memory held by survey line arrays
+
+Memory is measured from the byte sizes of numpy arrays.  Each subsystem
+that holds arrays (the survey lines themselves, data session copies, plot
+data, caches, undo history) registers a source with a MemoryAccountant;
+measure() polls the sources and totals their bytes per line and per
+subsystem against the memory budget.
+
+"""
+
+from __future__ import absolute_import
+
+import logging
+
+import numpy as np
+from traits.api import HasTraits, Dict, List, Long, Str
+
+from .metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# default limit on the memory held by all subsystems (bytes)
+DEFAULT_MEMORY_BUDGET = 2 * 1024 ** 3
+
+# survey line traits holding (possibly nested) arrays
+SURVEY_LINE_ARRAY_TRAITS = ['frequencies', 'freq_trace_num', 'trace_num',
+                            'locations', 'lat_long', 'heave', 'power', 'gain',
+                            'mask', 'lake_depths', 'preimpoundment_depths']
+
+# depth line traits holding arrays (index_array is only held when it is not
+# an evenly spaced run)
+DEPTH_LINE_ARRAY_TRAITS = ['_index_array', 'depth_array']
+
+
+def array_nbytes(obj):
+    ''' bytes held by the arrays in obj, which may be an array or a
+    dict/list of arrays.  Anything else counts as zero.'''
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, dict):
+        return sum(array_nbytes(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return sum(array_nbytes(value) for value in obj)
+    return 0
+
+
+def survey_line_nbytes(survey_line):
+    ''' bytes of array data currently loaded in a survey line, including
+    its depth lines'''
+    total = 0
+    for name in SURVEY_LINE_ARRAY_TRAITS:
+        value = getattr(survey_line, name, None)
+        if name in ('lake_depths', 'preimpoundment_depths') and value:
+            for depth_line in value.values():
+                for array_name in DEPTH_LINE_ARRAY_TRAITS:
+                    total += array_nbytes(getattr(depth_line, array_name,
+                                                  None))
+        else:
+            total += array_nbytes(value)
+    return total
+
+
+class MemoryAccountant(HasTraits):
+    """ Totals the bytes held per survey line and per subsystem.
+
+    A source is a callable returning a dict of bytes keyed by survey line
+    name; bytes not held for a particular line (e.g. undo history) are
+    keyed by None.  Sources are polled by measure, which also publishes the
+    subsystem totals as memory.* gauges in the metrics registry.
+    """
+
+    #: bytes all subsystems may hold before lines should be evicted
+    memory_budget = Long(DEFAULT_MEMORY_BUDGET)
+
+    #: bytes held by each subsystem, as of the last measure
+    subsystem_bytes = Dict(Str, Long)
+
+    #: bytes held for each survey line by all subsystems, as of the last
+    #: measure
+    line_bytes = Dict(Str, Long)
+
+    #: bytes held by all subsystems, as of the last measure
+    total_bytes = Long
+
+    #: (subsystem, source) pairs in the order they were added
+    _sources = List
+
+    def add_source(self, subsystem, source):
+        ''' count the bytes returned by source() under subsystem '''
+        self._sources.append((subsystem, source))
+
+    def remove_sources(self, subsystem):
+        ''' stop counting subsystem '''
+        self._sources = [(name, source) for name, source in self._sources
+                         if name != subsystem]
+
+    def measure(self):
+        ''' poll the sources and update the totals.  Returns total bytes '''
+        subsystem_bytes = dict((name, 0) for name, source in self._sources)
+        line_bytes = {}
+        for subsystem, source in self._sources:
+            try:
+                sizes = source()
+            except Exception:
+                logger.exception('failed to measure memory of {}'
+                                 .format(subsystem))
+                continue
+            for line_name, nbytes in sizes.items():
+                subsystem_bytes[subsystem] += nbytes
+                if line_name is not None:
+                    line_bytes[line_name] = \
+                        line_bytes.get(line_name, 0) + nbytes
+        self.subsystem_bytes = subsystem_bytes
+        self.line_bytes = line_bytes
+        self.total_bytes = sum(subsystem_bytes.values())
+        for subsystem, nbytes in subsystem_bytes.items():
+            METRICS.set_gauge('memory.{}_bytes'.format(subsystem), nbytes)
+        METRICS.set_gauge('memory.total_bytes', self.total_bytes)
+        return self.total_bytes
+
+    def excess(self, extra=0):
+        ''' bytes to free so that extra more bytes fit the budget '''
+        return max(self.total_bytes + extra - self.memory_budget, 0)
+
+    def line_estimate(self):
+        ''' typical bytes held for a survey line, 0 if none are held '''
+        if not self.line_bytes:
+            return 0
+        return sum(self.line_bytes.values()) // len(self.line_bytes)
@@ -0,0 +1,193 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+"""
+Application-wide counters, timers and gauges
+
+Hot paths record into the METRICS registry:
+
+    from ..util.metrics import METRICS
+
+    METRICS.increment('hdf5.opens')
+    with METRICS.timer('survey_line.load_data'):
+        ...
+    METRICS.set_gauge('memory.total_bytes', nbytes)
+
+Recording is thread safe and cheap enough for per-file and per-line
+operations; it is not meant for inner loops.  snapshot() returns the
+metrics as a JSON-compatible dict and dump() writes them to a file.
+
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict
+import contextlib
+import datetime
+import functools
+import json
+import logging
+import os
+import threading
+from timeit import default_timer
+
+logger = logging.getLogger(__name__)
+
+#: name of the file the application dumps its metrics to on exit
+METRICS_FILENAME = 'hydropick-metrics.json'
+
+
+class MetricsRegistry(object):
+    """ Named counters, timers and gauges
+
+    Counters only go up.  Timers keep the count, total, maximum and last of
+    the times recorded.  Gauges hold a current value, such as the bytes of
+    the arrays of loaded survey lines, and remember their peak.
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """ Forget all metrics """
+        with self._lock:
+            self._started = datetime.datetime.now()
+            self._counters = {}
+            self._timers = {}
+            self._gauges = {}
+
+    def increment(self, name, value=1):
+        """ Add value to counter name """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def record_time(self, name, seconds):
+        """ Add a time to timer name """
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                self._timers[name] = [1, seconds, seconds, seconds]
+            else:
+                timer[0] += 1
+                timer[1] += seconds
+                timer[2] = max(timer[2], seconds)
+                timer[3] = seconds
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """ Context manager recording the time of its block to timer name,
+        including when the block raises """
+        start = default_timer()
+        try:
+            yield
+        finally:
+            self.record_time(name, default_timer() - start)
+
+    def timed(self, name):
+        """ Decorator recording the time of each call to timer name """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kw):
+                with self.timer(name):
+                    return func(*args, **kw)
+            return wrapper
+        return decorator
+
+    def set_gauge(self, name, value):
+        """ Set the current value of gauge name """
+        with self._lock:
+            self._set_gauge(name, value)
+
+    def adjust_gauge(self, name, delta):
+        """ Add delta (which may be negative) to gauge name """
+        with self._lock:
+            current = self._gauges.get(name, (0, 0))[0]
+            self._set_gauge(name, current + delta)
+
+    def gauge(self, name):
+        """ Return the current value of gauge name, 0 if it was never set """
+        with self._lock:
+            return self._gauges.get(name, (0, 0))[0]
+
+    def snapshot(self):
+        """ Return the metrics as a JSON-compatible OrderedDict """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            timers = sorted((name, list(timer))
+                            for name, timer in self._timers.items())
+            gauges = sorted(self._gauges.items())
+            started = self._started
+        return OrderedDict([
+            ('started', started.isoformat()),
+            ('time', datetime.datetime.now().isoformat()),
+            ('counters', OrderedDict(counters)),
+            ('timers', OrderedDict(
+                (name, OrderedDict([
+                    ('count', count),
+                    ('total', total),
+                    ('mean', total / count),
+                    ('max', max_),
+                    ('last', last),
+                ]))
+                for name, (count, total, max_, last) in timers)),
+            ('gauges', OrderedDict(
+                (name, OrderedDict([('value', value), ('peak', peak)]))
+                for name, (value, peak) in gauges)),
+        ])
+
+    def dump(self, path):
+        """ Write the metrics as JSON to path """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+        if os.name == 'nt' and os.path.exists(path):
+            # rename does not replace existing files on Windows
+            os.remove(path)
+        os.rename(tmp_path, path)
+        logger.debug('wrote metrics to {}'.format(path))
+
+    def format_table(self):
+        """ Return the metrics as text for display """
+        snapshot = self.snapshot()
+        lines = ['since {}'.format(snapshot['started'][:19])]
+        if snapshot['timers']:
+            lines += ['', '{:<36} {:>7} {:>10} {:>10} {:>10}'.format(
+                'timer', 'count', 'total s', 'mean ms', 'max ms')]
+            for name, timer in snapshot['timers'].items():
+                lines.append('{:<36} {:>7} {:>10.3f} {:>10.1f} {:>10.1f}'
+                             .format(name, timer['count'], timer['total'],
+                                     timer['mean'] * 1000,
+                                     timer['max'] * 1000))
+        if snapshot['counters']:
+            lines += ['', '{:<36} {:>7}'.format('counter', 'value')]
+            for name, value in snapshot['counters'].items():
+                lines.append('{:<36} {:>7}'.format(name, _format_value(name,
+                                                                      value)))
+        if snapshot['gauges']:
+            lines += ['', '{:<36} {:>10} {:>10}'.format('gauge', 'value',
+                                                        'peak')]
+            for name, gauge in snapshot['gauges'].items():
+                lines.append('{:<36} {:>10} {:>10}'.format(
+                    name, _format_value(name, gauge['value']),
+                    _format_value(name, gauge['peak'])))
+        return '\n'.join(lines)
+
+    def _set_gauge(self, name, value):
+        peak = self._gauges.get(name, (0, 0))[1]
+        self._gauges[name] = (value, max(peak, value))
+
+
+def _format_value(name, value):
+    """ show byte counts in MB """
+    if name.endswith('bytes'):
+        return '{:.1f} MB'.format(value / 1024.0 ** 2)
+    return str(value)
+
+
+#: the application's registry
+METRICS = MetricsRegistry()
@@ -0,0 +1,129 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+"""
+Timing of the stages of a computation, such as a picking algorithm
+
+A StageProfiler is handed to the code being profiled, which runs each of
+its stages through StageProfiler.call.  When the profiler is disabled call
+only calls the stage, so profiling hooks can stay in place at no real cost.
+
+"""
+
+from __future__ import absolute_import
+
+from collections import OrderedDict, namedtuple
+import logging
+from timeit import default_timer
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+#: one call of a stage: the line (or other item) being processed, the stage
+#: name, wall time in seconds and the shape of the stage's first array
+#: argument (or of its result if it has none)
+StageRecord = namedtuple('StageRecord', ['item', 'stage', 'seconds', 'shape'])
+
+
+class StageProfiler(object):
+    """ Records the wall time and array sizes of the stages of a computation
+
+    start(item) marks the beginning of the computation for an item (e.g. a
+    survey line name), each stage is run with call(stage, func, *args) and
+    stop() logs the stages of the item at debug level.  Records accumulate
+    until reset.
+
+    """
+
+    def __init__(self, enabled=False):
+        #: whether stages are timed
+        self.enabled = enabled
+
+        #: StageRecords in the order the stages ran
+        self.records = []
+
+        self._item = None
+        self._item_start = 0
+
+    def start(self, item):
+        """ Mark the start of the computation for item """
+        if self.enabled:
+            self._item = item
+            self._item_start = len(self.records)
+
+    def stop(self):
+        """ Mark the end of the computation for the current item, logging
+        its stages """
+        if self.enabled and logger.isEnabledFor(logging.DEBUG):
+            records = self.records[self._item_start:]
+            logger.debug('stages for {}: {}'.format(self._item, ', '.join(
+                '{} {:.1f} ms {}'.format(r.stage, r.seconds * 1000,
+                                         _format_shape(r.shape))
+                for r in records)))
+
+    def call(self, stage, func, *args, **kw):
+        """ Return func(*args, **kw), timing it as stage if enabled """
+        if not self.enabled:
+            return func(*args, **kw)
+        start = default_timer()
+        result = func(*args, **kw)
+        seconds = default_timer() - start
+        shape = _first_shape(args)
+        if shape is None:
+            shape = _first_shape(result if isinstance(result, tuple)
+                                 else (result,))
+        self.records.append(StageRecord(self._item, stage, seconds, shape))
+        return result
+
+    def reset(self):
+        """ Forget all records """
+        self.records = []
+        self._item_start = 0
+
+    def totals(self):
+        """ Return an OrderedDict of stage: (calls, total seconds), in the
+        order stages first ran """
+        totals = OrderedDict()
+        for record in self.records:
+            calls, seconds = totals.get(record.stage, (0, 0.0))
+            totals[record.stage] = (calls + 1, seconds + record.seconds)
+        return totals
+
+    def report(self):
+        """ Return a table of the time spent in each stage and the slowest
+        item for the stage """
+        if not self.records:
+            return 'no stages recorded'
+        slowest = {}
+        for record in self.records:
+            if (record.stage not in slowest or
+                    record.seconds > slowest[record.stage].seconds):
+                slowest[record.stage] = record
+        total = sum(record.seconds for record in self.records)
+        lines = ['{:<20} {:>6} {:>10} {:>6}   {}'.format(
+            'stage', 'calls', 'total s', '%', 'slowest')]
+        for stage, (calls, seconds) in self.totals().items():
+            record = slowest[stage]
+            lines.append('{:<20} {:>6} {:>10.3f} {:>6.1f}   {} {:.3f} s {}'
+                         .format(stage, calls, seconds,
+                                 100.0 * seconds / total if total else 0,
+                                 record.item, record.seconds,
+                                 _format_shape(record.shape)))
+        return '\n'.join(lines)
+
+
+def _first_shape(values):
+    for value in values:
+        if isinstance(value, np.ndarray):
+            return value.shape
+    return None
+
+
+def _format_shape(shape):
+    if shape is None:
+        return ''
+    return 'x'.join(str(n) for n in shape)
@@ -10,16 +10,23 @@ from __future__ import absolute_import
 
 from unittest import TestCase, main
 
-from traits.api import HasTraits, Int
+import numpy as np
+from traits.api import HasTraits, Array, Int
 from apptools.undo.api import UndoManager, CommandStack
 
-from hydropick.util.commands import AttributeSetCommand
+from hydropick.util.commands import (AttributeSetCommand, ArraySliceCommand,
+                                     BoundedCommandStack)
 
 class TargetClass(HasTraits):
 
     value = Int
 
 
+class ArrayTargetClass(HasTraits):
+
+    values = Array
+
+
 class TestAttributeSetCommand(TestCase):
 
     def setUp(self):
@@ -152,5 +159,67 @@ class TestAttributeSetCommand(TestCase):
         self.manager.active_stack.undo()
         self.assertEqual(self.data.value, 0)
 
+
+class TestArraySliceCommand(TestCase):
+
+    def setUp(self):
+        self.manager = UndoManager()
+        self.stack = BoundedCommandStack(undo_manager=self.manager,
+                                         memory_budget=2000)
+        self.manager.active_stack = self.stack
+        self.data = ArrayTargetClass(values=np.zeros(100))
+
+    def slice_command(self, start, stop, value, mergeable=False):
+        return ArraySliceCommand(
+            data=self.data,
+            attribute='values',
+            start=start,
+            stop=stop,
+            value=np.repeat(float(value), stop - start),
+            mergeable=mergeable,
+        )
+
+    def test_command_undo_redo(self):
+        command = self.slice_command(10, 20, 1)
+        self.stack.push(command)
+        self.assertEqual(self.data.values[10:20].tolist(), [1.0] * 10)
+        self.assertEqual(self.data.values.sum(), 10)
+        self.assertEqual(command.nbytes, 160)
+        self.stack.undo()
+        self.assertEqual(self.data.values.sum(), 0)
+        self.stack.redo()
+        self.assertEqual(self.data.values.sum(), 10)
+
+    def test_overlapping_commands_merge(self):
+        self.stack.push(self.slice_command(10, 20, 1, mergeable=True))
+        self.stack.push(self.slice_command(15, 30, 2, mergeable=True))
+        self.assertEqual(self.data.values[10:15].tolist(), [1.0] * 5)
+        self.assertEqual(self.data.values[15:30].tolist(), [2.0] * 15)
+        self.stack.undo()
+        self.assertEqual(self.data.values.sum(), 0)
+        self.stack.redo()
+        self.assertEqual(self.data.values.sum(), 5 + 30)
+
+    def test_separate_commands_do_not_merge(self):
+        self.stack.push(self.slice_command(10, 20, 1, mergeable=True))
+        self.stack.push(self.slice_command(50, 60, 2, mergeable=True))
+        self.stack.undo()
+        self.assertEqual(self.data.values.sum(), 10)
+        self.stack.undo()
+        self.assertEqual(self.data.values.sum(), 0)
+
+    def test_memory_budget_drops_oldest(self):
+        # each command holds 2 * 40 * 8 bytes, the budget allows 2000
+        for i in range(4):
+            self.stack.push(self.slice_command(i * 20, i * 20 + 40, i + 1))
+        self.assertEqual(self.stack.nbytes, 3 * 640)
+        self.stack.undo()
+        self.stack.undo()
+        self.stack.undo()
+        # the first command was dropped so its edit remains
+        self.assertEqual(self.data.values[:40].tolist(), [1.0] * 40)
+        self.assertEqual(self.data.values[40:].sum(), 0)
+        self.assertEqual(self.stack.undo_name, '')
+
 if __name__ == '__main__':
     main()
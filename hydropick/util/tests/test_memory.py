@@ -0,0 +1,70 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+from __future__ import absolute_import
+
+from unittest import TestCase, main
+
+import numpy as np
+
+from hydropick.util.memory import (MemoryAccountant, array_nbytes,
+                                   survey_line_nbytes)
+from hydropick.util.metrics import METRICS
+
+
+class FakeDepthLine(object):
+    def __init__(self, size):
+        self.depth_array = np.zeros(size, dtype=np.float32)
+
+
+class FakeSurveyLine(object):
+    def __init__(self, size):
+        self.trace_num = np.zeros(size, dtype=np.int32)
+        self.frequencies = {'200.0': np.zeros((size, 10), dtype=np.uint8)}
+        self.lake_depths = {'a': FakeDepthLine(size)}
+
+
+class TestMemoryAccounting(TestCase):
+
+    def test_array_nbytes(self):
+        arrays = {'a': np.zeros(10), 'b': [np.zeros(3, dtype=np.int8)],
+                  'c': 1.5}
+        self.assertEqual(array_nbytes(arrays), 83)
+        self.assertEqual(array_nbytes(None), 0)
+
+    def test_survey_line_nbytes(self):
+        self.assertEqual(survey_line_nbytes(FakeSurveyLine(10)),
+                         40 + 100 + 40)
+
+    def test_measure(self):
+        memory = MemoryAccountant(memory_budget=1000)
+        memory.add_source('raw_arrays', lambda: {'a': 300, 'b': 200})
+        memory.add_source('plot_data', lambda: {'a': 100})
+        memory.add_source('undo', lambda: {None: 50})
+        self.assertEqual(memory.measure(), 650)
+        self.assertEqual(memory.subsystem_bytes,
+                         {'raw_arrays': 500, 'plot_data': 100, 'undo': 50})
+        self.assertEqual(memory.line_bytes, {'a': 400, 'b': 200})
+        self.assertEqual(METRICS.gauge('memory.plot_data_bytes'), 100)
+        self.assertEqual(memory.line_estimate(), 300)
+        self.assertEqual(memory.excess(), 0)
+        self.assertEqual(memory.excess(memory.line_estimate()), 0)
+        self.assertEqual(memory.excess(500), 150)
+
+        memory.remove_sources('plot_data')
+        self.assertEqual(memory.measure(), 550)
+
+    def test_failing_source_is_skipped(self):
+        memory = MemoryAccountant()
+        memory.add_source('raw_arrays', lambda: {'a': 300})
+        memory.add_source('caches', lambda: 1 / 0)
+        self.assertEqual(memory.measure(), 300)
+        self.assertEqual(memory.subsystem_bytes['caches'], 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+from __future__ import absolute_import
+
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase, main
+
+from hydropick.util.metrics import MetricsRegistry
+
+
+class TestMetricsRegistry(TestCase):
+
+    def setUp(self):
+        self.metrics = MetricsRegistry()
+
+    def test_counters_and_gauges(self):
+        self.metrics.increment('opens')
+        self.metrics.increment('opens', 2)
+        self.metrics.adjust_gauge('resident_bytes', 100)
+        self.metrics.adjust_gauge('resident_bytes', -60)
+        self.assertEqual(self.metrics.gauge('resident_bytes'), 40)
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['counters'], {'opens': 3})
+        self.assertEqual(snapshot['gauges']['resident_bytes'],
+                         {'value': 40, 'peak': 100})
+
+    def test_timers(self):
+        @self.metrics.timed('double')
+        def double(x):
+            return 2 * x
+
+        self.assertEqual(double(2), 4)
+        self.assertEqual(double.__name__, 'double')
+        with self.assertRaises(ValueError):
+            with self.metrics.timer('double'):
+                raise ValueError
+        timer = self.metrics.snapshot()['timers']['double']
+        self.assertEqual(timer['count'], 2)
+        self.assertTrue(timer['max'] >= timer['mean'] >= 0)
+        self.assertIn('double', self.metrics.format_table())
+
+        self.metrics.reset()
+        self.assertEqual(self.metrics.snapshot()['timers'], {})
+
+    def test_dump(self):
+        tempdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tempdir, 'metrics.json')
+            self.metrics.increment('opens')
+            self.metrics.dump(path)
+            self.metrics.dump(path)
+            with open(path) as f:
+                dumped = json.load(f)
+            self.assertEqual(dumped['counters'], {'opens': 1})
+            self.assertEqual(os.listdir(tempdir), ['metrics.json'])
+        finally:
+            shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main()
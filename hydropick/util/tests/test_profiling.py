@@ -0,0 +1,57 @@
+#
+# Copyright (c) 2014, Texas Water Development Board
+# All rights reserved.
+#
+# This code is open-source. See LICENSE file for details.
+#
+
+from __future__ import absolute_import
+
+from unittest import TestCase, main
+
+import numpy as np
+
+from hydropick.util.profiling import StageProfiler
+
+
+def _double(array, offset=0):
+    return array * 2 + offset
+
+
+class TestStageProfiler(TestCase):
+
+    def test_disabled(self):
+        profiler = StageProfiler()
+        profiler.start('line')
+        result = profiler.call('double', _double, np.arange(3), offset=1)
+        profiler.stop()
+        np.testing.assert_array_equal(result, [1, 3, 5])
+        self.assertEqual(profiler.records, [])
+        self.assertEqual(profiler.report(), 'no stages recorded')
+
+    def test_records_stages(self):
+        profiler = StageProfiler(enabled=True)
+        for item in ['a', 'b']:
+            profiler.start(item)
+            profiler.call('double', _double, np.zeros((4, 5)))
+            profiler.call('range', np.arange, 7)
+            profiler.stop()
+
+        self.assertEqual([(r.item, r.stage, r.shape)
+                          for r in profiler.records],
+                         [('a', 'double', (4, 5)), ('a', 'range', (7,)),
+                          ('b', 'double', (4, 5)), ('b', 'range', (7,))])
+        self.assertTrue(all(r.seconds >= 0 for r in profiler.records))
+        totals = profiler.totals()
+        self.assertEqual(list(totals), ['double', 'range'])
+        self.assertEqual(totals['double'][0], 2)
+        report = profiler.report()
+        self.assertIn('double', report)
+        self.assertIn('4x5', report)
+
+        profiler.reset()
+        self.assertEqual(profiler.records, [])
+
+
+if __name__ == '__main__':
+    main()